@@ -0,0 +1,117 @@
+"""
+benchmark.py
+
+Measure the CPU cost of moving audio between the device and the
+ring buffers in the C callbacks, using the dummy backend.
+Reports CPU milliseconds used per second of audio, for each channel count.
+
+"""
+import argparse
+import ctypes
+import time
+
+import _soundiox as soundio
+from pysoundio import (
+    SoundIoBackendDummy,
+    SoundIoFormatFloat32LE,
+    SoundIoChannelLayout,
+    SoundIoInStream,
+    SoundIoOutStream,
+)
+
+SAMPLE_RATE = 48000
+
+
+def create_layout(channels):
+    """
+    Build a layout of aux channels, libsoundio has no builtin
+    layout for most high channel counts.
+    """
+    layout = SoundIoChannelLayout()
+    layout.channel_count = channels
+    for ch in range(channels):
+        layout.channels[ch] = soundio.SoundIoChannelIdAux0 + ch
+    return layout
+
+
+def measure(duration):
+    """ Returns CPU seconds used per second of audio """
+    cpu = time.process_time()
+    wall = time.time()
+    time.sleep(duration)
+    return (time.process_time() - cpu) / (time.time() - wall)
+
+
+def benchmark_input(sio, channels, duration, latency):
+    device = soundio.get_input_device(sio, soundio.default_input_device_index(sio))
+    stream = soundio.instream_create(device)
+    pystream = ctypes.cast(stream, ctypes.POINTER(SoundIoInStream))
+    pystream.contents.format = SoundIoFormatFloat32LE
+    pystream.contents.sample_rate = SAMPLE_RATE
+    pystream.contents.layout = create_layout(channels)
+    pystream.contents.software_latency = latency
+    soundio.instream_open(stream)
+
+    capacity = (int(duration) + 2) * soundio.get_bytes_per_second(
+        SoundIoFormatFloat32LE, channels, SAMPLE_RATE)
+    buffer = soundio.input_ring_buffer_create(stream, capacity)
+    soundio.instream_start(stream)
+    cost = measure(duration)
+
+    soundio.instream_destroy(stream)
+    soundio.ring_buffer_destroy(buffer)
+    soundio.device_unref(device)
+    return cost
+
+
+def benchmark_output(sio, channels, duration, latency):
+    device = soundio.get_output_device(sio, soundio.default_output_device_index(sio))
+    stream = soundio.outstream_create(device)
+    pystream = ctypes.cast(stream, ctypes.POINTER(SoundIoOutStream))
+    pystream.contents.format = SoundIoFormatFloat32LE
+    pystream.contents.sample_rate = SAMPLE_RATE
+    pystream.contents.layout = create_layout(channels)
+    pystream.contents.software_latency = latency
+    soundio.outstream_open(stream)
+
+    # Pre-fill the ring buffer, so every period is copied to the device
+    capacity = (int(duration) + 2) * soundio.get_bytes_per_second(
+        SoundIoFormatFloat32LE, channels, SAMPLE_RATE)
+    buffer = soundio.output_ring_buffer_create(stream, capacity)
+    soundio.ring_buffer_advance_write_ptr(buffer, soundio.ring_buffer_free_count(buffer))
+    soundio.outstream_start(stream)
+    cost = measure(duration)
+
+    soundio.outstream_destroy(stream)
+    soundio.ring_buffer_destroy(buffer)
+    soundio.device_unref(device)
+    return cost
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='PySoundIo callback benchmark',
+        epilog='Measure CPU per second of audio on the dummy backend'
+    )
+    parser.add_argument('--channels', type=int, nargs='+', default=[2, 8, soundio.SOUNDIO_MAX_CHANNELS],
+                        help='Channel counts to measure (optional)')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per measurement (optional)')
+    parser.add_argument('--latency', type=float, default=0.01, help='Software latency in seconds (optional)')
+    args = parser.parse_args()
+
+    sio = soundio.create()
+    soundio.connect_backend(sio, SoundIoBackendDummy)
+    soundio.flush(sio)
+
+    print('channels  input (ms/s)  output (ms/s)')
+    for channels in args.channels:
+        if channels > soundio.SOUNDIO_MAX_CHANNELS:
+            print('%8d  skipped, libsoundio supports up to %d channels' %
+                  (channels, soundio.SOUNDIO_MAX_CHANNELS))
+            continue
+        cost_in = benchmark_input(sio, channels, args.duration, args.latency)
+        cost_out = benchmark_output(sio, channels, args.duration, args.latency)
+        print('%8d  %12.3f  %13.3f' % (channels, cost_in * 1000, cost_out * 1000))
+
+    soundio.disconnect(sio)
+    soundio.destroy(sio)
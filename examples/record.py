@@ -4,15 +4,12 @@ record.py
 Stream the default input device and save to wav file.
 Supports specifying backend, device, sample rate, block size.
 
-Requires pysoundfile
-    pip install pysoundfile
-
-http://pysoundfile.readthedocs.io/
+The file is written by the stream's processing thread, half a
+second at a time, so there is no Python work per period.
 """
 import argparse
 import time
 
-import soundfile as sf
 from pysoundio import (
     PySoundIo,
     SoundIoFormatFloat32LE,
@@ -23,10 +20,6 @@ class Record(object):
 
     def __init__(self, outfile, backend=None, input_device=None,
                  sample_rate=None, block_size=None, channels=None):
-        self.wav_file = sf.SoundFile(
-            outfile, mode='w', channels=channels,
-            samplerate=sample_rate
-        )
         self.pysoundio = PySoundIo(backend=None)
         self.pysoundio.start_input_stream(
             device_id=input_device,
@@ -34,15 +27,11 @@ class Record(object):
             sample_rate=sample_rate,
             block_size=block_size,
             dtype=SoundIoFormatFloat32LE,
-            read_callback=self.callback
+            sink=outfile
         )
 
     def close(self):
         self.pysoundio.close()
-        self.wav_file.close()
-
-    def callback(self, data, length):
-        self.wav_file.buffer_write(data, dtype='float32')
 
 
 if __name__ == '__main__':
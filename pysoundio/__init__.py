@@ -40,9 +40,13 @@ from _soundiox import (
     SoundIoFormatU24BE, SoundIoFormatS32LE, SoundIoFormatS32BE,
     SoundIoFormatU32LE, SoundIoFormatU32BE,
     SoundIoFormatFloat32LE, SoundIoFormatFloat32BE, SoundIoFormatFloat64LE,
-    SoundIoFormatFloat64BE, SoundIoFormatInvalid
+    SoundIoFormatFloat64BE, SoundIoFormatFloat32NE, SoundIoFormatInvalid,
+    OverflowDropNewest, OverflowDropOldest, OverflowGap,
+    ResampleQualityLow, ResampleQualityMedium, ResampleQualityHigh
 )
 from .constants import (
+    OverflowPolicy,
+    ResampleQuality,
     SoundIoBackend,
     SoundIoFormat
 )
@@ -56,3 +60,5 @@ from .structures import (
     SoundIoRingBuffer,
 )
 from .pysoundio import PySoundIo, PySoundIoError
+from .sinks import SegmentedWavSink, WavSink
+from .sources import WavSource
@@ -24,8 +24,23 @@
 
 #include <Python.h>
 #include <soundio/soundio.h>
+#include <math.h>
 #include "_soundiox.h"
 
+#ifdef _WIN32
+#include <winsock2.h>
+#include <windows.h>
+#else
+#include <errno.h>
+#include <time.h>
+#include <unistd.h>
+#ifdef __APPLE__
+#include <dispatch/dispatch.h>
+#else
+#include <semaphore.h>
+#endif
+#endif
+
 
 /************************************************************
  * Python Methods
@@ -78,6 +93,11 @@ static PyMethodDef soundio_methods[] = {
         pysoundio__wakeup, METH_VARARGS,
         "makes wait events stop blocking"
     },
+    {
+        "devices_changed",
+        pysoundio__devices_changed, METH_VARARGS,
+        "get the number of times the device list has changed"
+    },
     {
         "strerror",
         pysoundio__strerror, METH_VARARGS,
@@ -98,6 +118,11 @@ static PyMethodDef soundio_methods[] = {
         pysoundio__get_channel_name, METH_VARARGS,
         "get channel name"
     },
+    {
+        "parse_channel_id",
+        pysoundio__parse_channel_id, METH_VARARGS,
+        "get channel id from a channel name"
+    },
     {
         "get_output_device_count",
         pysoundio__get_output_device_count, METH_VARARGS,
@@ -204,9 +229,14 @@ static PyMethodDef soundio_methods[] = {
         "get bytes per second"
     },
     {
-        "set_read_callbacks",
-        pysoundio__set_read_callbacks, METH_VARARGS,
-        "set read callback"
+        "convert_to_float",
+        pysoundio__convert_to_float, METH_VARARGS,
+        "convert samples of a format to native float32"
+    },
+    {
+        "convert_from_float",
+        pysoundio__convert_from_float, METH_VARARGS,
+        "convert native float32 samples to a format"
     },
     {
         "instream_create",
@@ -239,9 +269,109 @@ static PyMethodDef soundio_methods[] = {
         "get next input frame length in seconds"
     },
     {
-        "set_write_callbacks",
-        pysoundio__set_write_callbacks, METH_VARARGS,
-        "set write callback"
+        "instream_get_timing",
+        pysoundio__instream_get_timing, METH_VARARGS,
+        "get frames read and the time they were read"
+    },
+    {
+        "instream_wait",
+        pysoundio__instream_wait, METH_VARARGS,
+        "wait until the input ring buffer holds a number of bytes"
+    },
+    {
+        "instream_wait_events",
+        pysoundio__instream_wait_events, METH_VARARGS,
+        "wait for events from the input stream callbacks"
+    },
+    {
+        "instream_interrupt",
+        pysoundio__instream_interrupt, METH_VARARGS,
+        "wake a thread waiting for input stream events"
+    },
+    {
+        "instream_set_notify_fd",
+        pysoundio__instream_set_notify_fd, METH_VARARGS,
+        "write a byte to a socket after each input period"
+    },
+    {
+        "instream_set_overflow_policy",
+        pysoundio__instream_set_overflow_policy, METH_VARARGS,
+        "set what happens when the input ring buffer is full"
+    },
+    {
+        "instream_set_convert",
+        pysoundio__instream_set_convert, METH_VARARGS,
+        "convert samples to native float32 in the ring buffer"
+    },
+    {
+        "instream_set_channel_matrix",
+        pysoundio__instream_set_channel_matrix, METH_VARARGS,
+        "mix the device channels into the channels in the ring buffer"
+    },
+    {
+        "instream_set_resampler",
+        pysoundio__instream_set_resampler, METH_VARARGS,
+        "resample from the device rate to a sample rate in the ring buffer"
+    },
+    {
+        "instream_set_block_bytes",
+        pysoundio__instream_set_block_bytes, METH_VARARGS,
+        "only notify the dispatcher once a block is buffered"
+    },
+    {
+        "instream_set_history",
+        pysoundio__instream_set_history, METH_VARARGS,
+        "keep the newest frames in the input ring buffer, up to a size"
+    },
+    {
+        "instream_snapshot",
+        pysoundio__instream_snapshot, METH_VARARGS,
+        "copy the newest frames in the input ring buffer and their stream position"
+    },
+    {
+        "instream_frame_at",
+        pysoundio__instream_frame_at, METH_VARARGS,
+        "get the frame of the capture timeline at a time"
+    },
+    {
+        "instream_time_at",
+        pysoundio__instream_time_at, METH_VARARGS,
+        "get the capture time of a frame of the capture timeline"
+    },
+    {
+        "instream_read_range",
+        pysoundio__instream_read_range, METH_VARARGS,
+        "copy the input ring buffer data between two stream positions"
+    },
+    {
+        "instream_read_begin",
+        pysoundio__instream_read_begin, METH_VARARGS,
+        "get a view of the input ring buffer data and its stream position"
+    },
+    {
+        "instream_read_end",
+        pysoundio__instream_read_end, METH_VARARGS,
+        "release input ring buffer data up to a stream position"
+    },
+    {
+        "instream_get_gaps",
+        pysoundio__instream_get_gaps, METH_VARARGS,
+        "get gap markers recorded since the last call"
+    },
+    {
+        "instream_get_stats",
+        pysoundio__instream_get_stats, METH_VARARGS,
+        "get input stream counters"
+    },
+    {
+        "instream_set_passthrough",
+        pysoundio__instream_set_passthrough, METH_VARARGS,
+        "also write captured frames to an output ring buffer"
+    },
+    {
+        "monotonic_time",
+        pysoundio__monotonic_time, METH_VARARGS,
+        "get the time in seconds used for stream timestamps"
     },
     {
         "outstream_create",
@@ -283,15 +413,65 @@ static PyMethodDef soundio_methods[] = {
         pysoundio__outstream_set_volume, METH_VARARGS,
         "set output stream volume"
     },
+    {
+        "outstream_get_stats",
+        pysoundio__outstream_get_stats, METH_VARARGS,
+        "get output stream counters"
+    },
+    {
+        "outstream_set_convert",
+        pysoundio__outstream_set_convert, METH_VARARGS,
+        "convert samples from native float32 in the ring buffer"
+    },
+    {
+        "outstream_set_channel_matrix",
+        pysoundio__outstream_set_channel_matrix, METH_VARARGS,
+        "mix the channels in the ring buffer into the device channels"
+    },
+    {
+        "outstream_set_resampler",
+        pysoundio__outstream_set_resampler, METH_VARARGS,
+        "resample from a sample rate in the ring buffer to the device rate"
+    },
+    {
+        "outstream_set_refill_bytes",
+        pysoundio__outstream_set_refill_bytes, METH_VARARGS,
+        "only notify the dispatcher once the ring buffer has drained"
+    },
+    {
+        "outstream_wait_events",
+        pysoundio__outstream_wait_events, METH_VARARGS,
+        "wait for events from the output stream callbacks"
+    },
+    {
+        "outstream_interrupt",
+        pysoundio__outstream_interrupt, METH_VARARGS,
+        "wake a thread waiting for output stream events"
+    },
+    {
+        "outstream_set_notify_fd",
+        pysoundio__outstream_set_notify_fd, METH_VARARGS,
+        "write a byte to a socket after each output period"
+    },
+    {
+        "outstream_wait",
+        pysoundio__outstream_wait, METH_VARARGS,
+        "wait until the output ring buffer has a number of bytes free"
+    },
+    {
+        "ring_buffer_create",
+        pysoundio__ring_buffer_create, METH_VARARGS,
+        "create ring buffer"
+    },
     {
         "input_ring_buffer_create",
         pysoundio__input_ring_buffer_create, METH_VARARGS,
-        "create input ring buffer"
+        "create ring buffer for an input stream"
     },
     {
         "output_ring_buffer_create",
         pysoundio__output_ring_buffer_create, METH_VARARGS,
-        "create output ring buffer"
+        "create ring buffer for an output stream"
     },
     {
         "ring_buffer_destroy",
@@ -306,7 +486,7 @@ static PyMethodDef soundio_methods[] = {
     {
         "ring_buffer_read_ptr",
         pysoundio__ring_buffer_read_ptr, METH_VARARGS,
-        "get pointer to read from buffer"
+        "get a read only view of the data available in the buffer"
     },
     {
         "ring_buffer_advance_read_ptr",
@@ -318,6 +498,11 @@ static PyMethodDef soundio_methods[] = {
         pysoundio__ring_buffer_write_ptr, METH_VARARGS,
         "get pointer to write to buffer"
     },
+    {
+        "ring_buffer_write_view",
+        pysoundio__ring_buffer_write_view, METH_VARARGS,
+        "get a writable view of the free space in the buffer"
+    },
     {
         "ring_buffer_free_count",
         pysoundio__ring_buffer_free_count, METH_VARARGS,
@@ -344,799 +529,2979 @@ static PyMethodDef soundio_methods[] = {
 
 static PyObject *PySoundIoError;
 
-struct RecordContext {
-    struct SoundIo *soundio;
+/*************************************************************
+ * Platform Helpers
+ *************************************************************/
 
-    struct SoundIoDevice *input_device;
-    struct SoundIoDevice *output_device;
+/*
+ * State shared between the real time callbacks and Python threads
+ * is accessed with these, the callbacks must never block on a lock.
+ */
+#if defined(_MSC_VER)
+#define atomic_load_int(p) InterlockedCompareExchange((volatile LONG *)(p), 0, 0)
+#define atomic_store_int(p, v) InterlockedExchange((volatile LONG *)(p), (v))
+#define atomic_exchange_int(p, v) InterlockedExchange((volatile LONG *)(p), (v))
+#define atomic_add_int(p, v) InterlockedExchangeAdd((volatile LONG *)(p), (v))
+#define atomic_load_uint(p) ((unsigned int)InterlockedCompareExchange((volatile LONG *)(p), 0, 0))
+#define atomic_store_uint(p, v) InterlockedExchange((volatile LONG *)(p), (LONG)(v))
+#define atomic_load_i64(p) InterlockedCompareExchange64((volatile LONGLONG *)(p), 0, 0)
+#define atomic_store_i64(p, v) InterlockedExchange64((volatile LONGLONG *)(p), (v))
+#define atomic_add_i64(p, v) InterlockedExchangeAdd64((volatile LONGLONG *)(p), (v))
+#define atomic_fence() MemoryBarrier()
+#else
+#define atomic_load_int(p) __atomic_load_n((p), __ATOMIC_ACQUIRE)
+#define atomic_store_int(p, v) __atomic_store_n((p), (v), __ATOMIC_RELEASE)
+#define atomic_exchange_int(p, v) __atomic_exchange_n((p), (v), __ATOMIC_ACQUIRE)
+#define atomic_add_int(p, v) __atomic_fetch_add((p), (v), __ATOMIC_ACQ_REL)
+#define atomic_load_uint(p) __atomic_load_n((unsigned int *)(p), __ATOMIC_ACQUIRE)
+#define atomic_store_uint(p, v) __atomic_store_n((unsigned int *)(p), (unsigned int)(v), __ATOMIC_RELEASE)
+#define atomic_load_i64(p) __atomic_load_n((p), __ATOMIC_RELAXED)
+#define atomic_store_i64(p, v) __atomic_store_n((p), (v), __ATOMIC_RELAXED)
+#define atomic_add_i64(p, v) __atomic_fetch_add((p), (v), __ATOMIC_RELAXED)
+#define atomic_fence() __atomic_thread_fence(__ATOMIC_SEQ_CST)
+#endif
 
-    struct SoundIoInStream *input_stream;
-    struct SoundIoOutStream *output_stream;
+/*
+ * Spin lock, the real time callbacks only ever try to take it.
+ */
+static int
+spin_trylock(int *lock)
+{
+    return atomic_exchange_int(lock, 1) == 0;
+}
 
-    struct SoundIoRingBuffer *input_buffer;
-    struct SoundIoRingBuffer *output_buffer;
+static void
+spin_lock(int *lock)
+{
+    while (!spin_trylock(lock))
+        continue;
+}
 
-    PyObject *read_callback;
-    PyObject *write_callback;
-    PyObject *overflow_callback;
-    PyObject *underflow_callback;
-};
-struct RecordContext rc;
+static void
+spin_unlock(int *lock)
+{
+    atomic_store_int(lock, 0);
+}
 
-static int min_int(int a, int b) {
-    return (a < b) ? a : b;
+/*
+ * Seconds on a monotonic clock. Every stream is timed with
+ * this clock, so captures from different devices share a timeline.
+ */
+static double
+monotonic_time(void)
+{
+#ifdef _WIN32
+    LARGE_INTEGER count, frequency;
+    QueryPerformanceCounter(&count);
+    QueryPerformanceFrequency(&frequency);
+    return (double)count.QuadPart / (double)frequency.QuadPart;
+#else
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return ts.tv_sec + ts.tv_nsec / 1e9;
+#endif
 }
 
-#if PY_MAJOR_VERSION==2
-#define FORMAT_DATA_READ_ID     "s#"
+/*
+ * Counting semaphore, posted by the real time callbacks and waited on
+ * by Python threads with the GIL released. Posting never blocks.
+ */
+#if defined(_WIN32)
+typedef HANDLE notifier_t;
+#elif defined(__APPLE__)
+typedef dispatch_semaphore_t notifier_t;
 #else
-#define FORMAT_DATA_READ_ID     "y#"
+typedef sem_t notifier_t;
 #endif
 
+static int
+notifier_init(notifier_t *n)
+{
+#if defined(_WIN32)
+    *n = CreateSemaphore(NULL, 0, LONG_MAX, NULL);
+    return *n ? 0 : -1;
+#elif defined(__APPLE__)
+    *n = dispatch_semaphore_create(0);
+    return *n ? 0 : -1;
+#else
+    return sem_init(n, 0, 0);
+#endif
+}
 
-/*************************************************************
- * Initialisation
- *************************************************************/
+static void
+notifier_destroy(notifier_t *n)
+{
+#if defined(_WIN32)
+    CloseHandle(*n);
+#elif defined(__APPLE__)
+    dispatch_release(*n);
+#else
+    sem_destroy(n);
+#endif
+}
 
-static PyObject *
-pysoundio__create(PyObject *self, PyObject *args)
+static void
+notifier_post(notifier_t *n)
 {
-    if (!PyArg_ParseTuple(args, ""))
-        return NULL;
+#if defined(_WIN32)
+    ReleaseSemaphore(*n, 1, NULL);
+#elif defined(__APPLE__)
+    dispatch_semaphore_signal(*n);
+#else
+    sem_post(n);
+#endif
+}
 
-    rc.soundio = soundio_create();
-    if (!rc.soundio) {
-        PyErr_SetString(PySoundIoError, "Out of memory");
-        return NULL;
+/*
+ * Wait for a post, or until timeout seconds have passed.
+ * A negative timeout waits forever. Returns 0 when posted.
+ */
+static int
+notifier_wait(notifier_t *n, double timeout)
+{
+#if defined(_WIN32)
+    DWORD ms = timeout < 0 ? INFINITE : (DWORD)(timeout * 1000);
+    return WaitForSingleObject(*n, ms) == WAIT_OBJECT_0 ? 0 : -1;
+#elif defined(__APPLE__)
+    dispatch_time_t when = timeout < 0 ? DISPATCH_TIME_FOREVER :
+        dispatch_time(DISPATCH_TIME_NOW, (int64_t)(timeout * 1e9));
+    return dispatch_semaphore_wait(*n, when) ? -1 : 0;
+#else
+    int err;
+    if (timeout < 0) {
+        while ((err = sem_wait(n)) == -1 && errno == EINTR)
+            continue;
+        return err;
     }
-
-    return PyLong_FromVoidPtr(rc.soundio);
+    struct timespec ts;
+    clock_gettime(CLOCK_REALTIME, &ts);
+    long long nsec = ts.tv_nsec + (long long)((timeout - (long long)timeout) * 1e9);
+    ts.tv_sec += (time_t)timeout + nsec / 1000000000;
+    ts.tv_nsec = nsec % 1000000000;
+    while ((err = sem_timedwait(n, &ts)) == -1 && errno == EINTR)
+        continue;
+    return err;
+#endif
 }
 
-static PyObject *
-pysoundio__destroy(PyObject *self, PyObject *args)
-{
-    if (!PyArg_ParseTuple(args, ""))
-        return NULL;
+/*
+ * What the read callback does when the input ring buffer is full.
+ */
+enum OverflowPolicy {
+    // Keep the buffered frames, discard the frames being captured
+    OverflowDropNewest,
+    // Discard the oldest buffered frames to make room. While Python
+    // holds a view from instream_read_begin, the buffered frames are
+    // kept and the frames being captured are discarded instead.
+    OverflowDropOldest,
+    // Discard the frames being captured, and later replace them with
+    // the same number of silent frames, recording a gap marker
+    OverflowGap,
+};
 
-    soundio_destroy(rc.soundio);
-    Py_RETURN_NONE;
-}
+#define GAP_MARKERS 64
 
-static PyObject *
-pysoundio__connect(PyObject *self, PyObject *args)
+/*
+ * Events queued by the real time callbacks for the Python dispatcher,
+ * which are the only way the callbacks communicate with Python.
+ * They never take the GIL.
+ */
+enum StreamEventType {
+    // frames were captured, or frames are needed for playback
+    StreamEventData,
+    // frames were lost to an overflow or underflow
+    StreamEventXrun,
+};
+
+#define EVENT_QUEUE_SIZE 256
+
+struct StreamEvent {
+    int type;
+    int frames;
+    double time;
+};
+
+struct GapMarker {
+    long long frame;
+    long long length;
+};
+
+#define MIN_TIMING_ANCHORS 256
+
+/*
+ * The total frames read from the device and the time they were
+ * read, recorded after every read callback.
+ */
+struct TimingAnchor {
+    long long frame;
+    double time;
+};
+
+/*
+ * Precomputed mixing matrix between the device channels and the
+ * stream channels in the ring buffer. Only the non zero gains are
+ * kept, as a list of terms for each destination channel, so a
+ * channel which is only selected is decoded straight into place
+ * and unused device channels are never touched. Destinations are
+ * the stream channels for input, and the device channels for output.
+ */
+struct ChannelMixer {
+    int device_channels;
+    int stream_channels;
+    int *first;
+    int *sources;
+    float *gains;
+    float *scratch;
+};
+
+/*
+ * State owned by each SoundIo struct, stored in its userdata.
+ */
+struct SoundIoContext {
+    // Bumped by on_devices_change, which libsoundio only calls from
+    // soundio_flush_events or soundio_wait_events, so Python can tell
+    // whether the device list has changed since it last looked
+    int devices_changed;
+};
+
+/*
+ * State owned by each input or output stream, stored in the stream
+ * userdata. Every PySoundIo instance has its own SoundIo struct, so
+ * any number of instances and streams can run in one process.
+ */
+struct StreamContext {
+    struct SoundIoRingBuffer *buffer;
+
+    // Samples are converted between the device format and native
+    // float32 in the ring buffer, see stream_frame_bytes
+    int convert;
+
+    // Mixes between the device channels and the ring buffer channels, or NULL
+    struct ChannelMixer *mixer;
+
+    // Converts between the device rate and the ring buffer rate, or NULL
+    struct Resampler *resampler;
+
+    // Capture timeline, the total frames read from the device and
+    // the time they were read. Published by the read callback under
+    // a sequence lock, the count is odd while an update is in progress.
+    int timing_seq;
+    long long frames_read;
+    double read_time;
+
+    // The last anchor_count points of the capture timeline, one per
+    // read callback, published under the same sequence lock. Times are
+    // mapped to frames by interpolating between them, so frames lost
+    // to overflows and clock drift do not shift older audio. Sized
+    // with the ring buffer to cover all of the audio it can hold.
+    struct TimingAnchor *anchors;
+    int anchor_count;
+    long long anchors_written;
+
+    // Duplex passthrough, captured frames are also written to this
+    // output ring buffer, scaled by gain. Both are changed under
+    // passthrough_lock, so the buffer is never freed while the read
+    // callback is writing to it.
+    struct SoundIoRingBuffer *passthrough;
+    int passthrough_lock;
+    float gain;
+
+    // Posted after each period moves data through the ring buffer,
+    // while threads are blocked in wait_for_bytes
+    notifier_t notifier;
+    int waiters;
+
+    // Events for the Python dispatcher, posted to event_notifier. The
+    // queue is only filled once a dispatcher has waited on it. The
+    // counters are unsigned so they wrap safely, EVENT_QUEUE_SIZE
+    // must be a power of two.
+    struct StreamEvent events[EVENT_QUEUE_SIZE];
+    unsigned int events_written;
+    unsigned int events_read;
+    int events_enabled;
+    long long events_lost;
+    notifier_t event_notifier;
+
+    // Input data events are only pushed once the ring buffer holds
+    // at least this many bytes, so the dispatcher wakes once per block
+    int block_bytes;
+
+    // When set, the ring buffer is a history of the newest frames,
+    // the read callback releases the oldest beyond this many bytes
+    int history_bytes;
+
+    // Output data events are only pushed once the ring buffer has
+    // drained to this many bytes, or every period when it is 0
+    int refill_bytes;
+
+    // Socket written after each period, for event loops, or -1
+    long long notify_fd;
+
+    // Input overflow handling, see enum OverflowPolicy. Under drop
+    // oldest the read callback also moves the read pointer, so all
+    // reads go through read_lock, and read_position counts the bytes
+    // of the stream consumed or dropped.
+    int overflow_policy;
+    int read_lock;
+    long long read_position;
+
+    // The number of readers of the ring buffer memory, counted under
+    // read_lock from instream_read_begin to instream_read_end and while
+    // instream_read_range copies, so the read callback never releases
+    // frames that are still being read
+    int read_active;
+
+    // Frames lost under the gap policy, still to be filled with silence
+    int gap_pending;
+    long long gap_start;
+    long long gap_length;
+
+    // Gap markers, a single producer single consumer queue, with
+    // unsigned counters like the event queue
+    struct GapMarker gaps[GAP_MARKERS];
+    unsigned int gaps_written;
+    unsigned int gaps_read;
+
+    // Counters, read by Python while the stream is running
+    long long overflows;
+    long long underflows;
+    long long frames_dropped;
+    long long holes;
+    long long silence_frames;
+    long long errors;
+
+    // Performance counters, only written by the stream callback,
+    // with callback durations in nanoseconds
+    long long callbacks;
+    long long frames_transferred;
+    int high_water;
+    long long callback_ns_min;
+    long long callback_ns_max;
+    long long callback_ns_total;
+};
+
+static struct StreamContext *
+stream_context_create(void)
 {
-    if (!PyArg_ParseTuple(args, ""))
+    struct StreamContext *ctx = calloc(1, sizeof(struct StreamContext));
+    if (ctx && notifier_init(&ctx->notifier)) {
+        free(ctx);
         return NULL;
-
-    int err = soundio_connect(rc.soundio);
-    if (err) {
-        PyErr_SetString(PySoundIoError, soundio_strerror(err));
+    }
+    if (ctx && notifier_init(&ctx->event_notifier)) {
+        notifier_destroy(&ctx->notifier);
+        free(ctx);
         return NULL;
     }
-    return Py_BuildValue("i", err);
+    if (ctx)
+        ctx->notify_fd = -1;
+    return ctx;
 }
 
-static PyObject *
-pysoundio__disconnect(PyObject *self, PyObject *args)
+/*
+ * Signal waiting threads and event loops that a period has
+ * moved data through the ring buffer. The notify socket is non
+ * blocking, if it is full the reader already has a wakeup pending.
+ */
+static void
+stream_context_notify(struct StreamContext *ctx)
 {
-    if (!PyArg_ParseTuple(args, ""))
-        return NULL;
+    atomic_fence();
+    if (atomic_load_int(&ctx->waiters))
+        notifier_post(&ctx->notifier);
+    if (ctx->notify_fd < 0)
+        return;
+#ifdef _WIN32
+    send((SOCKET)ctx->notify_fd, "", 1, 0);
+#else
+    if (write((int)ctx->notify_fd, "", 1) < 0)
+        return;
+#endif
+}
 
-    soundio_disconnect(rc.soundio);
-    Py_RETURN_NONE;
+static void mixer_destroy(struct ChannelMixer *m);
+static void resampler_destroy(struct Resampler *r);
+
+static void
+stream_context_destroy(struct StreamContext *ctx)
+{
+    if (!ctx)
+        return;
+    notifier_destroy(&ctx->notifier);
+    notifier_destroy(&ctx->event_notifier);
+    mixer_destroy(ctx->mixer);
+    resampler_destroy(ctx->resampler);
+    free(ctx->anchors);
+    free(ctx);
 }
 
-static PyObject *
-pysoundio__connect_backend(PyObject *self, PyObject *args)
+/*
+ * Channels, bytes per frame and sample format in the ring buffer, which
+ * holds native float32 when the stream converts samples, and the mixed
+ * channels when the stream has a channel matrix.
+ */
+static int
+stream_channels(struct StreamContext *ctx, int channel_count)
 {
-    int backend;
+    return ctx->mixer ? ctx->mixer->stream_channels : channel_count;
+}
 
-    if (!PyArg_ParseTuple(args, "i", &backend))
-        return NULL;
+static int
+stream_frame_bytes(struct StreamContext *ctx, int channel_count, int bytes_per_frame)
+{
+    return ctx->convert ? stream_channels(ctx, channel_count) * (int)sizeof(float) : bytes_per_frame;
+}
 
-    int err = soundio_connect_backend(rc.soundio, backend);
-    if (err) {
-        PyErr_SetString(PySoundIoError, soundio_strerror(err));
-        return NULL;
-    }
-    return Py_BuildValue("i", err);
+static enum SoundIoFormat
+stream_sample_format(struct StreamContext *ctx, enum SoundIoFormat format)
+{
+    return ctx->convert ? SoundIoFormatFloat32NE : format;
 }
 
-static PyObject *
-pysoundio__backend_count(PyObject *self, PyObject *args)
+/*
+ * Block with the GIL released until the ring buffer has at least
+ * bytes filled, for input, or free, for output. Returns the count
+ * available, which is less than bytes if the timeout expired.
+ */
+static int
+wait_for_bytes(struct StreamContext *ctx, int output, int bytes, double timeout)
 {
-    if (!PyArg_ParseTuple(args, ""))
-        return NULL;
+    double deadline = monotonic_time() + timeout;
+    int count;
 
-    int backends = soundio_backend_count(rc.soundio);
-    return Py_BuildValue("i", backends);
+    Py_BEGIN_ALLOW_THREADS
+    atomic_add_int(&ctx->waiters, 1);
+    atomic_fence();
+    for (;;) {
+        count = output ? soundio_ring_buffer_free_count(ctx->buffer)
+                       : soundio_ring_buffer_fill_count(ctx->buffer);
+        if (count >= bytes)
+            break;
+        double remaining = -1.0;
+        if (timeout >= 0) {
+            remaining = deadline - monotonic_time();
+            if (remaining <= 0)
+                break;
+        }
+        notifier_wait(&ctx->notifier, remaining);
+    }
+    atomic_add_int(&ctx->waiters, -1);
+    Py_END_ALLOW_THREADS
+    return count;
 }
 
-static PyObject *
-pysoundio__flush(PyObject *self, PyObject *args)
+/*
+ * Queue an event for the dispatcher, from the real time thread.
+ * If the queue is full the event is counted as lost, the
+ * dispatcher is still woken and reads the ring buffer state.
+ */
+static void
+push_event(struct StreamContext *ctx, int type, int frames, double time)
 {
-    if (!PyArg_ParseTuple(args, ""))
-        return NULL;
+    if (!atomic_load_int(&ctx->events_enabled))
+        return;
+    unsigned int written = ctx->events_written;
+    if (written - atomic_load_uint(&ctx->events_read) >= EVENT_QUEUE_SIZE) {
+        atomic_add_i64(&ctx->events_lost, 1);
+    } else {
+        ctx->events[written % EVENT_QUEUE_SIZE].type = type;
+        ctx->events[written % EVENT_QUEUE_SIZE].frames = frames;
+        ctx->events[written % EVENT_QUEUE_SIZE].time = time;
+        atomic_store_uint(&ctx->events_written, written + 1);
+    }
+    notifier_post(&ctx->event_notifier);
+}
 
-    soundio_flush_events(rc.soundio);
-    Py_RETURN_NONE;
+/*
+ * Update the performance counters at the end of a callback which
+ * started at start, moved frames through the ring buffer, and left
+ * fill bytes in it. The callback is the only writer, so the
+ * minimum, maximum and high water can be compared then stored.
+ */
+static void
+record_callback(struct StreamContext *ctx, double start, int frames, int fill)
+{
+    long long elapsed = (long long)((monotonic_time() - start) * 1e9);
+
+    if (!atomic_load_i64(&ctx->callbacks) || elapsed < atomic_load_i64(&ctx->callback_ns_min))
+        atomic_store_i64(&ctx->callback_ns_min, elapsed);
+    if (elapsed > atomic_load_i64(&ctx->callback_ns_max))
+        atomic_store_i64(&ctx->callback_ns_max, elapsed);
+    if (fill > atomic_load_int(&ctx->high_water))
+        atomic_store_int(&ctx->high_water, fill);
+    atomic_add_i64(&ctx->callback_ns_total, elapsed);
+    atomic_add_i64(&ctx->frames_transferred, frames);
+    atomic_add_i64(&ctx->callbacks, 1);
 }
 
+/*
+ * Adds the performance counters to the counters dict and returns it,
+ * the callback durations are converted to seconds.
+ */
 static PyObject *
-pysoundio__wait_events(PyObject *self, PyObject *args)
+stream_stats(struct StreamContext *ctx, PyObject *counters)
 {
-    if (!PyArg_ParseTuple(args, ""))
-        return NULL;
+    long long callbacks = atomic_load_i64(&ctx->callbacks);
+    long long total = atomic_load_i64(&ctx->callback_ns_total);
 
-    soundio_wait_events(rc.soundio);
-    Py_RETURN_NONE;
+    if (!counters)
+        return NULL;
+    PyObject *stats = Py_BuildValue("{sLsLsisdsdsdsL}",
+                         "callbacks", callbacks,
+                         "frames_transferred", atomic_load_i64(&ctx->frames_transferred),
+                         "high_water", atomic_load_int(&ctx->high_water),
+                         "callback_time_min", atomic_load_i64(&ctx->callback_ns_min) / 1e9,
+                         "callback_time_max", atomic_load_i64(&ctx->callback_ns_max) / 1e9,
+                         "callback_time_mean", callbacks ? total / 1e9 / callbacks : 0.0,
+                         "events_lost", atomic_load_i64(&ctx->events_lost));
+    if (!stats || PyDict_Update(counters, stats)) {
+        Py_XDECREF(stats);
+        Py_DECREF(counters);
+        return NULL;
+    }
+    Py_DECREF(stats);
+    return counters;
 }
 
+/*
+ * Wait with the GIL released for events, or until timeout seconds
+ * have passed, and return the queued events as a list of
+ * (type, frames, time) tuples, which is empty on timeout.
+ */
 static PyObject *
-pysoundio__wakeup(PyObject *self, PyObject *args)
+wait_events(struct StreamContext *ctx, double timeout)
 {
-    if (!PyArg_ParseTuple(args, ""))
-        return NULL;
+    atomic_store_int(&ctx->events_enabled, 1);
+    if (atomic_load_uint(&ctx->events_written) == ctx->events_read) {
+        Py_BEGIN_ALLOW_THREADS
+        notifier_wait(&ctx->event_notifier, timeout);
+        Py_END_ALLOW_THREADS
+    }
 
-    soundio_wakeup(rc.soundio);
-    Py_RETURN_NONE;
+    PyObject *events = PyList_New(0);
+    if (!events)
+        return NULL;
+    unsigned int written = atomic_load_uint(&ctx->events_written);
+    for (unsigned int i = ctx->events_read; i != written; i += 1) {
+        struct StreamEvent *event = &ctx->events[i % EVENT_QUEUE_SIZE];
+        PyObject *item = Py_BuildValue("(iid)", event->type, event->frames, event->time);
+        if (!item || PyList_Append(events, item)) {
+            Py_XDECREF(item);
+            Py_DECREF(events);
+            return NULL;
+        }
+        Py_DECREF(item);
+    }
+    atomic_store_uint(&ctx->events_read, written);
+    return events;
 }
 
+static int min_int(int a, int b) {
+    return (a < b) ? a : b;
+}
 
 /*************************************************************
- * Debugging
+ * Channel Area Copying
  *************************************************************/
 
-static PyObject *
-pysoundio__version_string(PyObject *self, PyObject *args)
+/*
+ * Interleaved devices have adjacent channels with a step of one
+ * frame, so a whole chunk can be copied with a single memcpy.
+ */
+static int
+areas_are_contiguous(struct SoundIoChannelArea *areas, int channel_count,
+                     int bytes_per_sample)
 {
-    if (!PyArg_ParseTuple(args, ""))
-        return NULL;
-
-    if (sizeof(struct SoundIoOutStream) < 200) { // < v2.0.0
-        const char *version = "-.-.-";
-        return Py_BuildValue("s", version);
-    } else {
-        char version[6];
-        sprintf(version, "%d.%d.%d", soundio_version_major(),
-            soundio_version_minor(), soundio_version_patch());
-        return Py_BuildValue("s", version);
+    int bytes_per_frame = channel_count * bytes_per_sample;
+    for (int ch = 0; ch < channel_count; ch += 1) {
+        if (areas[ch].step != bytes_per_frame ||
+            areas[ch].ptr != areas[0].ptr + ch * bytes_per_sample)
+            return 0;
     }
+    return 1;
 }
 
-static PyObject *
+#define COPY_SAMPLES(size, dst, dst_step, src, src_step) \
+    for (int frame = 0; frame < frame_count; frame += 1) { \
+        memcpy(dst, src, size); \
+        dst += dst_step; \
+        src += src_step; \
+    }
+
+/*
+ * Copy frames from the channel areas into an interleaved buffer.
+ */
+static void
+read_areas(char *dst, struct SoundIoChannelArea *areas, int channel_count,
+           int bytes_per_sample, int frame_count)
+{
+    int bytes_per_frame = channel_count * bytes_per_sample;
+
+    if (areas_are_contiguous(areas, channel_count, bytes_per_sample)) {
+        memcpy(dst, areas[0].ptr, frame_count * bytes_per_frame);
+        return;
+    }
+    for (int ch = 0; ch < channel_count; ch += 1) {
+        char *d = dst + ch * bytes_per_sample;
+        char *s = areas[ch].ptr;
+        int step = areas[ch].step;
+        switch (bytes_per_sample) {
+        case 1: COPY_SAMPLES(1, d, bytes_per_frame, s, step); break;
+        case 2: COPY_SAMPLES(2, d, bytes_per_frame, s, step); break;
+        case 3: COPY_SAMPLES(3, d, bytes_per_frame, s, step); break;
+        case 4: COPY_SAMPLES(4, d, bytes_per_frame, s, step); break;
+        case 8: COPY_SAMPLES(8, d, bytes_per_frame, s, step); break;
+        default: COPY_SAMPLES(bytes_per_sample, d, bytes_per_frame, s, step); break;
+        }
+    }
+}
+
+/*
+ * Copy frames from an interleaved buffer into the channel areas.
+ */
+static void
+write_areas(struct SoundIoChannelArea *areas, const char *src, int channel_count,
+            int bytes_per_sample, int frame_count)
+{
+    int bytes_per_frame = channel_count * bytes_per_sample;
+
+    if (areas_are_contiguous(areas, channel_count, bytes_per_sample)) {
+        memcpy(areas[0].ptr, src, frame_count * bytes_per_frame);
+        return;
+    }
+    for (int ch = 0; ch < channel_count; ch += 1) {
+        char *d = areas[ch].ptr;
+        const char *s = src + ch * bytes_per_sample;
+        int step = areas[ch].step;
+        switch (bytes_per_sample) {
+        case 1: COPY_SAMPLES(1, d, step, s, bytes_per_frame); break;
+        case 2: COPY_SAMPLES(2, d, step, s, bytes_per_frame); break;
+        case 3: COPY_SAMPLES(3, d, step, s, bytes_per_frame); break;
+        case 4: COPY_SAMPLES(4, d, step, s, bytes_per_frame); break;
+        case 8: COPY_SAMPLES(8, d, step, s, bytes_per_frame); break;
+        default: COPY_SAMPLES(bytes_per_sample, d, step, s, bytes_per_frame); break;
+        }
+    }
+}
+
+/*
+ * Fill the channel areas with silence.
+ */
+static void
+silence_areas(struct SoundIoChannelArea *areas, int channel_count,
+              int bytes_per_sample, int frame_count)
+{
+    if (areas_are_contiguous(areas, channel_count, bytes_per_sample)) {
+        memset(areas[0].ptr, 0, frame_count * channel_count * bytes_per_sample);
+        return;
+    }
+    for (int ch = 0; ch < channel_count; ch += 1) {
+        char *d = areas[ch].ptr;
+        for (int frame = 0; frame < frame_count; frame += 1) {
+            memset(d, 0, bytes_per_sample);
+            d += areas[ch].step;
+        }
+    }
+}
+
+/*************************************************************
+ * Sample Format Conversion
+ *************************************************************/
+
+/*
+ * Samples are assembled from bytes, so every byte order is handled on
+ * any host, compilers reduce the native byte order to a plain load.
+ * libsoundio 24 bit formats use the low three bytes of a 32 bit word.
+ */
+#define LOAD16LE(p) ((uint16_t)((p)[0] | ((p)[1] << 8)))
+#define LOAD16BE(p) ((uint16_t)((p)[1] | ((p)[0] << 8)))
+#define LOAD32LE(p) ((uint32_t)(p)[0] | ((uint32_t)(p)[1] << 8) | \
+                     ((uint32_t)(p)[2] << 16) | ((uint32_t)(p)[3] << 24))
+#define LOAD32BE(p) ((uint32_t)(p)[3] | ((uint32_t)(p)[2] << 8) | \
+                     ((uint32_t)(p)[1] << 16) | ((uint32_t)(p)[0] << 24))
+#define LOAD64LE(p) ((uint64_t)LOAD32LE(p) | ((uint64_t)LOAD32LE((p) + 4) << 32))
+#define LOAD64BE(p) ((uint64_t)LOAD32BE((p) + 4) | ((uint64_t)LOAD32BE(p) << 32))
+#define SIGN24(w) ((int32_t)((w) << 8) >> 8)
+
+#define STORE16LE(p, v) ((p)[0] = (unsigned char)(v), (p)[1] = (unsigned char)((v) >> 8))
+#define STORE16BE(p, v) ((p)[1] = (unsigned char)(v), (p)[0] = (unsigned char)((v) >> 8))
+#define STORE32LE(p, v) (STORE16LE(p, (v) & 0xffff), STORE16LE((p) + 2, (v) >> 16))
+#define STORE32BE(p, v) (STORE16BE((p) + 2, (v) & 0xffff), STORE16BE(p, (v) >> 16))
+#define STORE64LE(p, v) (STORE32LE(p, (uint32_t)(v)), STORE32LE((p) + 4, (uint32_t)((v) >> 32)))
+#define STORE64BE(p, v) (STORE32BE((p) + 4, (uint32_t)(v)), STORE32BE(p, (uint32_t)((v) >> 32)))
+
+static float
+bits_to_float(uint32_t bits)
+{
+    float value;
+    memcpy(&value, &bits, sizeof(value));
+    return value;
+}
+
+static double
+bits_to_double(uint64_t bits)
+{
+    double value;
+    memcpy(&value, &bits, sizeof(value));
+    return value;
+}
+
+static uint32_t
+float_to_bits(float value)
+{
+    uint32_t bits;
+    memcpy(&bits, &value, sizeof(bits));
+    return bits;
+}
+
+static uint64_t
+double_to_bits(double value)
+{
+    uint64_t bits;
+    memcpy(&bits, &value, sizeof(bits));
+    return bits;
+}
+
+static int
+convert_supported(enum SoundIoFormat format)
+{
+    return format >= SoundIoFormatS8 && format <= SoundIoFormatFloat64BE;
+}
+
+/*
+ * The format is switched on once per run of samples, so each
+ * loop is a simple strided load, scale and store which compilers
+ * vectorise when the samples are contiguous.
+ */
+#define DECODE_LOOP(expr) \
+    for (int i = 0; i < count; i += 1) { \
+        const unsigned char *p = s + i * src_step; \
+        dst[i * dst_step] = (float)(expr); \
+    }
+
+/*
+ * Convert count samples of format to float32 in the range -1 to 1.
+ * Steps are in floats for dst and bytes for src.
+ */
+static void
+decode_samples(float *dst, int dst_step, const char *src, int src_step,
+               enum SoundIoFormat format, int count)
+{
+    const unsigned char *s = (const unsigned char *)src;
+
+    switch (format) {
+    case SoundIoFormatS8: DECODE_LOOP((int8_t)p[0] / 128.0f); break;
+    case SoundIoFormatU8: DECODE_LOOP((p[0] - 128) / 128.0f); break;
+    case SoundIoFormatS16LE: DECODE_LOOP((int16_t)LOAD16LE(p) / 32768.0f); break;
+    case SoundIoFormatS16BE: DECODE_LOOP((int16_t)LOAD16BE(p) / 32768.0f); break;
+    case SoundIoFormatU16LE: DECODE_LOOP(((int)LOAD16LE(p) - 32768) / 32768.0f); break;
+    case SoundIoFormatU16BE: DECODE_LOOP(((int)LOAD16BE(p) - 32768) / 32768.0f); break;
+    case SoundIoFormatS24LE: DECODE_LOOP(SIGN24(LOAD32LE(p)) / 8388608.0f); break;
+    case SoundIoFormatS24BE: DECODE_LOOP(SIGN24(LOAD32BE(p)) / 8388608.0f); break;
+    case SoundIoFormatU24LE: DECODE_LOOP(((int32_t)(LOAD32LE(p) & 0xffffff) - 8388608) / 8388608.0f); break;
+    case SoundIoFormatU24BE: DECODE_LOOP(((int32_t)(LOAD32BE(p) & 0xffffff) - 8388608) / 8388608.0f); break;
+    case SoundIoFormatS32LE: DECODE_LOOP((int32_t)LOAD32LE(p) / 2147483648.0); break;
+    case SoundIoFormatS32BE: DECODE_LOOP((int32_t)LOAD32BE(p) / 2147483648.0); break;
+    case SoundIoFormatU32LE: DECODE_LOOP(((double)LOAD32LE(p) - 2147483648.0) / 2147483648.0); break;
+    case SoundIoFormatU32BE: DECODE_LOOP(((double)LOAD32BE(p) - 2147483648.0) / 2147483648.0); break;
+    case SoundIoFormatFloat32LE: DECODE_LOOP(bits_to_float(LOAD32LE(p))); break;
+    case SoundIoFormatFloat32BE: DECODE_LOOP(bits_to_float(LOAD32BE(p))); break;
+    case SoundIoFormatFloat64LE: DECODE_LOOP(bits_to_double(LOAD64LE(p))); break;
+    case SoundIoFormatFloat64BE: DECODE_LOOP(bits_to_double(LOAD64BE(p))); break;
+    default: break;
+    }
+}
+
+/*
+ * Integer formats are clipped to -1 to 1 and scaled to the
+ * largest positive value, so full scale never wraps around.
+ */
+#define ENCODE_LOOP(store) \
+    for (int i = 0; i < count; i += 1) { \
+        unsigned char *p = d + i * dst_step; \
+        float v = src[i * src_step]; \
+        v = v > 1.0f ? 1.0f : (v < -1.0f ? -1.0f : v); \
+        store; \
+    }
+
+#define ENCODE_FLOAT_LOOP(store) \
+    for (int i = 0; i < count; i += 1) { \
+        unsigned char *p = d + i * dst_step; \
+        float v = src[i * src_step]; \
+        store; \
+    }
+
+/*
+ * Convert count float32 samples to format.
+ * Steps are in bytes for dst and floats for src.
+ */
+static void
+encode_samples(char *dst, int dst_step, const float *src, int src_step,
+               enum SoundIoFormat format, int count)
+{
+    unsigned char *d = (unsigned char *)dst;
+
+    switch (format) {
+    case SoundIoFormatS8: ENCODE_LOOP(p[0] = (unsigned char)(int8_t)(v * 127.0f)); break;
+    case SoundIoFormatU8: ENCODE_LOOP(p[0] = (unsigned char)(v * 127.0f + 128.0f)); break;
+    case SoundIoFormatS16LE: ENCODE_LOOP(STORE16LE(p, (uint16_t)(int16_t)(v * 32767.0f))); break;
+    case SoundIoFormatS16BE: ENCODE_LOOP(STORE16BE(p, (uint16_t)(int16_t)(v * 32767.0f))); break;
+    case SoundIoFormatU16LE: ENCODE_LOOP(STORE16LE(p, (uint16_t)(v * 32767.0f + 32768.0f))); break;
+    case SoundIoFormatU16BE: ENCODE_LOOP(STORE16BE(p, (uint16_t)(v * 32767.0f + 32768.0f))); break;
+    case SoundIoFormatS24LE: ENCODE_LOOP(STORE32LE(p, (uint32_t)(int32_t)(v * 8388607.0f))); break;
+    case SoundIoFormatS24BE: ENCODE_LOOP(STORE32BE(p, (uint32_t)(int32_t)(v * 8388607.0f))); break;
+    case SoundIoFormatU24LE: ENCODE_LOOP(STORE32LE(p, (uint32_t)(v * 8388607.0f + 8388608.0f))); break;
+    case SoundIoFormatU24BE: ENCODE_LOOP(STORE32BE(p, (uint32_t)(v * 8388607.0f + 8388608.0f))); break;
+    case SoundIoFormatS32LE: ENCODE_LOOP(STORE32LE(p, (uint32_t)(int32_t)(v * 2147483647.0))); break;
+    case SoundIoFormatS32BE: ENCODE_LOOP(STORE32BE(p, (uint32_t)(int32_t)(v * 2147483647.0))); break;
+    case SoundIoFormatU32LE: ENCODE_LOOP(STORE32LE(p, (uint32_t)(v * 2147483647.0 + 2147483648.0))); break;
+    case SoundIoFormatU32BE: ENCODE_LOOP(STORE32BE(p, (uint32_t)(v * 2147483647.0 + 2147483648.0))); break;
+    case SoundIoFormatFloat32LE: ENCODE_FLOAT_LOOP(STORE32LE(p, float_to_bits(v))); break;
+    case SoundIoFormatFloat32BE: ENCODE_FLOAT_LOOP(STORE32BE(p, float_to_bits(v))); break;
+    case SoundIoFormatFloat64LE: ENCODE_FLOAT_LOOP(STORE64LE(p, double_to_bits(v))); break;
+    case SoundIoFormatFloat64BE: ENCODE_FLOAT_LOOP(STORE64BE(p, double_to_bits(v))); break;
+    default: break;
+    }
+}
+
+/*
+ * Convert frames from the channel areas into interleaved float32.
+ */
+static void
+decode_areas(float *dst, struct SoundIoChannelArea *areas, int channel_count,
+             enum SoundIoFormat format, int bytes_per_sample, int frame_count)
+{
+    if (areas_are_contiguous(areas, channel_count, bytes_per_sample)) {
+        decode_samples(dst, 1, areas[0].ptr, bytes_per_sample, format, frame_count * channel_count);
+        return;
+    }
+    for (int ch = 0; ch < channel_count; ch += 1)
+        decode_samples(dst + ch, channel_count, areas[ch].ptr, areas[ch].step, format, frame_count);
+}
+
+/*
+ * Convert frames from interleaved float32 into the channel areas.
+ */
+static void
+encode_areas(struct SoundIoChannelArea *areas, const float *src, int channel_count,
+             enum SoundIoFormat format, int bytes_per_sample, int frame_count)
+{
+    if (areas_are_contiguous(areas, channel_count, bytes_per_sample)) {
+        encode_samples(areas[0].ptr, bytes_per_sample, src, 1, format, frame_count * channel_count);
+        return;
+    }
+    for (int ch = 0; ch < channel_count; ch += 1)
+        encode_samples(areas[ch].ptr, areas[ch].step, src + ch, channel_count, format, frame_count);
+}
+
+/*************************************************************
+ * Channel Mixing
+ *************************************************************/
+
+// Frames mixed at a time
+#define MIX_CHUNK 1024
+
+static void
+mixer_destroy(struct ChannelMixer *m)
+{
+    if (!m)
+        return;
+    free(m->first);
+    free(m->sources);
+    free(m->gains);
+    free(m->scratch);
+    free(m);
+}
+
+/*
+ * Create a mixer from a stream_channels by device_channels matrix of
+ * gains, mixing into the stream channels for input and into the
+ * device channels for output. Returns NULL if out of memory.
+ */
+static struct ChannelMixer *
+mixer_create(const float *matrix, int stream_channels, int device_channels, int input)
+{
+    struct ChannelMixer *m = calloc(1, sizeof(struct ChannelMixer));
+    if (!m)
+        return NULL;
+    int destinations = input ? stream_channels : device_channels;
+    int sources = input ? device_channels : stream_channels;
+    m->device_channels = device_channels;
+    m->stream_channels = stream_channels;
+    m->first = calloc(destinations + 1, sizeof(int));
+    m->sources = calloc(stream_channels * device_channels, sizeof(int));
+    m->gains = calloc(stream_channels * device_channels, sizeof(float));
+    m->scratch = calloc(MIX_CHUNK, sizeof(float));
+    if (!m->first || !m->sources || !m->gains || !m->scratch) {
+        mixer_destroy(m);
+        return NULL;
+    }
+
+    int terms = 0;
+    for (int d = 0; d < destinations; d += 1) {
+        m->first[d] = terms;
+        for (int s = 0; s < sources; s += 1) {
+            float gain = input ? matrix[d * device_channels + s] : matrix[s * device_channels + d];
+            if (gain == 0.0f)
+                continue;
+            m->sources[terms] = s;
+            m->gains[terms] = gain;
+            terms += 1;
+        }
+    }
+    m->first[destinations] = terms;
+    return m;
+}
+
+/*
+ * Accumulate count samples of src, scaled by gain, into dst.
+ * Steps are in floats. The first term of a sum overwrites dst.
+ */
+static void
+mix_samples(float *dst, int dst_step, const float *src, int src_step,
+            float gain, int first, int count)
+{
+    if (first) {
+        for (int i = 0; i < count; i += 1)
+            dst[i * dst_step] = gain * src[i * src_step];
+    } else {
+        for (int i = 0; i < count; i += 1)
+            dst[i * dst_step] += gain * src[i * src_step];
+    }
+}
+
+/*
+ * Convert frames from the device channel areas into interleaved
+ * float32 stream channels, mixed through the matrix.
+ */
+static void
+mix_from_areas(struct ChannelMixer *m, float *dst, struct SoundIoChannelArea *areas,
+               enum SoundIoFormat format, int frame_count)
+{
+    int channels = m->stream_channels;
+
+    for (int offset = 0; offset < frame_count; offset += MIX_CHUNK) {
+        int count = min_int(MIX_CHUNK, frame_count - offset);
+        for (int ch = 0; ch < channels; ch += 1) {
+            float *out = dst + offset * channels + ch;
+            int first = m->first[ch];
+            int last = m->first[ch + 1];
+            if (first == last) {
+                for (int i = 0; i < count; i += 1)
+                    out[i * channels] = 0.0f;
+                continue;
+            }
+            for (int t = first; t < last; t += 1) {
+                struct SoundIoChannelArea *area = &areas[m->sources[t]];
+                const char *src = area->ptr + offset * area->step;
+                if (t == first && m->gains[t] == 1.0f) {
+                    decode_samples(out, channels, src, area->step, format, count);
+                    continue;
+                }
+                decode_samples(m->scratch, 1, src, area->step, format, count);
+                mix_samples(out, channels, m->scratch, 1, m->gains[t], t == first, count);
+            }
+        }
+    }
+}
+
+/*
+ * Convert frames from interleaved float32 stream channels into the
+ * device channel areas, mixed through the matrix.
+ */
+static void
+mix_to_areas(struct ChannelMixer *m, struct SoundIoChannelArea *areas, const float *src,
+             enum SoundIoFormat format, int frame_count)
+{
+    int channels = m->stream_channels;
+
+    for (int offset = 0; offset < frame_count; offset += MIX_CHUNK) {
+        int count = min_int(MIX_CHUNK, frame_count - offset);
+        const float *in = src + offset * channels;
+        for (int ch = 0; ch < m->device_channels; ch += 1) {
+            char *out = areas[ch].ptr + offset * areas[ch].step;
+            int first = m->first[ch];
+            int last = m->first[ch + 1];
+            if (last - first == 1 && m->gains[first] == 1.0f) {
+                encode_samples(out, areas[ch].step, in + m->sources[first], channels, format, count);
+                continue;
+            }
+            if (first == last)
+                memset(m->scratch, 0, count * sizeof(float));
+            for (int t = first; t < last; t += 1)
+                mix_samples(m->scratch, 1, in + m->sources[t], channels, m->gains[t], t == first, count);
+            encode_samples(out, areas[ch].step, m->scratch, 1, format, count);
+        }
+    }
+}
+
+/*
+ * Convert frames between the device channel areas and interleaved
+ * float32, through the mixer when the stream has one.
+ */
+static void
+decode_frames(struct ChannelMixer *m, float *dst, struct SoundIoChannelArea *areas,
+              int channel_count, enum SoundIoFormat format, int bytes_per_sample,
+              int frame_count)
+{
+    if (m)
+        mix_from_areas(m, dst, areas, format, frame_count);
+    else
+        decode_areas(dst, areas, channel_count, format, bytes_per_sample, frame_count);
+}
+
+static void
+encode_frames(struct ChannelMixer *m, struct SoundIoChannelArea *areas, const float *src,
+              int channel_count, enum SoundIoFormat format, int bytes_per_sample,
+              int frame_count)
+{
+    if (m)
+        mix_to_areas(m, areas, src, format, frame_count);
+    else
+        encode_areas(areas, src, channel_count, format, bytes_per_sample, frame_count);
+}
+
+/*
+ * Replace the stream mixer with one built from matrix, a sequence of
+ * one row of device_channels gains per stream channel, or remove it
+ * when matrix is None. Sets an exception on failure.
+ */
+static int
+set_channel_matrix(struct StreamContext *ctx, int device_channels, PyObject *matrix, int input)
+{
+    struct ChannelMixer *m = NULL;
+
+    if (ctx->resampler) {
+        PyErr_SetString(PySoundIoError, "Set the channel matrix before the resampler");
+        return -1;
+    }
+    if (matrix != Py_None) {
+        if (!ctx->convert) {
+            PyErr_SetString(PySoundIoError, "Mixing needs samples converted to float32");
+            return -1;
+        }
+        PyObject *rows = PySequence_Fast(matrix, "Channel matrix must be a sequence of rows");
+        if (!rows)
+            return -1;
+        int stream_channels = (int)PySequence_Fast_GET_SIZE(rows);
+        if (stream_channels < 1 || stream_channels > SOUNDIO_MAX_CHANNELS) {
+            Py_DECREF(rows);
+            PyErr_SetString(PySoundIoError, "Invalid channel matrix");
+            return -1;
+        }
+        float gains[SOUNDIO_MAX_CHANNELS * SOUNDIO_MAX_CHANNELS];
+        for (int i = 0; i < stream_channels; i += 1) {
+            PyObject *row = PySequence_Fast(PySequence_Fast_GET_ITEM(rows, i),
+                                            "Channel matrix must be a sequence of rows");
+            if (!row) {
+                Py_DECREF(rows);
+                return -1;
+            }
+            if (PySequence_Fast_GET_SIZE(row) != device_channels) {
+                Py_DECREF(row);
+                Py_DECREF(rows);
+                PyErr_SetString(PySoundIoError, "Channel matrix rows must have a gain per device channel");
+                return -1;
+            }
+            for (int j = 0; j < device_channels; j += 1)
+                gains[i * device_channels + j] = (float)PyFloat_AsDouble(PySequence_Fast_GET_ITEM(row, j));
+            Py_DECREF(row);
+        }
+        Py_DECREF(rows);
+        if (PyErr_Occurred())
+            return -1;
+        m = mixer_create(gains, stream_channels, device_channels, input);
+        if (!m) {
+            PyErr_NoMemory();
+            return -1;
+        }
+    }
+    mixer_destroy(ctx->mixer);
+    ctx->mixer = m;
+    return 0;
+}
+
+/*************************************************************
+ * Resampling
+ *************************************************************/
+
+/*
+ * What the resampler trades for latency and CPU time, each quality
+ * has more filter taps per phase and a cutoff closer to Nyquist.
+ */
+enum ResampleQuality {
+    ResampleQualityLow,
+    ResampleQualityMedium,
+    ResampleQualityHigh,
+};
+
+static const int resample_taps[] = {8, 16, 32};
+static const double resample_cutoff[] = {0.80, 0.90, 0.95};
+
+// Frames converted to float32 at a time
+#define RESAMPLE_CHUNK 1024
+// Largest interpolation factor, which bounds the filter table size
+#define RESAMPLE_MAX_UP 4096
+#define RESAMPLE_PI 3.14159265358979323846
+
+/*
+ * Rational polyphase resampler, producing up output frames for every
+ * down input frames. The filter holds up phases of taps coefficients.
+ * Input is appended to history, which keeps the last taps - 1 frames,
+ * and index is the frame the next output is computed at, phase / up
+ * of a frame later.
+ */
+struct Resampler {
+    int channels;
+    int up;
+    int down;
+    int taps;
+    float *filter;
+    float *history;
+    int capacity;
+    int fill;
+    int index;
+    int phase;
+    float *scratch;
+};
+
+static int
+gcd_int(int a, int b)
+{
+    while (b) {
+        int t = a % b;
+        a = b;
+        b = t;
+    }
+    return a;
+}
+
+static void
+resampler_destroy(struct Resampler *r)
+{
+    if (!r)
+        return;
+    free(r->filter);
+    free(r->history);
+    free(r->scratch);
+    free(r);
+}
+
+/*
+ * Create a resampler from in_rate to out_rate, with a Blackman windowed
+ * sinc filter split into phases. Each phase is normalised to unity gain.
+ * Returns NULL if out of memory or the ratio needs too large a filter.
+ */
+static struct Resampler *
+resampler_create(int channels, int in_rate, int out_rate, int quality)
+{
+    int g = gcd_int(in_rate, out_rate);
+    int up = out_rate / g;
+    int down = in_rate / g;
+    if (up > RESAMPLE_MAX_UP)
+        return NULL;
+
+    struct Resampler *r = calloc(1, sizeof(struct Resampler));
+    if (!r)
+        return NULL;
+    r->channels = channels;
+    r->up = up;
+    r->down = down;
+    // Decimating filters are longer, to keep the same transition band
+    r->taps = resample_taps[quality] * ((down + up - 1) / up);
+    r->capacity = r->taps - 1 + RESAMPLE_CHUNK;
+    r->filter = calloc((size_t)up * r->taps, sizeof(float));
+    r->history = calloc((size_t)r->capacity * channels, sizeof(float));
+    r->scratch = calloc((size_t)RESAMPLE_CHUNK * channels, sizeof(float));
+    if (!r->filter || !r->history || !r->scratch) {
+        resampler_destroy(r);
+        return NULL;
+    }
+
+    // The prototype filter runs at up times the input rate, and cuts
+    // off below the lower of the two Nyquist frequencies
+    int length = up * r->taps;
+    double cutoff = resample_cutoff[quality] * 0.5 / (up > down ? up : down);
+    double centre = (length - 1) / 2.0;
+    for (int p = 0; p < up; p += 1) {
+        double sum = 0.0;
+        for (int j = 0; j < r->taps; j += 1) {
+            int n = (r->taps - 1 - j) * up + p;
+            double t = n - centre;
+            double sinc = (t == 0.0) ? 2.0 * cutoff : sin(2.0 * RESAMPLE_PI * cutoff * t) / (RESAMPLE_PI * t);
+            double w = 2.0 * RESAMPLE_PI * n / (length - 1);
+            double window = 0.42 - 0.5 * cos(w) + 0.08 * cos(2.0 * w);
+            r->filter[p * r->taps + j] = (float)(sinc * window);
+            sum += sinc * window;
+        }
+        for (int j = 0; j < r->taps; j += 1)
+            r->filter[p * r->taps + j] = (float)(r->filter[p * r->taps + j] / sum);
+    }
+
+    // Start with a history of silence
+    r->fill = r->taps - 1;
+    r->index = r->taps - 1;
+    return r;
+}
+
+/*
+ * Resample interleaved float32 frames from in to out, producing up to
+ * out_count frames. Sets consumed to the input frames taken, which is
+ * all of them unless out_count frames were produced first.
+ */
+static int
+resample(struct Resampler *r, const float *in, int in_count, int *consumed,
+         float *out, int out_count)
+{
+    int channels = r->channels;
+    int produced = 0;
+
+    *consumed = 0;
+    while (produced < out_count) {
+        if (r->index >= r->fill) {
+            if (*consumed == in_count)
+                break;
+            int keep = r->taps - 1;
+            int shift = r->fill - keep;
+            memmove(r->history, r->history + shift * channels, keep * channels * sizeof(float));
+            r->fill = keep;
+            r->index -= shift;
+            int count = min_int(in_count - *consumed, r->capacity - keep);
+            memcpy(r->history + keep * channels, in + *consumed * channels,
+                   count * channels * sizeof(float));
+            r->fill += count;
+            *consumed += count;
+            continue;
+        }
+        const float *h = r->filter + r->phase * r->taps;
+        const float *x = r->history + (r->index - r->taps + 1) * channels;
+        for (int ch = 0; ch < channels; ch += 1) {
+            float acc = 0.0f;
+            for (int j = 0; j < r->taps; j += 1)
+                acc += h[j] * x[j * channels + ch];
+            out[produced * channels + ch] = acc;
+        }
+        produced += 1;
+        r->phase += r->down;
+        r->index += r->phase / r->up;
+        r->phase %= r->up;
+    }
+    return produced;
+}
+
+/*
+ * Input frames which always fit in outputs frames once resampled,
+ * or the frames produced at least from inputs frames.
+ */
+static int
+resample_inputs(struct Resampler *r, int outputs)
+{
+    return (outputs > 1) ? (int)((long long)(outputs - 1) * r->down / r->up) : 0;
+}
+
+static int
+resample_outputs(struct Resampler *r, int inputs)
+{
+    int outputs = (int)((long long)inputs * r->up / r->down) - 1;
+    return (outputs > 0) ? outputs : 0;
+}
+
+/*
+ * Decode frame_count frames from the channel_count channel areas, or
+ * silence for a hole when areas is NULL, mix them if m is not NULL,
+ * and resample them into dst, which has room for dst_count frames.
+ * Sets consumed to the frames of the areas used, less than frame_count
+ * if dst filled up first, and returns the frames stored.
+ */
+static int
+resample_from_areas(struct Resampler *r, struct ChannelMixer *m, float *dst, int dst_count,
+                    struct SoundIoChannelArea *areas, int channel_count,
+                    enum SoundIoFormat format, int bytes_per_sample, int frame_count,
+                    int *consumed)
+{
+    struct SoundIoChannelArea shifted[SOUNDIO_MAX_CHANNELS];
+    int stored = 0;
+    int used;
+
+    *consumed = 0;
+    for (int offset = 0; offset < frame_count && stored < dst_count; offset += RESAMPLE_CHUNK) {
+        int count = min_int(RESAMPLE_CHUNK, frame_count - offset);
+        if (areas) {
+            for (int ch = 0; ch < channel_count; ch += 1) {
+                shifted[ch].ptr = areas[ch].ptr + offset * areas[ch].step;
+                shifted[ch].step = areas[ch].step;
+            }
+            decode_frames(m, r->scratch, shifted, channel_count, format, bytes_per_sample, count);
+        } else {
+            memset(r->scratch, 0, count * r->channels * sizeof(float));
+        }
+        stored += resample(r, r->scratch, count, &used,
+                           dst + stored * r->channels, dst_count - stored);
+        *consumed += used;
+    }
+    return stored;
+}
+
+/*
+ * Resample up to frame_count frames from src, which holds src_count
+ * frames, into the channel_count channel areas, mixed if m is not NULL.
+ * Sets consumed to the frames of src used and returns the frames
+ * written, less than frame_count if src ran out.
+ */
+static int
+resample_to_areas(struct Resampler *r, struct ChannelMixer *m,
+                  struct SoundIoChannelArea *areas, int channel_count,
+                  enum SoundIoFormat format, int bytes_per_sample, int frame_count,
+                  const float *src, int src_count, int *consumed)
+{
+    struct SoundIoChannelArea shifted[SOUNDIO_MAX_CHANNELS];
+    int written = 0;
+    int used;
+
+    *consumed = 0;
+    while (written < frame_count) {
+        int count = resample(r, src + *consumed * r->channels, src_count - *consumed, &used,
+                             r->scratch, min_int(RESAMPLE_CHUNK, frame_count - written));
+        *consumed += used;
+        if (!count)
+            break;
+        for (int ch = 0; ch < channel_count; ch += 1) {
+            shifted[ch].ptr = areas[ch].ptr + written * areas[ch].step;
+            shifted[ch].step = areas[ch].step;
+        }
+        encode_frames(m, shifted, r->scratch, channel_count, format, bytes_per_sample, count);
+        written += count;
+    }
+    return written;
+}
+
+/*
+ * Replace the stream resampler with one from in_rate to out_rate, or
+ * remove it when either rate is 0. Sets an exception on failure.
+ */
+static int
+set_resampler(struct StreamContext *ctx, int channels, int in_rate, int out_rate, int quality)
+{
+    struct Resampler *r = NULL;
+
+    if (quality < ResampleQualityLow || quality > ResampleQualityHigh) {
+        PyErr_SetString(PySoundIoError, "Invalid resample quality");
+        return -1;
+    }
+    if (in_rate > 0 && out_rate > 0) {
+        if (!ctx->convert) {
+            PyErr_SetString(PySoundIoError, "Resampling needs samples converted to float32");
+            return -1;
+        }
+        r = resampler_create(channels, in_rate, out_rate, quality);
+        if (!r) {
+            PyErr_SetString(PySoundIoError, "Unsupported resampling ratio");
+            return -1;
+        }
+    }
+    resampler_destroy(ctx->resampler);
+    ctx->resampler = r;
+    return 0;
+}
+
+/*************************************************************
+ * Gain
+ *************************************************************/
+
+static int
+gain_supported(enum SoundIoFormat format)
+{
+    switch (format) {
+    case SoundIoFormatFloat32NE:
+    case SoundIoFormatFloat64NE:
+    case SoundIoFormatS16NE:
+    case SoundIoFormatS32NE:
+        return 1;
+    default:
+        return 0;
+    }
+}
+
+/*
+ * Scale native endian samples in place,
+ * integer samples are clipped to the range of the format.
+ */
+static void
+apply_gain(char *buf, enum SoundIoFormat format, int sample_count, float gain)
+{
+    if (gain == 1.0f)
+        return;
+
+    switch (format) {
+    case SoundIoFormatFloat32NE: {
+        float *s = (float *)buf;
+        for (int i = 0; i < sample_count; i += 1)
+            s[i] *= gain;
+        break;
+    }
+    case SoundIoFormatFloat64NE: {
+        double *s = (double *)buf;
+        for (int i = 0; i < sample_count; i += 1)
+            s[i] *= gain;
+        break;
+    }
+    case SoundIoFormatS16NE: {
+        int16_t *s = (int16_t *)buf;
+        for (int i = 0; i < sample_count; i += 1) {
+            float v = s[i] * gain;
+            s[i] = v > INT16_MAX ? INT16_MAX : (v < INT16_MIN ? INT16_MIN : (int16_t)v);
+        }
+        break;
+    }
+    case SoundIoFormatS32NE: {
+        int32_t *s = (int32_t *)buf;
+        for (int i = 0; i < sample_count; i += 1) {
+            double v = (double)s[i] * gain;
+            s[i] = v > INT32_MAX ? INT32_MAX : (v < INT32_MIN ? INT32_MIN : (int32_t)v);
+        }
+        break;
+    }
+    default:
+        break;
+    }
+}
+
+#if PY_MAJOR_VERSION==2
+#define FORMAT_DATA_READ_ID     "s#"
+#define FORMAT_BUFFER_ID        "s*i"
+#else
+#define FORMAT_DATA_READ_ID     "y#"
+#define FORMAT_BUFFER_ID        "y*i"
+#endif
+
+
+/*************************************************************
+ * Initialisation
+ *************************************************************/
+
+static void
+devices_change_callback(struct SoundIo *soundio)
+{
+    struct SoundIoContext *ctx = soundio->userdata;
+    atomic_store_int(&ctx->devices_changed, ctx->devices_changed + 1);
+}
+
+static PyObject *
+pysoundio__create(PyObject *self, PyObject *args)
+{
+    if (!PyArg_ParseTuple(args, ""))
+        return NULL;
+
+    struct SoundIo *soundio = soundio_create();
+    struct SoundIoContext *ctx = calloc(1, sizeof(struct SoundIoContext));
+    if (!soundio || !ctx) {
+        soundio_destroy(soundio);
+        free(ctx);
+        PyErr_SetString(PySoundIoError, "Out of memory");
+        return NULL;
+    }
+    soundio->userdata = ctx;
+    soundio->on_devices_change = devices_change_callback;
+
+    return PyLong_FromVoidPtr(soundio);
+}
+
+static PyObject *
+pysoundio__destroy(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    struct SoundIoContext *ctx = soundio->userdata;
+    soundio_destroy(soundio);
+    free(ctx);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__connect(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    int err = soundio_connect(soundio);
+    if (err) {
+        PyErr_SetString(PySoundIoError, soundio_strerror(err));
+        return NULL;
+    }
+    return Py_BuildValue("i", err);
+}
+
+static PyObject *
+pysoundio__disconnect(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    soundio_disconnect(soundio);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__connect_backend(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+    int backend;
+
+    if (!PyArg_ParseTuple(args, "Oi", &data, &backend))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    int err = soundio_connect_backend(soundio, backend);
+    if (err) {
+        PyErr_SetString(PySoundIoError, soundio_strerror(err));
+        return NULL;
+    }
+    return Py_BuildValue("i", err);
+}
+
+static PyObject *
+pysoundio__backend_count(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    int backends = soundio_backend_count(soundio);
+    return Py_BuildValue("i", backends);
+}
+
+static PyObject *
+pysoundio__flush(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    soundio_flush_events(soundio);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__wait_events(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    Py_BEGIN_ALLOW_THREADS
+    soundio_wait_events(soundio);
+    Py_END_ALLOW_THREADS
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__wakeup(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    soundio_wakeup(soundio);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__devices_changed(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    struct SoundIoContext *ctx = soundio->userdata;
+    return Py_BuildValue("i", atomic_load_int(&ctx->devices_changed));
+}
+
+
+/*************************************************************
+ * Debugging
+ *************************************************************/
+
+static PyObject *
+pysoundio__version_string(PyObject *self, PyObject *args)
+{
+    if (!PyArg_ParseTuple(args, ""))
+        return NULL;
+
+    if (sizeof(struct SoundIoOutStream) < 200) { // < v2.0.0
+        const char *version = "-.-.-";
+        return Py_BuildValue("s", version);
+    } else {
+        char version[6];
+        sprintf(version, "%d.%d.%d", soundio_version_major(),
+            soundio_version_minor(), soundio_version_patch());
+        return Py_BuildValue("s", version);
+    }
+}
+
+static PyObject *
 pysoundio__strerror(PyObject *self, PyObject *args)
 {
-    int error;
+    int error;
+
+    if (!PyArg_ParseTuple(args, "i", &error))
+        return NULL;
+
+    const char *message = soundio_strerror(error);
+    return Py_BuildValue("s", message);
+}
+
+static PyObject *
+pysoundio__format_string(PyObject *self, PyObject *args)
+{
+    uint8_t format;
+
+    if (!PyArg_ParseTuple(args, "b", &format))
+        return NULL;
+
+    const char *format_string = soundio_format_string(format);
+    return Py_BuildValue("s", format_string);
+}
+
+static PyObject *
+pysoundio__get_channel_name(PyObject *self, PyObject *args)
+{
+    int channel;
+
+    if (!PyArg_ParseTuple(args, "i", &channel))
+        return NULL;
+
+    enum SoundIoChannelId id = (enum SoundIoChannelId)channel;
+    const char* name = soundio_get_channel_name(id);
+    return Py_BuildValue("s", name);
+}
+
+static PyObject *
+pysoundio__parse_channel_id(PyObject *self, PyObject *args)
+{
+    const char *name;
+
+    if (!PyArg_ParseTuple(args, "s", &name))
+        return NULL;
+
+    enum SoundIoChannelId id = soundio_parse_channel_id(name, (int)strlen(name));
+    return Py_BuildValue("i", id);
+}
+
+
+/*************************************************************
+ * Device API
+ *************************************************************/
+
+static PyObject *
+pysoundio__get_output_device_count(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    int output_count = soundio_output_device_count(soundio);
+    return Py_BuildValue("i", output_count);
+}
+
+static PyObject *
+pysoundio__get_input_device_count(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    int input_count = soundio_input_device_count(soundio);
+    return Py_BuildValue("i", input_count);
+}
+
+static PyObject *
+pysoundio__default_input_device_index(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    int input_index = soundio_default_input_device_index(soundio);
+    return Py_BuildValue("i", input_index);
+}
+
+static PyObject *
+pysoundio__default_output_device_index(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    int output_index = soundio_default_output_device_index(soundio);
+    return Py_BuildValue("i", output_index);
+}
+
+static PyObject *
+pysoundio__get_input_device(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+    int device_index;
+
+    if (!PyArg_ParseTuple(args, "Oi", &data, &device_index))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    struct SoundIoDevice *device = soundio_get_input_device(soundio, device_index);
+    if (!device) {
+        PyErr_SetString(PySoundIoError, "Invalid device");
+        return NULL;
+    }
+
+    return PyLong_FromVoidPtr(device);
+}
+
+static PyObject *
+pysoundio__get_output_device(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+    int device_index;
+
+    if (!PyArg_ParseTuple(args, "Oi", &data, &device_index))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    struct SoundIoDevice *device = soundio_get_output_device(soundio, device_index);
+    if (!device) {
+        PyErr_SetString(PySoundIoError, "Invalid device");
+        return NULL;
+    }
+
+    return PyLong_FromVoidPtr(device);
+}
+
+static PyObject *
+pysoundio__device_unref(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIoDevice *device = PyLong_AsVoidPtr(data);
+
+    soundio_device_unref(device);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__device_supports_sample_rate(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+    int sample_rate;
 
-    if (!PyArg_ParseTuple(args, "i", &error))
+    if (!PyArg_ParseTuple(args, "Oi", &data, &sample_rate))
         return NULL;
 
-    const char *message = soundio_strerror(error);
-    return Py_BuildValue("s", message);
+    struct SoundIoDevice *device = PyLong_AsVoidPtr(data);
+    bool supported = soundio_device_supports_sample_rate(device, sample_rate);
+    return Py_BuildValue("i", (int)supported);
 }
 
 static PyObject *
-pysoundio__format_string(PyObject *self, PyObject *args)
+pysoundio__device_supports_format(PyObject *self, PyObject *args)
 {
-    uint8_t format;
+    PyObject *data;
+    int format;
 
-    if (!PyArg_ParseTuple(args, "b", &format))
+    if (!PyArg_ParseTuple(args, "Oi", &data, &format))
         return NULL;
 
-    const char *format_string = soundio_format_string(format);
-    return Py_BuildValue("s", format_string);
+    struct SoundIoDevice *device = PyLong_AsVoidPtr(data);
+    bool supported = soundio_device_supports_format(device, format);
+
+    return Py_BuildValue("i", (int)supported);
 }
 
 static PyObject *
-pysoundio__get_channel_name(PyObject *self, PyObject *args)
+pysoundio__device_sort_channel_layouts(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIoDevice *device = PyLong_AsVoidPtr(data);
+    soundio_device_sort_channel_layouts(device);
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__channel_layout_get_default(PyObject *self, PyObject *args)
+{
+    int channel_count;
+
+    if (!PyArg_ParseTuple(args, "i", &channel_count))
+        return NULL;
+
+    const struct SoundIoChannelLayout *layout = soundio_channel_layout_get_default(channel_count);
+    return PyLong_FromVoidPtr((void *)layout);
+}
+
+static PyObject *
+pysoundio__best_matching_channel_layout(PyObject *self, PyObject *args)
+{
+    PyObject *ppreferred;
+    int preferred_count;
+    PyObject *pavailable;
+    int available_count;
+
+    if (!PyArg_ParseTuple(args, "OiOi", &ppreferred, &preferred_count,
+        &pavailable, &available_count))
+        return NULL;
+
+    struct SoundIoChannelLayout *preferred = PyLong_AsVoidPtr(ppreferred);
+    struct SoundIoChannelLayout *available = PyLong_AsVoidPtr(pavailable);
+
+    const struct SoundIoChannelLayout *layout = soundio_best_matching_channel_layout(
+        preferred, preferred_count, available, available_count);
+
+    return PyLong_FromVoidPtr((void *)layout);
+}
+
+static PyObject *
+pysoundio__channel_layout_builtin_count(PyObject *self, PyObject *args)
+{
+    if (!PyArg_ParseTuple(args, NULL))
+        return NULL;
+
+    int count = soundio_channel_layout_builtin_count();
+    return Py_BuildValue("i", count);
+}
+
+static PyObject *
+pysoundio__channel_layout_detect_builtin(PyObject *self, PyObject *args)
+{
+    PyObject *playout;
+
+    if (!PyArg_ParseTuple(args, "O", &playout))
+        return NULL;
+
+    struct SoundIoChannelLayout *layout = PyLong_AsVoidPtr(playout);
+
+    bool count = soundio_channel_layout_detect_builtin(layout);
+    return Py_BuildValue("i", count);
+}
+
+static PyObject *
+pysoundio__channel_layout_equal(PyObject *self, PyObject *args)
+{
+    PyObject *playouta;
+    PyObject *playoutb;
+
+    if (!PyArg_ParseTuple(args, "OO", &playouta, &playoutb))
+        return NULL;
+
+    struct SoundIoChannelLayout *layouta = PyLong_AsVoidPtr(playouta);
+    struct SoundIoChannelLayout *layoutb = PyLong_AsVoidPtr(playoutb);
+
+    bool count = soundio_channel_layout_equal(layouta, layoutb);
+    return Py_BuildValue("i", count);
+}
+
+static PyObject *
+pysoundio__channel_layout_find_channel(PyObject *self, PyObject *args)
 {
+    PyObject *playout;
     int channel;
 
-    if (!PyArg_ParseTuple(args, "i", &channel))
+    if (!PyArg_ParseTuple(args, "Oi", &playout, &channel))
         return NULL;
 
-    enum SoundIoChannelId id = (enum SoundIoChannelId)channel;
-    const char* name = soundio_get_channel_name(id);
-    return Py_BuildValue("s", name);
+    struct SoundIoChannelLayout *layout = PyLong_AsVoidPtr(playout);
+
+    int index = soundio_channel_layout_find_channel(layout, channel);
+    return Py_BuildValue("i", index);
 }
 
+static PyObject *
+pysoundio__channel_layout_get_builtin(PyObject *self, PyObject *args)
+{
+    int index;
 
-/*************************************************************
- * Device API
- *************************************************************/
+    if (!PyArg_ParseTuple(args, "i", &index))
+        return NULL;
+
+    const struct SoundIoChannelLayout *layout = soundio_channel_layout_get_builtin(index);
+
+    return PyLong_FromVoidPtr((void *)layout);
+}
 
 static PyObject *
-pysoundio__get_output_device_count(PyObject *self, PyObject *args)
+pysoundio__force_device_scan(PyObject *self, PyObject *args)
 {
-    if (!PyArg_ParseTuple(args, ""))
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    soundio_force_device_scan(soundio);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__get_bytes_per_frame(PyObject *self, PyObject *args)
+{
+    int format;
+    int channel_count;
+
+    if (!PyArg_ParseTuple(args, "ii", &format, &channel_count))
+        return NULL;
+
+    int bytes = soundio_get_bytes_per_frame(format, channel_count);
+    return Py_BuildValue("i", bytes);
+}
+
+static PyObject *
+pysoundio__get_bytes_per_sample(PyObject *self, PyObject *args)
+{
+    int format;
+
+    if (!PyArg_ParseTuple(args, "i", &format))
+        return NULL;
+
+    int bytes = soundio_get_bytes_per_sample(format);
+    return Py_BuildValue("i", bytes);
+}
+
+static PyObject *
+pysoundio__convert_to_float(PyObject *self, PyObject *args)
+{
+    Py_buffer data;
+    int format;
+
+    if (!PyArg_ParseTuple(args, FORMAT_BUFFER_ID, &data, &format))
+        return NULL;
+
+    if (!convert_supported(format)) {
+        PyBuffer_Release(&data);
+        PyErr_SetString(PySoundIoError, "Conversion is not supported for this format");
+        return NULL;
+    }
+    int bytes_per_sample = soundio_get_bytes_per_sample(format);
+    int count = (int)(data.len / bytes_per_sample);
+    PyObject *result = PyBytes_FromStringAndSize(NULL, count * sizeof(float));
+    if (result)
+        decode_samples((float *)PyBytes_AS_STRING(result), 1, data.buf, bytes_per_sample, format, count);
+    PyBuffer_Release(&data);
+    return result;
+}
+
+static PyObject *
+pysoundio__convert_from_float(PyObject *self, PyObject *args)
+{
+    Py_buffer data;
+    int format;
+
+    if (!PyArg_ParseTuple(args, FORMAT_BUFFER_ID, &data, &format))
+        return NULL;
+
+    if (!convert_supported(format)) {
+        PyBuffer_Release(&data);
+        PyErr_SetString(PySoundIoError, "Conversion is not supported for this format");
+        return NULL;
+    }
+    int bytes_per_sample = soundio_get_bytes_per_sample(format);
+    int count = (int)(data.len / sizeof(float));
+    PyObject *result = PyBytes_FromStringAndSize(NULL, count * bytes_per_sample);
+    if (result)
+        encode_samples(PyBytes_AS_STRING(result), bytes_per_sample, data.buf, 1, format, count);
+    PyBuffer_Release(&data);
+    return result;
+}
+
+static PyObject *
+pysoundio__get_bytes_per_second(PyObject *self, PyObject *args)
+{
+    int format;
+    int channel_count;
+    int sample_rate;
+
+    if (!PyArg_ParseTuple(args, "iii", &format, &channel_count, &sample_rate))
         return NULL;
 
-    int output_count = soundio_output_device_count(rc.soundio);
-    return Py_BuildValue("i", output_count);
-}
+    int bytes = soundio_get_bytes_per_second(format, channel_count, sample_rate);
+    return Py_BuildValue("i", bytes);
+}
+
+/*************************************************************
+ * Input Stream API
+ *************************************************************/
+
+static void
+publish_timing(struct StreamContext *ctx, int frames, double now)
+{
+    atomic_add_int(&ctx->timing_seq, 1);
+    atomic_fence();
+    ctx->frames_read += frames;
+    ctx->read_time = now;
+    if (ctx->anchors) {
+        ctx->anchors[ctx->anchors_written % ctx->anchor_count].frame = ctx->frames_read;
+        ctx->anchors[ctx->anchors_written % ctx->anchor_count].time = now;
+        ctx->anchors_written += 1;
+    }
+    atomic_fence();
+    atomic_add_int(&ctx->timing_seq, 1);
+}
+
+/*
+ * Map a time to a frame of the capture timeline, or a frame to a time
+ * if to_time is set. The anchors either side are found by a binary
+ * search, and values outside of them are extrapolated at rate frames
+ * per second.
+ */
+static double
+map_timeline(struct StreamContext *ctx, double value, double rate, int to_time)
+{
+    double result;
+    int seq;
+
+    // Retry until the anchors are read between two updates
+    do {
+        seq = atomic_load_int(&ctx->timing_seq);
+        long long written = ctx->anchors_written;
+        int count = ctx->anchor_count;
+        long long lo = (written > count) ? written - count : 0;
+        long long hi = written - 1;
+
+        if (written == 0) {
+            result = to_time ? monotonic_time() : 0.0;
+        } else {
+            struct TimingAnchor *first = &ctx->anchors[lo % count];
+            struct TimingAnchor *last = &ctx->anchors[hi % count];
+            double first_key = to_time ? (double)first->frame : first->time;
+            double last_key = to_time ? (double)last->frame : last->time;
+            double scale = to_time ? 1.0 / rate : rate;
+
+            if (value <= first_key) {
+                result = (to_time ? first->time : (double)first->frame) - (first_key - value) * scale;
+            } else if (value >= last_key) {
+                result = (to_time ? last->time : (double)last->frame) + (value - last_key) * scale;
+            } else {
+                while (hi - lo > 1) {
+                    long long mid = lo + (hi - lo) / 2;
+                    struct TimingAnchor *a = &ctx->anchors[mid % count];
+                    if ((to_time ? (double)a->frame : a->time) <= value)
+                        lo = mid;
+                    else
+                        hi = mid;
+                }
+                struct TimingAnchor *a = &ctx->anchors[lo % count];
+                struct TimingAnchor *b = &ctx->anchors[hi % count];
+                double a_key = to_time ? (double)a->frame : a->time;
+                double b_key = to_time ? (double)b->frame : b->time;
+                double a_value = to_time ? a->time : (double)a->frame;
+                double b_value = to_time ? b->time : (double)b->frame;
+                result = (b_key > a_key) ?
+                    a_value + (value - a_key) / (b_key - a_key) * (b_value - a_value) : a_value;
+            }
+        }
+        atomic_fence();
+    } while ((seq & 1) || seq != atomic_load_int(&ctx->timing_seq));
+
+    return result;
+}
+
+/*
+ * Copy frames just captured into the passthrough output ring buffer.
+ * Frames that do not fit are dropped, the output is not keeping up.
+ */
+static void
+passthrough_write(struct StreamContext *ctx, struct SoundIoInStream *instream,
+                  const char *src, int frame_count)
+{
+    int bytes_per_frame = stream_frame_bytes(ctx, instream->layout.channel_count,
+                                             instream->bytes_per_frame);
+    int free_count = soundio_ring_buffer_free_count(ctx->passthrough) / bytes_per_frame;
+    int frames = min_int(frame_count, free_count);
+    char *dst = soundio_ring_buffer_write_ptr(ctx->passthrough);
+
+    memcpy(dst, src, frames * bytes_per_frame);
+    apply_gain(dst, stream_sample_format(ctx, instream->format),
+               frames * stream_channels(ctx, instream->layout.channel_count), ctx->gain);
+    soundio_ring_buffer_advance_write_ptr(ctx->passthrough, frames * bytes_per_frame);
+}
+
+/*
+ * Record a run of silent frames in the stream, if the queue
+ * is full the marker is lost but the counters are still correct.
+ */
+static void
+push_gap_marker(struct StreamContext *ctx, long long frame, long long length)
+{
+    unsigned int written = ctx->gaps_written;
+    if (written - atomic_load_uint(&ctx->gaps_read) >= GAP_MARKERS)
+        return;
+    ctx->gaps[written % GAP_MARKERS].frame = frame;
+    ctx->gaps[written % GAP_MARKERS].length = length;
+    atomic_store_uint(&ctx->gaps_written, written + 1);
+}
+
+/*
+ * Discard up to frames of the oldest buffered data,
+ * returns the number of frames of space made.
+ */
+static int
+drop_oldest(struct StreamContext *ctx, int frames, int bytes_per_frame)
+{
+    if (!spin_trylock(&ctx->read_lock))
+        return 0;
+    if (ctx->read_active) {
+        spin_unlock(&ctx->read_lock);
+        return 0;
+    }
+    int fill_count = soundio_ring_buffer_fill_count(ctx->buffer) / bytes_per_frame;
+    int drop = min_int(frames, fill_count);
+    soundio_ring_buffer_advance_read_ptr(ctx->buffer, drop * bytes_per_frame);
+    ctx->read_position += (long long)drop * bytes_per_frame;
+    spin_unlock(&ctx->read_lock);
+    return drop;
+}
+
+/*
+ * Release the oldest frames of a history beyond history_bytes, without
+ * counting an overflow. While Python holds the read lock, to copy from
+ * the history, it is trimmed on a later period instead.
+ */
+static void
+trim_history(struct StreamContext *ctx, int history_bytes)
+{
+    if (!spin_trylock(&ctx->read_lock))
+        return;
+    if (ctx->read_active) {
+        spin_unlock(&ctx->read_lock);
+        return;
+    }
+    int excess = soundio_ring_buffer_fill_count(ctx->buffer) - history_bytes;
+    if (excess > 0) {
+        soundio_ring_buffer_advance_read_ptr(ctx->buffer, excess);
+        ctx->read_position += excess;
+    }
+    spin_unlock(&ctx->read_lock);
+}
+
+static void
+read_callback(struct SoundIoInStream *instream, int frame_count_min, int frame_count_max)
+{
+    struct StreamContext *ctx = instream->userdata;
+    struct SoundIoChannelArea *areas;
+    double now = monotonic_time();
+    int bytes_per_frame = stream_frame_bytes(ctx, instream->layout.channel_count,
+                                             instream->bytes_per_frame);
+    int err;
+
+    if (!ctx->buffer)
+        return;
+
+    int free_count = soundio_ring_buffer_free_count(ctx->buffer) / bytes_per_frame;
 
-static PyObject *
-pysoundio__get_input_device_count(PyObject *self, PyObject *args)
-{
-    if (!PyArg_ParseTuple(args, ""))
-        return NULL;
+    if (free_count < frame_count_min) {
+        atomic_add_i64(&ctx->overflows, 1);
+        if (ctx->overflow_policy == OverflowDropOldest)
+            free_count += drop_oldest(ctx, frame_count_min - free_count, bytes_per_frame);
+    }
 
-    int input_count = soundio_input_device_count(rc.soundio);
-    return Py_BuildValue("i", input_count);
-}
+    // Silence owed for frames lost earlier goes first, new
+    // frames are only kept once all of it has been written
+    int silence_count = 0;
+    if (ctx->gap_pending) {
+        silence_count = min_int(ctx->gap_pending, free_count);
+        free_count = (silence_count < ctx->gap_pending) ? 0 : free_count - silence_count;
+    }
 
-static PyObject *
-pysoundio__default_input_device_index(PyObject *self, PyObject *args)
-{
-    if (!PyArg_ParseTuple(args, ""))
-        return NULL;
+    // At least frame_count_min frames must be read from the device,
+    // any that do not fit in the ring buffer are dropped. Frames are
+    // kept at the device rate, and stored at the ring buffer rate.
+    int device_free = ctx->resampler ? resample_inputs(ctx->resampler, free_count) : free_count;
+    int keep_count = min_int(device_free, frame_count_max);
+    int read_count = (keep_count > frame_count_min) ? keep_count : frame_count_min;
+
+    char *write_ptr = soundio_ring_buffer_write_ptr(ctx->buffer);
+    char *captured = write_ptr;
+    if (silence_count) {
+        memset(write_ptr, 0, silence_count * bytes_per_frame);
+        write_ptr += silence_count * bytes_per_frame;
+        atomic_add_i64(&ctx->silence_frames, silence_count);
+        ctx->gap_pending -= silence_count;
+        if (!ctx->gap_pending)
+            push_gap_marker(ctx, ctx->gap_start, ctx->gap_length);
+    }
 
-    int input_index = soundio_default_input_device_index(rc.soundio);
-    return Py_BuildValue("i", input_index);
+    int kept = 0;
+    int stored = 0;
+    int frames_left = read_count;
+    while (frames_left > 0) {
+        int frame_count = frames_left;
+        if ((err = soundio_instream_begin_read(instream, &areas, &frame_count))) {
+            atomic_add_i64(&ctx->errors, 1);
+            break;
+        }
+        if (!frame_count)
+            break;
+        int copy_count = min_int(frame_count, keep_count - kept);
+        if (copy_count > 0) {
+            int count = copy_count;
+            if (ctx->resampler) {
+                // Frames the resampler could not take are dropped below
+                count = resample_from_areas(ctx->resampler, ctx->mixer, (float *)write_ptr,
+                                            free_count - stored, areas,
+                                            instream->layout.channel_count, instream->format,
+                                            instream->bytes_per_sample, copy_count, &copy_count);
+            } else if (!areas) {
+                // Due to an overflow there is a hole. Fill the ring buffer with
+                // silence for the size of the hole.
+                memset(write_ptr, 0, copy_count * bytes_per_frame);
+            } else if (ctx->convert) {
+                decode_frames(ctx->mixer, (float *)write_ptr, areas, instream->layout.channel_count,
+                              instream->format, instream->bytes_per_sample, copy_count);
+            } else {
+                read_areas(write_ptr, areas, instream->layout.channel_count,
+                           instream->bytes_per_sample, copy_count);
+            }
+            if (!areas) {
+                push_gap_marker(ctx, ctx->frames_read + silence_count + stored, count);
+                atomic_add_i64(&ctx->holes, 1);
+                atomic_add_i64(&ctx->silence_frames, count);
+            }
+            write_ptr += count * bytes_per_frame;
+            kept += copy_count;
+            stored += count;
+        }
+        if ((err = soundio_instream_end_read(instream))) {
+            atomic_add_i64(&ctx->errors, 1);
+            break;
+        }
+        frames_left -= frame_count;
+    }
+
+    int dropped = (read_count - frames_left) - kept;
+    if (dropped > 0) {
+        atomic_add_i64(&ctx->frames_dropped, dropped);
+        if (ctx->overflow_policy == OverflowGap) {
+            // The gap is filled at the ring buffer rate
+            int gap = dropped;
+            if (ctx->resampler)
+                gap = (int)((long long)dropped * ctx->resampler->up / ctx->resampler->down);
+            if (!ctx->gap_pending) {
+                ctx->gap_start = ctx->frames_read + silence_count + stored;
+                ctx->gap_length = 0;
+            }
+            ctx->gap_pending += gap;
+            ctx->gap_length += gap;
+        }
+    }
+
+    // The lock is only held by Python while the passthrough changes,
+    // the frames are not monitored during that period. Silence for
+    // gaps is monitored too, so the output keeps the input timeline.
+    if (spin_trylock(&ctx->passthrough_lock)) {
+        if (ctx->passthrough)
+            passthrough_write(ctx, instream, captured, silence_count + stored);
+        spin_unlock(&ctx->passthrough_lock);
+    }
+    soundio_ring_buffer_advance_write_ptr(ctx->buffer, (silence_count + stored) * bytes_per_frame);
+    int history_bytes = atomic_load_int(&ctx->history_bytes);
+    if (history_bytes)
+        trim_history(ctx, history_bytes);
+    publish_timing(ctx, silence_count + stored, now);
+    stream_context_notify(ctx);
+
+    int fill_bytes = soundio_ring_buffer_fill_count(ctx->buffer);
+    if (fill_bytes >= atomic_load_int(&ctx->block_bytes))
+        push_event(ctx, StreamEventData, silence_count + stored, now);
+    if (dropped > 0)
+        push_event(ctx, StreamEventXrun, dropped, now);
+    record_callback(ctx, now, silence_count + stored, fill_bytes);
 }
 
-static PyObject *
-pysoundio__default_output_device_index(PyObject *self, PyObject *args)
+static void
+overflow_callback(struct SoundIoInStream *instream)
 {
-    if (!PyArg_ParseTuple(args, ""))
-        return NULL;
-
-    int output_index = soundio_default_output_device_index(rc.soundio);
-    return Py_BuildValue("i", output_index);
+    struct StreamContext *ctx = instream->userdata;
+    push_event(ctx, StreamEventXrun, 0, monotonic_time());
 }
 
 static PyObject *
-pysoundio__get_input_device(PyObject *self, PyObject *args)
+pysoundio__instream_create(PyObject *self, PyObject *args)
 {
-    int device_index;
+    PyObject *data;
 
-    if (!PyArg_ParseTuple(args, "i", &device_index))
+    if (!PyArg_ParseTuple(args, "O", &data))
         return NULL;
 
-    rc.input_device = soundio_get_input_device(rc.soundio, device_index);
-
-    return PyLong_FromVoidPtr(rc.input_device);
-}
-
-static PyObject *
-pysoundio__get_output_device(PyObject *self, PyObject *args)
-{
-    int device_index;
+    struct SoundIoDevice *device = PyLong_AsVoidPtr(data);
+    struct SoundIoInStream *instream = soundio_instream_create(device);
+    struct StreamContext *ctx = stream_context_create();
 
-    if (!PyArg_ParseTuple(args, "i", &device_index))
+    if (!instream || !ctx) {
+        soundio_instream_destroy(instream);
+        free(ctx);
+        PyErr_SetString(PySoundIoError, "Out of memory");
         return NULL;
+    }
 
-    rc.output_device = soundio_get_output_device(rc.soundio, device_index);
+    instream->read_callback = read_callback;
+    instream->overflow_callback = overflow_callback;
+    instream->userdata = ctx;
 
-    return PyLong_FromVoidPtr(rc.output_device);
+    return PyLong_FromVoidPtr(instream);
 }
 
 static PyObject *
-pysoundio__device_unref(PyObject *self, PyObject *args)
+pysoundio__instream_destroy(PyObject *self, PyObject *args)
 {
     PyObject *data;
 
     if (!PyArg_ParseTuple(args, "O", &data))
         return NULL;
 
-    struct SoundIoDevice *device = PyLong_AsVoidPtr(data);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
 
-    soundio_device_unref(device);
+    // Let other Python threads run while libsoundio joins the stream thread
+    Py_BEGIN_ALLOW_THREADS
+    soundio_instream_destroy(instream);
+    Py_END_ALLOW_THREADS
+    stream_context_destroy(ctx);
     Py_RETURN_NONE;
 }
 
 static PyObject *
-pysoundio__device_supports_sample_rate(PyObject *self, PyObject *args)
+pysoundio__instream_open(PyObject *self, PyObject *args)
 {
     PyObject *data;
-    int sample_rate;
 
-    if (!PyArg_ParseTuple(args, "Oi", &data, &sample_rate))
+    if (!PyArg_ParseTuple(args, "O", &data))
         return NULL;
 
-    struct SoundIoDevice *device = PyLong_AsVoidPtr(data);
-    bool supported = soundio_device_supports_sample_rate(device, sample_rate);
-    return Py_BuildValue("i", (int)supported);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    int err = soundio_instream_open(instream);
+    if (err) {
+        PyErr_SetString(PySoundIoError, soundio_strerror(err));
+        return NULL;
+    }
+
+    return Py_BuildValue("i", err);
 }
 
 static PyObject *
-pysoundio__device_supports_format(PyObject *self, PyObject *args)
+pysoundio__instream_start(PyObject *self, PyObject *args)
 {
     PyObject *data;
-    int format;
 
-    if (!PyArg_ParseTuple(args, "Oi", &data, &format))
+    if (!PyArg_ParseTuple(args, "O", &data))
         return NULL;
 
-    struct SoundIoDevice *device = PyLong_AsVoidPtr(data);
-    bool supported = soundio_device_supports_format(device, format);
-
-    return Py_BuildValue("i", (int)supported);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    int err = soundio_instream_start(instream);
+    if (err) {
+        PyErr_SetString(PySoundIoError, soundio_strerror(err));
+        return NULL;
+    }
+    return Py_BuildValue("i", err);
 }
 
 static PyObject *
-pysoundio__device_sort_channel_layouts(PyObject *self, PyObject *args)
+pysoundio__instream_pause(PyObject *self, PyObject *args)
 {
     PyObject *data;
+    int pause;
 
-    if (!PyArg_ParseTuple(args, "O", &data))
+    if (!PyArg_ParseTuple(args, "Oi", &data, &pause))
         return NULL;
 
-    struct SoundIoDevice *device = PyLong_AsVoidPtr(data);
-    soundio_device_sort_channel_layouts(device);
-
-    Py_RETURN_NONE;
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    int err = soundio_instream_pause(instream, (bool)pause);
+    if (err) {
+        PyErr_SetString(PySoundIoError, soundio_strerror(err));
+        return NULL;
+    }
+    return Py_BuildValue("i", err);
 }
 
 static PyObject *
-pysoundio__channel_layout_get_default(PyObject *self, PyObject *args)
+pysoundio__instream_get_latency(PyObject *self, PyObject *args)
 {
-    int channel_count;
+    PyObject *data;
+    double out_latency;
 
-    if (!PyArg_ParseTuple(args, "i", &channel_count))
+    if (!PyArg_ParseTuple(args, "Od", &data, &out_latency))
         return NULL;
 
-    const struct SoundIoChannelLayout *layout = soundio_channel_layout_get_default(channel_count);
-    return PyLong_FromVoidPtr((void *)layout);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    int seconds = soundio_instream_get_latency(instream, &out_latency);
+    return Py_BuildValue("i", seconds);
 }
 
+
 static PyObject *
-pysoundio__best_matching_channel_layout(PyObject *self, PyObject *args)
+pysoundio__instream_get_timing(PyObject *self, PyObject *args)
 {
-    PyObject *ppreferred;
-    int preferred_count;
-    PyObject *pavailable;
-    int available_count;
+    PyObject *data;
+    long long frames_read;
+    double read_time;
+    int seq;
 
-    if (!PyArg_ParseTuple(args, "OiOi", &ppreferred, &preferred_count,
-        &pavailable, &available_count))
+    if (!PyArg_ParseTuple(args, "O", &data))
         return NULL;
 
-    struct SoundIoChannelLayout *preferred = PyLong_AsVoidPtr(ppreferred);
-    struct SoundIoChannelLayout *available = PyLong_AsVoidPtr(pavailable);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
 
-    const struct SoundIoChannelLayout *layout = soundio_best_matching_channel_layout(
-        preferred, preferred_count, available, available_count);
+    // Retry until a consistent pair is read between two updates
+    do {
+        seq = atomic_load_int(&ctx->timing_seq);
+        frames_read = ctx->frames_read;
+        read_time = ctx->read_time;
+        atomic_fence();
+    } while ((seq & 1) || seq != atomic_load_int(&ctx->timing_seq));
 
-    return PyLong_FromVoidPtr((void *)layout);
+    return Py_BuildValue("(Ld)", frames_read, read_time);
 }
 
 static PyObject *
-pysoundio__channel_layout_builtin_count(PyObject *self, PyObject *args)
+pysoundio__instream_wait(PyObject *self, PyObject *args)
 {
-    if (!PyArg_ParseTuple(args, NULL))
+    PyObject *data;
+    int bytes;
+    double timeout = -1.0;
+
+    if (!PyArg_ParseTuple(args, "Oi|d", &data, &bytes, &timeout))
         return NULL;
 
-    int count = soundio_channel_layout_builtin_count();
-    return Py_BuildValue("i", count);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+    if (!ctx->buffer) {
+        PyErr_SetString(PySoundIoError, "Stream has no ring buffer");
+        return NULL;
+    }
+    return Py_BuildValue("i", wait_for_bytes(ctx, 0, bytes, timeout));
 }
 
 static PyObject *
-pysoundio__channel_layout_detect_builtin(PyObject *self, PyObject *args)
+pysoundio__instream_wait_events(PyObject *self, PyObject *args)
 {
-    PyObject *playout;
+    PyObject *data;
+    double timeout = -1.0;
 
-    if (!PyArg_ParseTuple(args, "O", &playout))
+    if (!PyArg_ParseTuple(args, "O|d", &data, &timeout))
         return NULL;
 
-    struct SoundIoChannelLayout *layout = PyLong_AsVoidPtr(playout);
-
-    bool count = soundio_channel_layout_detect_builtin(layout);
-    return Py_BuildValue("i", count);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    return wait_events(instream->userdata, timeout);
 }
 
 static PyObject *
-pysoundio__channel_layout_equal(PyObject *self, PyObject *args)
+pysoundio__instream_interrupt(PyObject *self, PyObject *args)
 {
-    PyObject *playouta;
-    PyObject *playoutb;
+    PyObject *data;
 
-    if (!PyArg_ParseTuple(args, "OO", &playouta, &playoutb))
+    if (!PyArg_ParseTuple(args, "O", &data))
         return NULL;
 
-    struct SoundIoChannelLayout *layouta = PyLong_AsVoidPtr(playouta);
-    struct SoundIoChannelLayout *layoutb = PyLong_AsVoidPtr(playoutb);
-
-    bool count = soundio_channel_layout_equal(layouta, layoutb);
-    return Py_BuildValue("i", count);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+    notifier_post(&ctx->event_notifier);
+    Py_RETURN_NONE;
 }
 
 static PyObject *
-pysoundio__channel_layout_find_channel(PyObject *self, PyObject *args)
+pysoundio__instream_set_notify_fd(PyObject *self, PyObject *args)
 {
-    PyObject *playout;
-    int channel;
+    PyObject *data;
+    long long fd;
 
-    if (!PyArg_ParseTuple(args, "Oi", &playout, &channel))
+    if (!PyArg_ParseTuple(args, "OL", &data, &fd))
         return NULL;
 
-    struct SoundIoChannelLayout *layout = PyLong_AsVoidPtr(playout);
-
-    int index = soundio_channel_layout_find_channel(layout, channel);
-    return Py_BuildValue("i", index);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+    ctx->notify_fd = fd;
+    Py_RETURN_NONE;
 }
 
 static PyObject *
-pysoundio__channel_layout_get_builtin(PyObject *self, PyObject *args)
+pysoundio__instream_set_overflow_policy(PyObject *self, PyObject *args)
 {
-    int index;
+    PyObject *data;
+    int policy;
 
-    if (!PyArg_ParseTuple(args, "i", &index))
+    if (!PyArg_ParseTuple(args, "Oi", &data, &policy))
         return NULL;
 
-    const struct SoundIoChannelLayout *layout = soundio_channel_layout_get_builtin(index);
-
-    return PyLong_FromVoidPtr((void *)layout);
-}
-
-static PyObject *
-pysoundio__force_device_scan(PyObject *self, PyObject *args)
-{
-    if (!PyArg_ParseTuple(args, ""))
+    if (policy < OverflowDropNewest || policy > OverflowGap) {
+        PyErr_SetString(PySoundIoError, "Invalid overflow policy");
         return NULL;
-
-    soundio_force_device_scan(rc.soundio);
+    }
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+    ctx->overflow_policy = policy;
     Py_RETURN_NONE;
 }
 
 static PyObject *
-pysoundio__get_bytes_per_frame(PyObject *self, PyObject *args)
+pysoundio__instream_set_convert(PyObject *self, PyObject *args)
 {
-    int format;
-    int channel_count;
+    PyObject *data;
+    int convert;
 
-    if (!PyArg_ParseTuple(args, "ii", &format, &channel_count))
+    if (!PyArg_ParseTuple(args, "Oi", &data, &convert))
         return NULL;
 
-    int bytes = soundio_get_bytes_per_frame(format, channel_count);
-    return Py_BuildValue("i", bytes);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+    if (convert && !convert_supported(instream->format)) {
+        PyErr_SetString(PySoundIoError, "Conversion is not supported for this format");
+        return NULL;
+    }
+    ctx->convert = convert;
+    Py_RETURN_NONE;
 }
 
 static PyObject *
-pysoundio__get_bytes_per_sample(PyObject *self, PyObject *args)
+pysoundio__instream_set_channel_matrix(PyObject *self, PyObject *args)
 {
-    int format;
+    PyObject *data;
+    PyObject *matrix;
 
-    if (!PyArg_ParseTuple(args, "i", &format))
+    if (!PyArg_ParseTuple(args, "OO", &data, &matrix))
         return NULL;
 
-    int bytes = soundio_get_bytes_per_sample(format);
-    return Py_BuildValue("i", bytes);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    if (set_channel_matrix(instream->userdata, instream->layout.channel_count, matrix, 1))
+        return NULL;
+    Py_RETURN_NONE;
 }
 
 static PyObject *
-pysoundio__get_bytes_per_second(PyObject *self, PyObject *args)
+pysoundio__instream_set_resampler(PyObject *self, PyObject *args)
 {
-    int format;
-    int channel_count;
+    PyObject *data;
     int sample_rate;
+    int quality = ResampleQualityMedium;
 
-    if (!PyArg_ParseTuple(args, "iii", &format, &channel_count, &sample_rate))
+    if (!PyArg_ParseTuple(args, "Oi|i", &data, &sample_rate, &quality))
         return NULL;
 
-    int bytes = soundio_get_bytes_per_second(format, channel_count, sample_rate);
-    return Py_BuildValue("i", bytes);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+    if (set_resampler(ctx, stream_channels(ctx, instream->layout.channel_count),
+                      instream->sample_rate, sample_rate, quality))
+        return NULL;
+    Py_RETURN_NONE;
 }
 
-/*************************************************************
- * Input Stream API
- *************************************************************/
-
-static void
-read_callback(struct SoundIoInStream *instream, int frame_count_min, int frame_count_max)
+static PyObject *
+pysoundio__instream_set_block_bytes(PyObject *self, PyObject *args)
 {
-    struct RecordContext *rc = instream->userdata;
-    struct SoundIoChannelArea *areas;
-    int err;
-
-    if (!rc->input_buffer)
-        return;
-
-    char *write_ptr = soundio_ring_buffer_write_ptr(rc->input_buffer);
-    int free_bytes = soundio_ring_buffer_free_count(rc->input_buffer);
-
-    int free_count = free_bytes / instream->bytes_per_frame;
-
-    if (free_count < frame_count_min) {
-        fprintf(stderr, "ring buffer overflow\n");
-        exit(1);
-    }
-    int write_frames = min_int(free_count, frame_count_max);
-    int frames_left = write_frames;
-
-    for (;;) {
-        int frame_count = frames_left;
-        if ((err = soundio_instream_begin_read(instream, &areas, &frame_count))) {
-            fprintf(stderr, "begin read error: %s", soundio_strerror(err));
-            exit(1);
-        }
-        if (!frame_count)
-            break;
-        if (!areas) {
-            // Due to an overflow there is a hole. Fill the ring buffer with
-            // silence for the size of the hole.
-            memset(write_ptr, 0, frame_count * instream->bytes_per_frame);
-        } else {
-            for (int frame = 0; frame < frame_count; frame += 1) {
-                for (int ch = 0; ch < instream->layout.channel_count; ch += 1) {
-                    memcpy(write_ptr, areas[ch].ptr, instream->bytes_per_sample);
-                    areas[ch].ptr += areas[ch].step;
-                    write_ptr += instream->bytes_per_sample;
-                }
-            }
-        }
-        if ((err = soundio_instream_end_read(instream))) {
-            fprintf(stderr, "end read error: %s", soundio_strerror(err));
-            exit(1);
-        }
-        frames_left -= frame_count;
-        if (frames_left <= 0)
-            break;
-    }
+    PyObject *data;
+    int block_bytes;
 
-    int advance_bytes = write_frames * instream->bytes_per_frame;
-    soundio_ring_buffer_advance_write_ptr(rc->input_buffer, advance_bytes);
+    if (!PyArg_ParseTuple(args, "Oi", &data, &block_bytes))
+        return NULL;
 
-    if (rc->read_callback) {
-        PyGILState_STATE state = PyGILState_Ensure();
-        PyObject *result = PyObject_CallObject(rc->read_callback, NULL);
-        Py_XDECREF(result);
-        PyGILState_Release(state);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+    if (block_bytes < 0 || (ctx->buffer && block_bytes > soundio_ring_buffer_capacity(ctx->buffer))) {
+        PyErr_SetString(PySoundIoError, "Invalid block size");
+        return NULL;
     }
+    atomic_store_int(&ctx->block_bytes, block_bytes);
+    Py_RETURN_NONE;
 }
 
-static void
-overflow_callback(struct SoundIoInStream *instream)
+static PyObject *
+pysoundio__instream_set_history(PyObject *self, PyObject *args)
 {
-    struct RecordContext *rc = instream->userdata;
+    PyObject *data;
+    int history_bytes;
 
-    if (rc->overflow_callback) {
-        PyGILState_STATE state = PyGILState_Ensure();
-        PyObject *result = PyObject_CallObject(rc->overflow_callback, NULL);
-        Py_XDECREF(result);
-        PyGILState_Release(state);
+    if (!PyArg_ParseTuple(args, "Oi", &data, &history_bytes))
+        return NULL;
+
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+    if (history_bytes < 0 || (ctx->buffer && history_bytes > soundio_ring_buffer_capacity(ctx->buffer))) {
+        PyErr_SetString(PySoundIoError, "Invalid history size");
+        return NULL;
     }
+    atomic_store_int(&ctx->history_bytes, history_bytes);
+    Py_RETURN_NONE;
 }
 
 static PyObject *
-pysoundio__set_read_callbacks(PyObject *self, PyObject *args)
+pysoundio__instream_snapshot(PyObject *self, PyObject *args)
 {
-    PyObject *read;
-    PyObject *flow;
+    PyObject *data;
+    int max_bytes = -1;
 
-    if (PyArg_ParseTuple(args, "OO", &read, &flow)) {
-        if (!PyCallable_Check(read)) {
-            PyErr_SetString(PyExc_TypeError, "parameter must be callable");
-            return NULL;
-        }
-        if (!PyCallable_Check(flow)) {
-            PyErr_SetString(PyExc_TypeError, "parameter must be callable");
-            return NULL;
-        }
-        Py_XINCREF(read);
-        Py_XINCREF(flow);
-        Py_XDECREF(rc.read_callback);
-        Py_XDECREF(rc.overflow_callback);
-        rc.read_callback = read;
-        rc.overflow_callback = flow;
-        Py_RETURN_NONE;
+    if (!PyArg_ParseTuple(args, "O|i", &data, &max_bytes))
+        return NULL;
+
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+    if (!ctx->buffer) {
+        PyErr_SetString(PySoundIoError, "Stream has no ring buffer");
+        return NULL;
     }
-    return NULL;
+
+    // The read callback only writes to free space, and cannot release
+    // the oldest frames while the read lock is held, so the newest
+    // frames are copied out whole.
+    spin_lock(&ctx->read_lock);
+    int fill_bytes = soundio_ring_buffer_fill_count(ctx->buffer);
+    int size = (max_bytes >= 0 && max_bytes < fill_bytes) ? max_bytes : fill_bytes;
+    char *read_ptr = soundio_ring_buffer_read_ptr(ctx->buffer) + fill_bytes - size;
+    long long position = ctx->read_position + fill_bytes - size;
+    PyObject *copy = PyBytes_FromStringAndSize(read_ptr, size);
+    spin_unlock(&ctx->read_lock);
+
+    if (!copy)
+        return NULL;
+    return Py_BuildValue("(NL)", copy, position);
 }
 
 static PyObject *
-pysoundio__instream_create(PyObject *self, PyObject *args)
+pysoundio__instream_frame_at(PyObject *self, PyObject *args)
 {
     PyObject *data;
+    double time;
+    double rate;
 
-    if (!PyArg_ParseTuple(args, "O", &data))
+    if (!PyArg_ParseTuple(args, "Odd", &data, &time, &rate))
         return NULL;
 
-    struct SoundIoDevice *device = PyLong_AsVoidPtr(data);
-    rc.input_stream = soundio_instream_create(device);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    double frame = map_timeline(instream->userdata, time, rate, 0);
+    return Py_BuildValue("L", (long long)floor(frame + 0.5));
+}
 
-    rc.input_stream->read_callback = read_callback;
-    rc.input_stream->overflow_callback = overflow_callback;
-    rc.input_stream->userdata = &rc;
+static PyObject *
+pysoundio__instream_time_at(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+    long long frame;
+    double rate;
 
-    if (!rc.input_stream) {
-        PyErr_SetString(PySoundIoError, "Out of memory");
+    if (!PyArg_ParseTuple(args, "OLd", &data, &frame, &rate))
         return NULL;
-    }
 
-    return PyLong_FromVoidPtr(rc.input_stream);
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    return Py_BuildValue("d", map_timeline(instream->userdata, (double)frame, rate, 1));
 }
 
 static PyObject *
-pysoundio__instream_destroy(PyObject *self, PyObject *args)
+pysoundio__instream_read_range(PyObject *self, PyObject *args)
 {
-    if (!PyArg_ParseTuple(args, ""))
+    PyObject *data;
+    long long start;
+    long long end;
+
+    if (!PyArg_ParseTuple(args, "OLL", &data, &start, &end))
         return NULL;
 
-    soundio_instream_destroy(rc.input_stream);
-    rc.input_stream = NULL;
-    Py_RETURN_NONE;
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+    if (!ctx->buffer) {
+        PyErr_SetString(PySoundIoError, "Stream has no ring buffer");
+        return NULL;
+    }
+
+    // Counted as a reader while copying, so the read callback
+    // does not drop the oldest frames from under the copy
+    spin_lock(&ctx->read_lock);
+    char *read_ptr = soundio_ring_buffer_read_ptr(ctx->buffer);
+    int fill_bytes = soundio_ring_buffer_fill_count(ctx->buffer);
+    long long position = ctx->read_position;
+    ctx->read_active += 1;
+    spin_unlock(&ctx->read_lock);
+
+    // The ring buffer memory is mirrored, so any range of the
+    // buffered data is contiguous and is copied at once
+    long long last = position + fill_bytes;
+    start = (start < position) ? position : (start > last) ? last : start;
+    end = (end < start) ? start : (end > last) ? last : end;
+    read_ptr += start - position;
+    PyObject *copy = PyBytes_FromStringAndSize(read_ptr, (Py_ssize_t)(end - start));
+
+    spin_lock(&ctx->read_lock);
+    ctx->read_active -= 1;
+    spin_unlock(&ctx->read_lock);
+    if (!copy)
+        return NULL;
+    return Py_BuildValue("(NL)", copy, start);
 }
 
 static PyObject *
-pysoundio__instream_open(PyObject *self, PyObject *args)
+pysoundio__instream_read_begin(PyObject *self, PyObject *args)
 {
-    if (!PyArg_ParseTuple(args, ""))
+    PyObject *data;
+    int max_bytes = -1;
+
+    if (!PyArg_ParseTuple(args, "O|i", &data, &max_bytes))
         return NULL;
 
-    int err = soundio_instream_open(rc.input_stream);
-    if (err) {
-        PyErr_SetString(PySoundIoError, soundio_strerror(err));
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+    if (!ctx->buffer) {
+        PyErr_SetString(PySoundIoError, "Stream has no ring buffer");
         return NULL;
     }
 
-    return Py_BuildValue("i", err);
+    // The view stays valid until instream_read_end, the read
+    // callback does not drop the oldest frames until then
+    spin_lock(&ctx->read_lock);
+    char *read_ptr = soundio_ring_buffer_read_ptr(ctx->buffer);
+    int fill_bytes = soundio_ring_buffer_fill_count(ctx->buffer);
+    long long position = ctx->read_position;
+    ctx->read_active += 1;
+    spin_unlock(&ctx->read_lock);
+
+    if (max_bytes >= 0 && max_bytes < fill_bytes)
+        fill_bytes = max_bytes;
+#if PY_MAJOR_VERSION >= 3
+    PyObject *view = PyMemoryView_FromMemory(read_ptr, fill_bytes, PyBUF_READ);
+#else
+    PyObject *view = PyBytes_FromStringAndSize(read_ptr, fill_bytes);
+#endif
+    PyObject *result = view ? Py_BuildValue("(NL)", view, position) : NULL;
+    if (!result) {
+        // No view was returned, so no instream_read_end will follow
+        spin_lock(&ctx->read_lock);
+        ctx->read_active -= 1;
+        spin_unlock(&ctx->read_lock);
+    }
+    return result;
 }
 
 static PyObject *
-pysoundio__instream_start(PyObject *self, PyObject *args)
+pysoundio__instream_read_end(PyObject *self, PyObject *args)
 {
-    if (!PyArg_ParseTuple(args, ""))
-        return NULL;
+    PyObject *data;
+    long long position;
 
-    int err = soundio_instream_start(rc.input_stream);
-    if (err) {
-        PyErr_SetString(PySoundIoError, soundio_strerror(err));
+    if (!PyArg_ParseTuple(args, "OL", &data, &position))
         return NULL;
+
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+
+    // Data already dropped by the read callback is not released again
+    spin_lock(&ctx->read_lock);
+    if (position > ctx->read_position) {
+        soundio_ring_buffer_advance_read_ptr(ctx->buffer, (int)(position - ctx->read_position));
+        ctx->read_position = position;
     }
-    return Py_BuildValue("i", err);
+    if (ctx->read_active)
+        ctx->read_active -= 1;
+    spin_unlock(&ctx->read_lock);
+    Py_RETURN_NONE;
 }
 
 static PyObject *
-pysoundio__instream_pause(PyObject *self, PyObject *args)
+pysoundio__instream_get_gaps(PyObject *self, PyObject *args)
 {
-    int *pause;
+    PyObject *data;
 
-    if (!PyArg_ParseTuple(args, "i", &pause))
+    if (!PyArg_ParseTuple(args, "O", &data))
         return NULL;
 
-    int err = soundio_instream_pause(rc.input_stream, (bool)pause);
-    if (err) {
-        PyErr_SetString(PySoundIoError, soundio_strerror(err));
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+
+    PyObject *gaps = PyList_New(0);
+    if (!gaps)
         return NULL;
+    unsigned int written = atomic_load_uint(&ctx->gaps_written);
+    for (unsigned int i = ctx->gaps_read; i != written; i += 1) {
+        struct GapMarker *marker = &ctx->gaps[i % GAP_MARKERS];
+        PyObject *item = Py_BuildValue("(LL)", marker->frame, marker->length);
+        if (!item || PyList_Append(gaps, item)) {
+            Py_XDECREF(item);
+            Py_DECREF(gaps);
+            return NULL;
+        }
+        Py_DECREF(item);
     }
-    return Py_BuildValue("i", err);
+    atomic_store_uint(&ctx->gaps_read, written);
+    return gaps;
 }
 
 static PyObject *
-pysoundio__instream_get_latency(PyObject *self, PyObject *args)
+pysoundio__instream_get_stats(PyObject *self, PyObject *args)
 {
-    double out_latency;
+    PyObject *data;
 
-    if (!PyArg_ParseTuple(args, "d", &out_latency))
+    if (!PyArg_ParseTuple(args, "O", &data))
         return NULL;
 
-    int seconds = soundio_instream_get_latency(rc.input_stream, &out_latency);
-    return Py_BuildValue("i", seconds);
-}
-
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
 
-/*************************************************************
- * Output Stream API
- *************************************************************/
+    return stream_stats(ctx, Py_BuildValue("{sLsLsLsLsL}",
+                         "overflows", atomic_load_i64(&ctx->overflows),
+                         "frames_dropped", atomic_load_i64(&ctx->frames_dropped),
+                         "holes", atomic_load_i64(&ctx->holes),
+                         "silence_frames", atomic_load_i64(&ctx->silence_frames),
+                         "errors", atomic_load_i64(&ctx->errors)));
+}
 
 static PyObject *
-pysoundio__set_write_callbacks(PyObject *self, PyObject *args)
+pysoundio__instream_set_passthrough(PyObject *self, PyObject *args)
 {
-    PyObject *write;
-    PyObject *flow;
+    PyObject *data;
+    PyObject *buffer;
+    float gain = 1.0f;
 
-    if (PyArg_ParseTuple(args, "OO", &write, &flow)) {
-        if (!PyCallable_Check(write)) {
-            PyErr_SetString(PyExc_TypeError, "parameter must be callable");
-            return NULL;
-        }
-        if (!PyCallable_Check(flow)) {
-            PyErr_SetString(PyExc_TypeError, "parameter must be callable");
-            return NULL;
-        }
-        Py_XINCREF(write);
-        Py_XINCREF(flow);
-        Py_XDECREF(rc.write_callback);
-        Py_XDECREF(rc.underflow_callback);
-        rc.write_callback = write;
-        rc.underflow_callback = flow;
-        Py_RETURN_NONE;
+    if (!PyArg_ParseTuple(args, "OO|f", &data, &buffer, &gain))
+        return NULL;
+
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+
+    if (gain != 1.0f && !gain_supported(stream_sample_format(ctx, instream->format))) {
+        PyErr_SetString(PySoundIoError, "Gain is not supported for this format");
+        return NULL;
     }
-    return NULL;
+    // Waits for a read callback writing to the old buffer to finish
+    spin_lock(&ctx->passthrough_lock);
+    ctx->gain = gain;
+    ctx->passthrough = (buffer == Py_None) ? NULL : PyLong_AsVoidPtr(buffer);
+    spin_unlock(&ctx->passthrough_lock);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__monotonic_time(PyObject *self, PyObject *args)
+{
+    return Py_BuildValue("d", monotonic_time());
 }
 
+/*************************************************************
+ * Output Stream API
+ *************************************************************/
+
 static void
 write_callback(struct SoundIoOutStream *outstream, int frame_count_min, int frame_count_max)
 {
-    struct RecordContext *rc = outstream->userdata;
+    struct StreamContext *ctx = outstream->userdata;
     struct SoundIoChannelArea *areas;
+    struct SoundIoChannelArea shifted[SOUNDIO_MAX_CHANNELS];
+    int channel_count = outstream->layout.channel_count;
+    int bytes_per_frame = stream_frame_bytes(ctx, channel_count, outstream->bytes_per_frame);
+    double now = monotonic_time();
     int frame_count;
     int err;
 
-    if (!rc->output_buffer)
+    if (!ctx->buffer)
         return;
 
-    char *read_ptr = soundio_ring_buffer_read_ptr(rc->output_buffer);
-    int fill_bytes = soundio_ring_buffer_fill_count(rc->output_buffer);
-    int fill_count = fill_bytes / outstream->bytes_per_frame;
-
-    int read_count = min_int(frame_count_max, fill_count);
-    int frames_left = read_count;
-
-    if (frame_count_min > fill_count) {
-        frames_left = frame_count_min;
-        while (frames_left > 0) {
-            frame_count = frames_left;
-            if (frame_count <= 0)
-                return;
-            if ((err = soundio_outstream_begin_write(outstream, &areas, &frame_count))) {
-                PyErr_SetString(PySoundIoError, soundio_strerror(err));
-                return;
-            }
-            if (frame_count <= 0)
-                return;
-            for (int frame = 0; frame < frame_count; frame += 1) {
-                for (int ch = 0; ch < outstream->layout.channel_count; ch += 1) {
-                    memset(areas[ch].ptr, 0, outstream->bytes_per_sample);
-                    areas[ch].ptr += areas[ch].step;
-                }
-            }
-            if ((err = soundio_outstream_end_write(outstream))) {
-                PyErr_SetString(PySoundIoError, soundio_strerror(err));
-                return;
-            }
-            frames_left -= frame_count;
-        }
+    char *read_ptr = soundio_ring_buffer_read_ptr(ctx->buffer);
+    int fill_bytes = soundio_ring_buffer_fill_count(ctx->buffer);
+    int fill_count = fill_bytes / bytes_per_frame;
+
+    // On underflow everything buffered is played, then padded with silence.
+    // Frames are played at the device rate, and consumed at the ring buffer rate.
+    int available = ctx->resampler ? resample_outputs(ctx->resampler, fill_count) : fill_count;
+    int read_count = min_int(frame_count_max, available);
+    int silence_count = 0;
+    if (read_count < frame_count_min) {
+        silence_count = frame_count_min - read_count;
+        atomic_add_i64(&ctx->underflows, 1);
+        atomic_add_i64(&ctx->silence_frames, silence_count);
     }
 
+    int written = 0;
+    int consumed = 0;
+    int frames_left = read_count + silence_count;
     while (frames_left > 0) {
         frame_count = frames_left;
         if ((err = soundio_outstream_begin_write(outstream, &areas, &frame_count))) {
-            PyErr_SetString(PySoundIoError, soundio_strerror(err));
-            return;
+            atomic_add_i64(&ctx->errors, 1);
+            break;
         }
         if (frame_count <= 0)
             break;
-        for (int frame = 0; frame < frame_count; frame += 1) {
-            for (int ch = 0; ch < outstream->layout.channel_count; ch += 1) {
-                memcpy(areas[ch].ptr, read_ptr, outstream->bytes_per_sample);
-                areas[ch].ptr += areas[ch].step;
-                read_ptr += outstream->bytes_per_sample;
+        int copy_count = min_int(frame_count, read_count - written);
+        if (copy_count > 0) {
+            int used = copy_count;
+            if (ctx->resampler)
+                copy_count = resample_to_areas(ctx->resampler, ctx->mixer, areas, channel_count,
+                                               outstream->format, outstream->bytes_per_sample,
+                                               copy_count, (float *)read_ptr,
+                                               fill_count - consumed, &used);
+            else if (ctx->convert)
+                encode_frames(ctx->mixer, areas, (float *)read_ptr, channel_count,
+                              outstream->format, outstream->bytes_per_sample, copy_count);
+            else
+                write_areas(areas, read_ptr, channel_count, outstream->bytes_per_sample, copy_count);
+            read_ptr += used * bytes_per_frame;
+            consumed += used;
+            written += copy_count;
+        }
+        if (copy_count < frame_count) {
+            for (int ch = 0; ch < channel_count; ch += 1) {
+                shifted[ch].ptr = areas[ch].ptr + copy_count * areas[ch].step;
+                shifted[ch].step = areas[ch].step;
             }
+            silence_areas(shifted, channel_count, outstream->bytes_per_sample,
+                          frame_count - copy_count);
         }
         if ((err = soundio_outstream_end_write(outstream))) {
-            PyErr_SetString(PySoundIoError, soundio_strerror(err));
-            return;
+            atomic_add_i64(&ctx->errors, 1);
+            break;
         }
         frames_left -= frame_count;
     }
-    soundio_ring_buffer_advance_read_ptr(rc->output_buffer, read_count * outstream->bytes_per_frame);
-
-    if (rc->write_callback) {
-        PyGILState_STATE state = PyGILState_Ensure();
-        PyObject *arglist;
-        arglist = Py_BuildValue("(i)", frame_count_max);
-        PyObject *result = PyObject_CallObject(rc->write_callback, arglist);
-        Py_DECREF(arglist);
-        Py_XDECREF(result);
-        PyGILState_Release(state);
-    }
+    soundio_ring_buffer_advance_read_ptr(ctx->buffer, consumed * bytes_per_frame);
+    stream_context_notify(ctx);
+    if (ctx->resampler)
+        frame_count_max = resample_inputs(ctx->resampler, frame_count_max);
+    int refill_bytes = atomic_load_int(&ctx->refill_bytes);
+    if (!refill_bytes || fill_bytes - consumed * bytes_per_frame <= refill_bytes)
+        push_event(ctx, StreamEventData, frame_count_max, now);
+    record_callback(ctx, now, consumed, fill_bytes);
 }
 
 static void
 underflow_callback(struct SoundIoOutStream *outstream)
 {
-    struct RecordContext *rc = outstream->userdata;
-
-    if (rc->underflow_callback) {
-        PyGILState_STATE state = PyGILState_Ensure();
-        PyObject *result = PyObject_CallObject(rc->underflow_callback, NULL);
-        Py_XDECREF(result);
-        PyGILState_Release(state);
-    }
+    struct StreamContext *ctx = outstream->userdata;
+    push_event(ctx, StreamEventXrun, 0, monotonic_time());
 }
 
 static PyObject *
@@ -1148,38 +3513,52 @@ pysoundio__outstream_create(PyObject *self, PyObject *args)
         return NULL;
 
     struct SoundIoDevice *device = PyLong_AsVoidPtr(data);
-    rc.output_stream = soundio_outstream_create(device);
-
-    rc.output_stream->write_callback = write_callback;
-    rc.output_stream->underflow_callback = underflow_callback;
-    rc.output_stream->userdata = &rc;
+    struct SoundIoOutStream *outstream = soundio_outstream_create(device);
+    struct StreamContext *ctx = stream_context_create();
 
-    if (!rc.output_stream) {
+    if (!outstream || !ctx) {
+        soundio_outstream_destroy(outstream);
+        free(ctx);
         PyErr_SetString(PySoundIoError, "Out of memory");
         return NULL;
     }
 
-    return PyLong_FromVoidPtr(rc.output_stream);
+    outstream->write_callback = write_callback;
+    outstream->underflow_callback = underflow_callback;
+    outstream->userdata = ctx;
+
+    return PyLong_FromVoidPtr(outstream);
 }
 
 static PyObject *
 pysoundio__outstream_destroy(PyObject *self, PyObject *args)
 {
-    if (!PyArg_ParseTuple(args, ""))
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
         return NULL;
 
-    soundio_outstream_destroy(rc.output_stream);
-    rc.output_stream = NULL;
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = outstream->userdata;
+
+    // Let other Python threads run while libsoundio joins the stream thread
+    Py_BEGIN_ALLOW_THREADS
+    soundio_outstream_destroy(outstream);
+    Py_END_ALLOW_THREADS
+    stream_context_destroy(ctx);
     Py_RETURN_NONE;
 }
 
 static PyObject *
 pysoundio__outstream_open(PyObject *self, PyObject *args)
 {
-    if (!PyArg_ParseTuple(args, ""))
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
         return NULL;
 
-    int err = soundio_outstream_open(rc.output_stream);
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    int err = soundio_outstream_open(outstream);
     if (err) {
         PyErr_SetString(PySoundIoError, soundio_strerror(err));
         return NULL;
@@ -1190,10 +3569,13 @@ pysoundio__outstream_open(PyObject *self, PyObject *args)
 static PyObject *
 pysoundio__outstream_start(PyObject *self, PyObject *args)
 {
-    if (!PyArg_ParseTuple(args, ""))
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
         return NULL;
 
-    int err = soundio_outstream_start(rc.output_stream);
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    int err = soundio_outstream_start(outstream);
     if (err) {
         PyErr_SetString(PySoundIoError, soundio_strerror(err));
         return NULL;
@@ -1205,12 +3587,14 @@ pysoundio__outstream_start(PyObject *self, PyObject *args)
 static PyObject *
 pysoundio__outstream_pause(PyObject *self, PyObject *args)
 {
-    int *pause;
+    PyObject *data;
+    int pause;
 
-    if (!PyArg_ParseTuple(args, "i", &pause))
+    if (!PyArg_ParseTuple(args, "Oi", &data, &pause))
         return NULL;
 
-    int err = soundio_outstream_pause(rc.output_stream, (bool)pause);
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    int err = soundio_outstream_pause(outstream, (bool)pause);
     if (err) {
         PyErr_SetString(PySoundIoError, soundio_strerror(err));
         return NULL;
@@ -1221,10 +3605,13 @@ pysoundio__outstream_pause(PyObject *self, PyObject *args)
 static PyObject *
 pysoundio__outstream_clear_buffer(PyObject *self, PyObject *args)
 {
-    if (!PyArg_ParseTuple(args, ""))
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
         return NULL;
 
-    int err = soundio_outstream_clear_buffer(rc.output_stream);
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    int err = soundio_outstream_clear_buffer(outstream);
     if (err) {
         PyErr_SetString(PySoundIoError, soundio_strerror(err));
         return NULL;
@@ -1236,69 +3623,272 @@ pysoundio__outstream_clear_buffer(PyObject *self, PyObject *args)
 static PyObject *
 pysoundio__outstream_get_latency(PyObject *self, PyObject *args)
 {
+    PyObject *data;
     double out_latency;
 
-    if (!PyArg_ParseTuple(args, "d", &out_latency))
+    if (!PyArg_ParseTuple(args, "Od", &data, &out_latency))
         return NULL;
 
-    int seconds = soundio_outstream_get_latency(rc.output_stream, &out_latency);
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    int seconds = soundio_outstream_get_latency(outstream, &out_latency);
     return Py_BuildValue("i", seconds);
 }
 
 static PyObject *
 pysoundio__outstream_set_volume(PyObject *self, PyObject *args)
 {
+    PyObject *data;
     double volume;
     int new_volume;
 
-    if (!PyArg_ParseTuple(args, "d", &volume))
+    if (!PyArg_ParseTuple(args, "Od", &data, &volume))
         return NULL;
 
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
     if (sizeof(struct SoundIoOutStream) < 200) {  // < v2.0.0
         new_volume = -1;
     } else {
-        new_volume = soundio_outstream_set_volume(rc.output_stream, volume);
+        new_volume = soundio_outstream_set_volume(outstream, volume);
     }
 
     return Py_BuildValue("i", new_volume);
 }
 
+static PyObject *
+pysoundio__outstream_get_stats(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = outstream->userdata;
+
+    return stream_stats(ctx, Py_BuildValue("{sLsLsL}",
+                         "underflows", atomic_load_i64(&ctx->underflows),
+                         "silence_frames", atomic_load_i64(&ctx->silence_frames),
+                         "errors", atomic_load_i64(&ctx->errors)));
+}
+
+static PyObject *
+pysoundio__outstream_set_convert(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+    int convert;
+
+    if (!PyArg_ParseTuple(args, "Oi", &data, &convert))
+        return NULL;
+
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = outstream->userdata;
+    if (convert && !convert_supported(outstream->format)) {
+        PyErr_SetString(PySoundIoError, "Conversion is not supported for this format");
+        return NULL;
+    }
+    ctx->convert = convert;
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__outstream_set_channel_matrix(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+    PyObject *matrix;
+
+    if (!PyArg_ParseTuple(args, "OO", &data, &matrix))
+        return NULL;
+
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    if (set_channel_matrix(outstream->userdata, outstream->layout.channel_count, matrix, 0))
+        return NULL;
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__outstream_set_resampler(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+    int sample_rate;
+    int quality = ResampleQualityMedium;
+
+    if (!PyArg_ParseTuple(args, "Oi|i", &data, &sample_rate, &quality))
+        return NULL;
+
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = outstream->userdata;
+    if (set_resampler(ctx, stream_channels(ctx, outstream->layout.channel_count),
+                      sample_rate, outstream->sample_rate, quality))
+        return NULL;
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__outstream_set_refill_bytes(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+    int refill_bytes;
+
+    if (!PyArg_ParseTuple(args, "Oi", &data, &refill_bytes))
+        return NULL;
+
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = outstream->userdata;
+    if (refill_bytes < 0 || (ctx->buffer && refill_bytes > soundio_ring_buffer_capacity(ctx->buffer))) {
+        PyErr_SetString(PySoundIoError, "Invalid refill size");
+        return NULL;
+    }
+    atomic_store_int(&ctx->refill_bytes, refill_bytes);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__outstream_wait_events(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+    double timeout = -1.0;
+
+    if (!PyArg_ParseTuple(args, "O|d", &data, &timeout))
+        return NULL;
+
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    return wait_events(outstream->userdata, timeout);
+}
+
+static PyObject *
+pysoundio__outstream_interrupt(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+
+    if (!PyArg_ParseTuple(args, "O", &data))
+        return NULL;
+
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = outstream->userdata;
+    notifier_post(&ctx->event_notifier);
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__outstream_set_notify_fd(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+    long long fd;
+
+    if (!PyArg_ParseTuple(args, "OL", &data, &fd))
+        return NULL;
+
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = outstream->userdata;
+    ctx->notify_fd = fd;
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+pysoundio__outstream_wait(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+    int bytes;
+    double timeout = -1.0;
+
+    if (!PyArg_ParseTuple(args, "Oi|d", &data, &bytes, &timeout))
+        return NULL;
+
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = outstream->userdata;
+    if (!ctx->buffer) {
+        PyErr_SetString(PySoundIoError, "Stream has no ring buffer");
+        return NULL;
+    }
+    return Py_BuildValue("i", wait_for_bytes(ctx, 1, bytes, timeout));
+}
+
 /*************************************************************
  * Ring Buffer API
  *************************************************************/
 
+static PyObject *
+pysoundio__ring_buffer_create(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+    int capacity;
+
+    if (!PyArg_ParseTuple(args, "Oi", &data, &capacity))
+        return NULL;
+
+    struct SoundIo *soundio = PyLong_AsVoidPtr(data);
+    struct SoundIoRingBuffer *buffer = soundio_ring_buffer_create(soundio, capacity);
+    if (!buffer) {
+        PyErr_SetString(PySoundIoError, "Out of memory");
+        return NULL;
+    }
+
+    return PyLong_FromVoidPtr(buffer);
+}
+
 static PyObject *
 pysoundio__input_ring_buffer_create(PyObject *self, PyObject *args)
 {
+    PyObject *data;
     int capacity;
 
-    if (!PyArg_ParseTuple(args, "i", &capacity))
+    if (!PyArg_ParseTuple(args, "Oi", &data, &capacity))
+        return NULL;
+
+    struct SoundIoInStream *instream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = instream->userdata;
+
+    // One timing anchor per read callback for all of the audio the
+    // ring buffer holds, doubled as callbacks may be shorter than the
+    // software latency. The stream has been opened but not started,
+    // so the read callback is not using the anchors yet.
+    int bytes_per_frame = stream_frame_bytes(ctx, instream->layout.channel_count,
+                                             instream->bytes_per_frame);
+    double rate = instream->sample_rate;
+    if (ctx->resampler)
+        rate = rate * ctx->resampler->up / ctx->resampler->down;
+    double callbacks = (instream->software_latency > 0.0) ?
+        (double)capacity / bytes_per_frame / rate / instream->software_latency : 0.0;
+    int anchor_count = (callbacks * 2 > MIN_TIMING_ANCHORS) ?
+        (int)(callbacks * 2) : MIN_TIMING_ANCHORS;
+    struct TimingAnchor *anchors = calloc(anchor_count, sizeof(struct TimingAnchor));
+    if (!anchors) {
+        PyErr_SetString(PySoundIoError, "Out of memory");
         return NULL;
+    }
+    free(ctx->anchors);
+    ctx->anchors = anchors;
+    ctx->anchor_count = anchor_count;
+    ctx->anchors_written = 0;
 
-    rc.input_buffer = soundio_ring_buffer_create(rc.soundio, capacity);
-    if (!rc.input_buffer) {
+    ctx->buffer = soundio_ring_buffer_create(instream->device->soundio, capacity);
+    if (!ctx->buffer) {
         PyErr_SetString(PySoundIoError, "Out of memory");
         return NULL;
     }
 
-    return PyLong_FromVoidPtr(rc.input_buffer);
+    return PyLong_FromVoidPtr(ctx->buffer);
 }
 
 static PyObject *
 pysoundio__output_ring_buffer_create(PyObject *self, PyObject *args)
 {
+    PyObject *data;
     int capacity;
 
-    if (!PyArg_ParseTuple(args, "i", &capacity))
+    if (!PyArg_ParseTuple(args, "Oi", &data, &capacity))
         return NULL;
 
-    rc.output_buffer = soundio_ring_buffer_create(rc.soundio, capacity);
-    if (!rc.output_buffer) {
+    struct SoundIoOutStream *outstream = PyLong_AsVoidPtr(data);
+    struct StreamContext *ctx = outstream->userdata;
+
+    ctx->buffer = soundio_ring_buffer_create(outstream->device->soundio, capacity);
+    if (!ctx->buffer) {
         PyErr_SetString(PySoundIoError, "Out of memory");
         return NULL;
     }
 
-    return PyLong_FromVoidPtr(rc.output_buffer);
+    return PyLong_FromVoidPtr(ctx->buffer);
 }
 
 static PyObject *
@@ -1342,7 +3932,13 @@ pysoundio__ring_buffer_read_ptr(PyObject *self, PyObject *args)
     int fill_bytes = soundio_ring_buffer_fill_count(buffer);
     char *ptr = soundio_ring_buffer_read_ptr(buffer);
 
+#if PY_MAJOR_VERSION >= 3
+    // Read only view straight into the ring buffer memory, valid
+    // until the read pointer is advanced.
+    return PyMemoryView_FromMemory(ptr, fill_bytes, PyBUF_READ);
+#else
     return Py_BuildValue(FORMAT_DATA_READ_ID, ptr, fill_bytes);
+#endif
 }
 
 static PyObject *
@@ -1379,6 +3975,34 @@ pysoundio__ring_buffer_write_ptr(PyObject *self, PyObject *args)
     Py_RETURN_NONE;
 }
 
+static PyObject *
+pysoundio__ring_buffer_write_view(PyObject *self, PyObject *args)
+{
+    PyObject *data;
+    int length = -1;
+    int clear = 0;
+
+    if (!PyArg_ParseTuple(args, "O|ii", &data, &length, &clear))
+        return NULL;
+
+    struct SoundIoRingBuffer *buffer = PyLong_AsVoidPtr(data);
+    int free_bytes = soundio_ring_buffer_free_count(buffer);
+    char *ptr = soundio_ring_buffer_write_ptr(buffer);
+
+    if (length < 0 || length > free_bytes)
+        length = free_bytes;
+    if (clear)
+        memset(ptr, 0, length);
+
+    // Writable view straight into the ring buffer memory, the data
+    // is committed with ring_buffer_advance_write_ptr.
+#if PY_MAJOR_VERSION >= 3
+    return PyMemoryView_FromMemory(ptr, length, PyBUF_WRITE);
+#else
+    return PyBuffer_FromReadWriteMemory(ptr, length);
+#endif
+}
+
 static PyObject *
 pysoundio__ring_buffer_free_count(PyObject *self, PyObject *args)
 {
@@ -1482,6 +4106,20 @@ init_soundiox(void)
     // Constants
     PyModule_AddIntMacro(m, SOUNDIO_MAX_CHANNELS);
 
+    // OverflowPolicy
+    PyModule_AddIntMacro(m, OverflowDropNewest);
+    PyModule_AddIntMacro(m, OverflowDropOldest);
+    PyModule_AddIntMacro(m, OverflowGap);
+
+    // ResampleQuality
+    PyModule_AddIntMacro(m, ResampleQualityLow);
+    PyModule_AddIntMacro(m, ResampleQualityMedium);
+    PyModule_AddIntMacro(m, ResampleQualityHigh);
+
+    // StreamEventType
+    PyModule_AddIntMacro(m, StreamEventData);
+    PyModule_AddIntMacro(m, StreamEventXrun);
+
     // SoundIoError
     PyModule_AddIntMacro(m, SoundIoErrorNone);
     PyModule_AddIntMacro(m, SoundIoErrorNoMem);
@@ -1635,6 +4273,7 @@ init_soundiox(void)
     PyModule_AddIntMacro(m, SoundIoFormatFloat32BE);
     PyModule_AddIntMacro(m, SoundIoFormatFloat64LE);
     PyModule_AddIntMacro(m, SoundIoFormatFloat64BE);
+    PyModule_AddIntMacro(m, SoundIoFormatFloat32NE);
 
 
 #if PY_MAJOR_VERSION >= 3
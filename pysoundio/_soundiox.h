@@ -46,6 +46,8 @@ static PyObject *
 pysoundio__wait_events(PyObject *self, PyObject *args);
 static PyObject *
 pysoundio__wakeup(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__devices_changed(PyObject *self, PyObject *args);
 
 /**
  * Debugging
@@ -58,6 +60,8 @@ static PyObject *
 pysoundio__format_string(PyObject *self, PyObject *args);
 static PyObject *
 pysoundio__get_channel_name(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__parse_channel_id(PyObject *self, PyObject *args);
 
 /**
  * Device API
@@ -104,13 +108,15 @@ static PyObject *
 pysoundio__get_bytes_per_sample(PyObject *self, PyObject *args);
 static PyObject *
 pysoundio__get_bytes_per_second(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__convert_to_float(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__convert_from_float(PyObject *self, PyObject *args);
 
 /**
  * Input Stream API
  */
 static PyObject *
-pysoundio__set_read_callbacks(PyObject *self, PyObject *args);
-static PyObject *
 pysoundio__instream_create(PyObject *self, PyObject *args);
 static PyObject *
 pysoundio__instream_destroy(PyObject *self, PyObject *args);
@@ -122,13 +128,53 @@ static PyObject *
 pysoundio__instream_pause(PyObject *self, PyObject *args);
 static PyObject *
 pysoundio__instream_get_latency(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_get_timing(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_wait(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_wait_events(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_interrupt(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_set_notify_fd(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_set_overflow_policy(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_set_convert(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_set_channel_matrix(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_set_resampler(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_set_block_bytes(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_set_history(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_snapshot(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_frame_at(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_time_at(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_read_range(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_read_begin(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_read_end(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_get_gaps(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_get_stats(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__instream_set_passthrough(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__monotonic_time(PyObject *self, PyObject *args);
 
 /**
  * Output Stream API
  */
 static PyObject *
-pysoundio__set_write_callbacks(PyObject *self, PyObject *args);
-static PyObject *
 pysoundio__outstream_create(PyObject *self, PyObject *args);
 static PyObject *
 pysoundio__outstream_destroy(PyObject *self, PyObject *args);
@@ -144,11 +190,31 @@ static PyObject *
 pysoundio__outstream_get_latency(PyObject *self, PyObject *args);
 static PyObject *
 pysoundio__outstream_set_volume(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__outstream_get_stats(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__outstream_set_convert(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__outstream_set_channel_matrix(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__outstream_set_resampler(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__outstream_set_refill_bytes(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__outstream_wait_events(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__outstream_interrupt(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__outstream_set_notify_fd(PyObject *self, PyObject *args);
+static PyObject *
+pysoundio__outstream_wait(PyObject *self, PyObject *args);
 
 /**
  * Ring Buffer API
  */
 static PyObject *
+pysoundio__ring_buffer_create(PyObject *self, PyObject *args);
+static PyObject *
 pysoundio__input_ring_buffer_create(PyObject *self, PyObject *args);
 static PyObject *
 pysoundio__output_ring_buffer_create(PyObject *self, PyObject *args);
@@ -163,6 +229,8 @@ pysoundio__ring_buffer_advance_read_ptr(PyObject *self, PyObject *args);
 static PyObject *
 pysoundio__ring_buffer_write_ptr(PyObject *self, PyObject *args);
 static PyObject *
+pysoundio__ring_buffer_write_view(PyObject *self, PyObject *args);
+static PyObject *
 pysoundio__ring_buffer_free_count(PyObject *self, PyObject *args);
 static PyObject *
 pysoundio__ring_buffer_advance_write_ptr(PyObject *self, PyObject *args);
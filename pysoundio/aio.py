@@ -0,0 +1,159 @@
+"""
+aio.py
+
+asyncio interface to PySoundIo streams, Python 3.5+ only.
+
+The C stream callbacks write a byte to a socket after every period,
+which the event loop waits on, so no thread is needed per stream and
+one loop can serve many streams alongside other I/O.
+
+"""
+import asyncio
+import socket
+
+import _soundiox as soundio
+from .pysoundio import PySoundIoError
+
+try:
+    _get_running_loop = asyncio.get_running_loop
+except AttributeError:
+    # Python < 3.7, where get_event_loop returns the running loop in a coroutine
+    _get_running_loop = asyncio.get_event_loop
+
+
+def _notify_socketpair():
+    """ Returns a non blocking (reader, writer) socket pair """
+    reader, writer = socket.socketpair()
+    reader.setblocking(False)
+    writer.setblocking(False)
+    return reader, writer
+
+
+class AsyncInputStream(object):
+    """
+    Capture from an input device with ``async for``.
+
+    Each iteration returns a copy of the captured data, as bytes or a
+    numpy array in numpy mode, of block_size frames if given,
+    otherwise of everything captured since the last iteration.
+
+    Parameters
+    ----------
+    pysoundio: (PySoundIo) instance to open the stream with
+    loop: (asyncio.AbstractEventLoop) event loop to use, defaults to the running loop (optional)
+    kwargs: arguments for PySoundIo.open_input_stream, callbacks
+            cannot be used
+
+    Notes
+    -----
+    .. code-block:: python
+        :linenos:
+
+        async with AsyncInputStream(pysoundio, channels=2, block_size=1024) as stream:
+            async for block in stream:
+                await websocket.send(block)
+    """
+
+    def __init__(self, pysoundio, loop=None, **kwargs):
+        self.pysoundio = pysoundio
+        self.loop = loop
+        self.block_size = kwargs.get('block_size')
+        self._reader, self._writer = _notify_socketpair()
+        self.stream = pysoundio.open_input_stream(blocking=True, **kwargs)
+        soundio.instream_set_notify_fd(self.stream['stream'], self._writer.fileno())
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.stream['stream'] is None:
+            raise StopAsyncIteration
+        return await self.read(self.block_size)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    async def read(self, frames=None):
+        """
+        Wait until frames have been captured, and return them.
+        Without frames, waits for any data and returns all of it.
+        """
+        bytes_per_frame = self.stream['bytes_per_frame']
+        needed = frames * bytes_per_frame if frames else bytes_per_frame
+        while True:
+            available = soundio.ring_buffer_fill_count(self.stream['buffer'])
+            if available >= needed:
+                break
+            await (self.loop or _get_running_loop()).sock_recv(self._reader, 4096)
+        return self.pysoundio.read(frames or available // bytes_per_frame,
+                                   timeout=0, stream=self.stream)
+
+    def close(self):
+        """ Stop the stream and release the notify socket """
+        self.pysoundio.close_input_stream(self.stream)
+        self._reader.close()
+        self._writer.close()
+
+
+class AsyncOutputStream(object):
+    """
+    Play to an output device with awaitable writes.
+
+    write waits while the ring buffer is full, so a producer
+    can never get more than the ring buffer ahead of the device.
+
+    Parameters
+    ----------
+    pysoundio: (PySoundIo) instance to start the output stream with
+    loop: (asyncio.AbstractEventLoop) event loop to use, defaults to the running loop (optional)
+    kwargs: arguments for PySoundIo.start_output_stream, callbacks
+            cannot be used
+
+    Notes
+    -----
+    .. code-block:: python
+        :linenos:
+
+        async with AsyncOutputStream(pysoundio, channels=2) as stream:
+            async for block in source:
+                await stream.write(block)
+    """
+
+    def __init__(self, pysoundio, loop=None, **kwargs):
+        self.pysoundio = pysoundio
+        self.loop = loop
+        self._reader, self._writer = _notify_socketpair()
+        pysoundio.start_output_stream(blocking=True, **kwargs)
+        soundio.outstream_set_notify_fd(pysoundio.output['stream'], self._writer.fileno())
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    async def write(self, data):
+        """
+        Write interleaved frames, waiting for the device
+        to make room in the ring buffer when it is full.
+        """
+        bytes_per_frame = self.pysoundio.output['bytes_per_frame']
+        view = memoryview(data).cast('B')
+        if len(view) % bytes_per_frame:
+            raise PySoundIoError('Data is not a whole number of frames')
+        loop = self.loop or _get_running_loop()
+        offset = 0
+        while offset < len(view):
+            written = self.pysoundio._write_available(view, offset)
+            if written == offset:
+                await loop.sock_recv(self._reader, 4096)
+            offset = written
+
+    def close(self):
+        """ Stop the output stream and release the notify socket """
+        self.pysoundio.close_output_stream()
+        self._reader.close()
+        self._writer.close()
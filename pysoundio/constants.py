@@ -14,10 +14,17 @@ from _soundiox import (
     SoundIoFormatU24BE, SoundIoFormatS32LE, SoundIoFormatS32BE,
     SoundIoFormatU32LE, SoundIoFormatU32BE,
     SoundIoFormatFloat32LE, SoundIoFormatFloat32BE, SoundIoFormatFloat64LE,
-    SoundIoFormatFloat64BE, SoundIoFormatInvalid
+    SoundIoFormatFloat64BE, SoundIoFormatFloat32NE, SoundIoFormatInvalid,
+    OverflowDropNewest, OverflowDropOldest, OverflowGap,
+    ResampleQualityLow, ResampleQualityMedium, ResampleQualityHigh
 )
 
 DEFAULT_RING_BUFFER_DURATION = 30  # secs
+AUTO_RING_BUFFER_MIN_DURATION = 0.5  # secs
+AUTO_RING_BUFFER_JITTER = 0.1  # secs, until a dispatcher has seen worse
+AUTO_RING_BUFFER_HEADROOM = 4
+SINK_CHUNK_DURATION = 0.5  # secs
+SOURCE_LOOKAHEAD_DURATION = 2  # secs
 
 SoundIoBackend = {
     SoundIoBackendNone: 'SoundIoBackendNone',
@@ -51,6 +58,18 @@ SoundIoFormat = {
     SoundIoFormatInvalid: 'SoundIoFormatInvalid'
 }
 
+OverflowPolicy = {
+    OverflowDropNewest: 'OverflowDropNewest',
+    OverflowDropOldest: 'OverflowDropOldest',
+    OverflowGap: 'OverflowGap',
+}
+
+ResampleQuality = {
+    ResampleQualityLow: 'ResampleQualityLow',
+    ResampleQualityMedium: 'ResampleQualityMedium',
+    ResampleQualityHigh: 'ResampleQualityHigh',
+}
+
 PRIORITISED_FORMATS = [
     SoundIoFormatFloat32LE,
     SoundIoFormatFloat32BE,
@@ -7,15 +7,25 @@ libsoundio is a C library for cross-platform audio input and output.
 It is suitable for real-time and consumer software.
 
 """
+import bisect
 import logging
 import threading
+import time
 
 import ctypes as _ctypes
 from .constants import (
+    ARRAY_FORMATS,
+    AUTO_RING_BUFFER_HEADROOM,
+    AUTO_RING_BUFFER_JITTER,
+    AUTO_RING_BUFFER_MIN_DURATION,
     DEFAULT_RING_BUFFER_DURATION,
+    OverflowDropNewest,
     PRIORITISED_FORMATS,
     PRIORITISED_SAMPLE_RATES,
-    SoundIoFormat
+    SINK_CHUNK_DURATION,
+    SOURCE_LOOKAHEAD_DURATION,
+    SoundIoFormat,
+    SoundIoFormatFloat32NE
 )
 from .structures import (
     SoundIoErrorCallback,
@@ -29,8 +39,15 @@ from .structures import (
     SoundIoChannelLayout,
     SoundIoSampleRateRange
 )
+from .sinks import WAV_FORMATS, SegmentedWavSink, WavSink
+from .sources import WavSource
 import _soundiox as soundio
 
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
+
 LOGGER = logging.getLogger(__name__)
 
 
@@ -38,40 +55,350 @@ class PySoundIoError(Exception):
     pass
 
 
-class _InputProcessingThread(threading.Thread):
+_clock = getattr(time, 'perf_counter', time.time)
+_thread_clock = getattr(time, 'thread_time', None)
+
+# Upper edges of the callback load histogram, as a fraction of the
+# period, with a final bucket for anything over twice the period
+_CALLBACK_LOAD_BUCKETS = (0.25, 0.5, 0.75, 1.0, 2.0)
+
+
+class _ProcessingThread(threading.Thread):
+    """
+    Long lived dispatcher, driven by events from the C stream callbacks.
+
+    The callbacks never take the GIL, they queue events in C which
+    this thread waits for with the GIL released. A single thread per
+    stream processes every period, so blocks are always delivered in
+    order. Wakeup latency and the CPU time spent processing are
+    recorded in `stats`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(_ProcessingThread, self).__init__(*args, **kwargs)
+        self.daemon = True
+        self.running = True
+        self.xrun_callback = None
+        self.overrun_callback = None
+        self.stats = {
+            'wakeups': 0,
+            'blocks': 0,
+            'xruns': 0,
+            'wakeup_latency_total': 0.0,
+            'wakeup_latency_max': 0.0,
+            'cpu_time': 0.0,
+            'callback_time_max': 0.0,
+            'callback_load_histogram': [0] * (len(_CALLBACK_LOAD_BUCKETS) + 1),
+            'deadline_misses': 0,
+            'callback_errors': 0,
+        }
+
+    def wait_events(self, timeout=-1.0):
+        raise NotImplementedError
 
-    def __init__(self, parent, *args, **kwargs):
-        self.buffer = parent.input['buffer']
-        self.callback = parent.input['read_callback']
-        self.bytes_per_frame = parent.input['bytes_per_frame']
-        super(_InputProcessingThread, self).__init__(*args, **kwargs)
+    def interrupt(self):
+        raise NotImplementedError
+
+    def data_event(self, frames):
+        """ Called for each period reported by the C callback """
+        pass
+
+    def run_callback(self, frames, **kwargs):
+        """
+        Call the user callback for a block of frames, timed against its
+        deadline, the audio time it covers and at least one period.
+        Callbacks which take longer count as deadline misses and
+        call the overrun callback with the time taken and the deadline.
+        """
+        start = _clock()
+        self.callback(**kwargs)
+        elapsed = _clock() - start
+
+        deadline = max(self.period, float(frames) / self.sample_rate)
+        load = elapsed / deadline if deadline else 0.0
+        self.stats['blocks'] += 1
+        self.stats['callback_time_max'] = max(self.stats['callback_time_max'], elapsed)
+        self.stats['callback_load_histogram'][bisect.bisect_left(_CALLBACK_LOAD_BUCKETS, load)] += 1
+        if load > 1.0:
+            self.stats['deadline_misses'] += 1
+            if self.overrun_callback:
+                self.overrun_callback(elapsed, deadline)
+
+    def stop(self):
+        """ Stop the dispatcher once pending periods are processed """
+        self.running = False
+        self.interrupt()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
 
     def run(self):
-        """ Callback with data """
-        fill_bytes = soundio.ring_buffer_fill_count(self.buffer)
-        read_buf = soundio.ring_buffer_read_ptr(self.buffer)
-        if self.callback and fill_bytes:
-            self.callback(data=read_buf, length=fill_bytes / self.bytes_per_frame)
-        soundio.ring_buffer_advance_read_ptr(self.buffer, fill_bytes)
+        """ Wait for events and process them in order """
+        while True:
+            events = self.wait_events()
+            running = self.running
+
+            pending = 0
+            signalled = None
+            xruns = 0
+            for kind, frames, when in events:
+                if kind == soundio.StreamEventXrun:
+                    xruns += 1
+                    continue
+                self.data_event(frames)
+                pending += 1
+                if signalled is None or when < signalled:
+                    signalled = when
+
+            if pending:
+                latency = soundio.monotonic_time() - signalled
+                self.stats['wakeups'] += 1
+                self.stats['wakeup_latency_total'] += latency
+                self.stats['wakeup_latency_max'] = max(self.stats['wakeup_latency_max'], latency)
+
+                start = _thread_clock() if _thread_clock else 0.0
+                try:
+                    self.process(pending)
+                except Exception:
+                    # Keep running, so the ring buffer is still drained or refilled
+                    self.stats['callback_errors'] += 1
+                    LOGGER.exception('Error in stream callback')
+                if _thread_clock:
+                    self.stats['cpu_time'] += _thread_clock() - start
+
+            self.stats['xruns'] += xruns
+            if self.xrun_callback:
+                for _ in range(xruns):
+                    try:
+                        self.xrun_callback()
+                    except Exception:
+                        self.stats['callback_errors'] += 1
+                        LOGGER.exception('Error in stream xrun callback')
+            if not running:
+                break
+
+    def get_jitter(self):
+        """
+        Worst delay seen between a period being ready and the
+        callback finishing with it, in seconds
+        """
+        return self.stats['wakeup_latency_max'] + self.stats['callback_time_max']
+
+    def get_stats(self):
+        """
+        Returns a copy of the dispatcher statistics, with the
+        mean wakeup latency in seconds.
+        """
+        stats = dict(self.stats)
+        stats['wakeup_latency_mean'] = (
+            stats['wakeup_latency_total'] / stats['wakeups'] if stats['wakeups'] else 0.0)
+        return stats
+
+    def process(self, pending=1):
+        raise NotImplementedError
+
+
+class _InputProcessingThread(_ProcessingThread):
+
+    def __init__(self, parent, stream=None, *args, **kwargs):
+        stream = parent.input if stream is None else stream
+        self.stream = stream['stream']
+        self.buffer = stream['buffer']
+        self.callback = stream['read_callback']
+        self.bytes_per_frame = stream['bytes_per_frame']
+        self.channels = stream['channels']
+        self.sample_rate = stream['sample_rate']
+        self.dtype = stream.get('dtype')
+        self.timestamps = stream.get('timestamps', False)
+        self.period = stream.get('period', 0.0)
+        self.block_bytes = 0
+        self.hop_bytes = 0
+        if stream.get('exact_blocks'):
+            self.block_bytes = stream['block_size'] * self.bytes_per_frame
+            self.hop_bytes = stream['hop_size'] * self.bytes_per_frame
+        self.frame = 0
+        super(_InputProcessingThread, self).__init__(*args, **kwargs)
+        self.xrun_callback = stream.get('overflow_callback')
+        self.overrun_callback = stream.get('overrun_callback')
+
+    def wait_events(self, timeout=-1.0):
+        return soundio.instream_wait_events(self.stream, timeout)
+
+    def interrupt(self):
+        soundio.instream_interrupt(self.stream)
+
+    def get_timestamp(self):
+        """
+        Capture time of the next frame to deliver, extrapolated from
+        the last time the C read callback took frames from the device.
+        """
+        frames, read_time = soundio.instream_get_timing(self.stream)
+        return read_time - float(frames - self.frame) / self.sample_rate
+
+    def deliver(self, read_buf):
+        """ Pass a block starting at self.frame to the read callback """
+        length = len(read_buf) // self.bytes_per_frame
+        if self.dtype is not None:
+            read_buf = _np.frombuffer(read_buf, self.dtype).reshape(-1, self.channels)
+        if self.timestamps:
+            self.run_callback(length, data=read_buf, length=length,
+                              frame=self.frame, timestamp=self.get_timestamp())
+        else:
+            self.run_callback(length, data=read_buf, length=length)
+
+    def process(self, pending=1):
+        """
+        Callback with all of the data available, or with exact blocks,
+        once per complete block, advancing by the hop size.
+        """
+        if self.block_bytes:
+            self.process_blocks()
+            return
+        read_buf, position = soundio.instream_read_begin(self.stream)
+        fill_bytes = len(read_buf)
+        self.frame = position // self.bytes_per_frame
+        try:
+            if self.callback and fill_bytes:
+                self.deliver(read_buf)
+        finally:
+            soundio.instream_read_end(self.stream, position + fill_bytes)
+        self.frame = (position + fill_bytes) // self.bytes_per_frame
+
+    def process_blocks(self):
+        """
+        Blocks are read in place from the ring buffer, overlapping
+        blocks stay buffered until the hop has moved past them.
+        """
+        while True:
+            read_buf, position = soundio.instream_read_begin(self.stream, self.block_bytes)
+            self.frame = position // self.bytes_per_frame
+            if len(read_buf) < self.block_bytes:
+                soundio.instream_read_end(self.stream, position)
+                break
+            try:
+                if self.callback:
+                    self.deliver(read_buf)
+            finally:
+                soundio.instream_read_end(self.stream, position + self.hop_bytes)
 
 
-class _OutputProcessingThread(threading.Thread):
+class _SinkProcessingThread(_InputProcessingThread):
+    """
+    Input dispatcher which writes everything captured to a sink. The
+    C read callback only wakes it once a whole chunk is buffered, so
+    there is no Python work per period and the file is written in
+    large blocks. Sinks are passed the frame index and timestamp of
+    each chunk.
+    """
+
+    def __init__(self, parent, stream, sink, *args, **kwargs):
+        super(_SinkProcessingThread, self).__init__(parent, stream, *args, **kwargs)
+        self.sink = sink
+        self.callback = sink.write
+        self.timestamps = True
+
+    def stop(self):
+        """ Stop, then write whatever is left and finish the file """
+        super(_SinkProcessingThread, self).stop()
+        self.process()
+        self.sink.close()
+
+
+class _OutputProcessingThread(_ProcessingThread):
 
     def __init__(self, parent, block_size, *args, **kwargs):
+        self.stream = parent.output['stream']
         self.buffer = parent.output['buffer']
         self.callback = parent.output['write_callback']
         self.bytes_per_frame = parent.output['bytes_per_frame']
+        self.channels = parent.output['channels']
+        self.sample_rate = parent.output['sample_rate']
+        self.dtype = parent.output.get('dtype')
+        self.period = parent.output.get('period', 0.0)
+        self.exact_blocks = parent.output.get('exact_blocks', False)
         self.block_size = block_size
+        self.request_size = block_size
         super(_OutputProcessingThread, self).__init__(*args, **kwargs)
-
-    def run(self):
-        """ Callback to fill data """
-        data = bytearray(b'\x00' * self.block_size * self.bytes_per_frame)
-        free_bytes = soundio.ring_buffer_free_count(self.buffer)
-        if self.callback and free_bytes >= len(data):
-            self.callback(data=data, length=self.block_size)
-        soundio.ring_buffer_write_ptr(self.buffer, data, len(data))
-        soundio.ring_buffer_advance_write_ptr(self.buffer, len(data))
+        self.xrun_callback = parent.output.get('underflow_callback')
+        self.overrun_callback = parent.output.get('overrun_callback')
+
+    def wait_events(self, timeout=-1.0):
+        return soundio.outstream_wait_events(self.stream, timeout)
+
+    def interrupt(self):
+        soundio.outstream_interrupt(self.stream)
+
+    def data_event(self, frames):
+        """ The device asks for up to frames per period """
+        self.request_size = frames
+        if not self.exact_blocks:
+            self.block_size = frames
+
+    def process(self, pending=1):
+        """
+        Callback to fill one block of data per pending period.
+        The callback writes directly into the ring buffer, which
+        the C write callback inserts silence for when empty.
+        With exact blocks, blocks of block_size frames are written
+        until a device period is buffered.
+        """
+        if not self.callback:
+            return
+        block_bytes = self.block_size * self.bytes_per_frame
+        if self.exact_blocks:
+            request_bytes = self.request_size * self.bytes_per_frame
+            while soundio.ring_buffer_fill_count(self.buffer) < request_bytes:
+                if not self.write_block(block_bytes):
+                    break
+        else:
+            for _ in range(pending):
+                if not self.write_block(block_bytes):
+                    break
+
+    def write_block(self, block_bytes):
+        """ Fill one block in place, returns False when there is no room """
+        if soundio.ring_buffer_free_count(self.buffer) < block_bytes:
+            return False
+        data = soundio.ring_buffer_write_view(self.buffer, block_bytes, True)
+        if self.dtype is not None:
+            data = _np.frombuffer(data, self.dtype).reshape(-1, self.channels)
+        self.run_callback(self.block_size, data=data, length=self.block_size)
+        soundio.ring_buffer_advance_write_ptr(self.buffer, block_bytes)
+        return True
+
+
+class _SourceProcessingThread(_OutputProcessingThread):
+    """
+    Output dispatcher which plays a source. The ring buffer holds the
+    read-ahead, and the C write callback only wakes this thread once
+    it has drained to half, to top it up from the file in one read.
+    `finished` is set once the whole source has been played.
+    """
+
+    def __init__(self, parent, source, *args, **kwargs):
+        super(_SourceProcessingThread, self).__init__(parent, *args, **kwargs)
+        self.source = source
+        self.callback = self.refill
+        self.finished = threading.Event()
+
+    def process(self, pending=1):
+        """ Refill the free space in the ring buffer from the source """
+        free = soundio.ring_buffer_free_count(self.buffer)
+        if self.source.remaining and free >= self.bytes_per_frame:
+            self.run_callback(free // self.bytes_per_frame)
+        elif not self.source.remaining and not soundio.ring_buffer_fill_count(self.buffer):
+            self.finished.set()
+
+    def refill(self):
+        """ Read straight into the ring buffer, without a copy """
+        view = soundio.ring_buffer_write_view(self.buffer)
+        read = self.source.readinto(view)
+        if read:
+            soundio.ring_buffer_advance_write_ptr(self.buffer, read)
+
+    def stop(self):
+        """ Stop, then close the source """
+        super(_SourceProcessingThread, self).stop()
+        self.source.close()
 
 
 class PySoundIo(object):
@@ -88,14 +415,20 @@ class PySoundIo(object):
         self.backend = backend
         self.testing = False
 
-        self.input = {'device': None, 'stream': None, 'buffer': None, 'read_callback': None}
-        self.output = {'device': None, 'stream': None, 'buffer': None, 'write_callback': None}
+        self.input = {'device': None, 'stream': None, 'buffer': None,
+                      'read_callback': None, 'dispatcher': None}
+        self.output = {'device': None, 'stream': None, 'buffer': None,
+                       'write_callback': None, 'dispatcher': None}
+        self.input_streams = []
+        self._consumer_jitter = AUTO_RING_BUFFER_JITTER
+        self._devices = None
+        self._devices_changed = None
 
         self._soundio = soundio.create()
         if backend:
-            soundio.connect_backend(backend)
+            soundio.connect_backend(self._soundio, backend)
         else:
-            soundio.connect()
+            soundio.connect(self._soundio)
 
         if self.version < '2.0.0':
             if ('volume', _ctypes.c_float) in SoundIoOutStream._fields_:
@@ -108,11 +441,15 @@ class PySoundIo(object):
         Clean up allocated memory
         Close libsoundio connections
         """
+        for stream in list(self.input_streams):
+            self.close_input_stream(stream)
+        self._stop_dispatcher(self.input)
+        self._stop_dispatcher(self.output)
         if self.input['stream']:
-            soundio.instream_destroy()
+            soundio.instream_destroy(self.input['stream'])
             del self.input['stream']
         if self.output['stream']:
-            soundio.outstream_destroy()
+            soundio.outstream_destroy(self.output['stream'])
             del self.output['stream']
         if self.input['buffer']:
             soundio.ring_buffer_destroy(self.input['buffer'])
@@ -127,15 +464,15 @@ class PySoundIo(object):
             soundio.device_unref(self.output['device'])
             del self.output['device']
         if self._soundio:
-            soundio.disconnect()
-            soundio.destroy()
+            soundio.disconnect(self._soundio)
+            soundio.destroy(self._soundio)
             del self._soundio
 
     def flush(self):
         """
         Atomically update information for all connected devices.
         """
-        soundio.flush()
+        soundio.flush(self._soundio)
 
     @property
     def version(self):
@@ -149,7 +486,7 @@ class PySoundIo(object):
         """
         Returns the number of available backends.
         """
-        return soundio.backend_count()
+        return soundio.backend_count(self._soundio)
 
     def get_default_input_device(self):
         """
@@ -163,7 +500,7 @@ class PySoundIo(object):
         ------
         PySoundIoError if the input device is not available
         """
-        device_id = soundio.default_input_device_index()
+        device_id = soundio.default_input_device_index(self._soundio)
         return self.get_input_device(device_id)
 
     def get_input_device(self, device_id):
@@ -182,11 +519,17 @@ class PySoundIo(object):
         ------
         PySoundIoError if an invalid device id is used, or device is unavailable
         """
-        if device_id < 0 or device_id > soundio.get_input_device_count():
-            raise PySoundIoError('Invalid input device id')
-        self.input['device'] = soundio.get_input_device(device_id)
+        self.input['device'] = self._get_input_device(device_id)
         return self.input['device']
 
+    def _get_input_device(self, device_id):
+        """
+        Return an input device by index, without storing it
+        """
+        if device_id < 0 or device_id >= soundio.get_input_device_count(self._soundio):
+            raise PySoundIoError('Invalid input device id')
+        return soundio.get_input_device(self._soundio, device_id)
+
     def get_default_output_device(self):
         """
         Returns default output device
@@ -199,7 +542,7 @@ class PySoundIo(object):
         ------
         PySoundIoError if the output device is not available
         """
-        device_id = soundio.default_output_device_index()
+        device_id = soundio.default_output_device_index(self._soundio)
         return self.get_output_device(device_id)
 
     def get_output_device(self, device_id):
@@ -218,30 +561,44 @@ class PySoundIo(object):
         ------
         PySoundIoError if an invalid device id is used, or device is unavailable
         """
-        if device_id < 0 or device_id > soundio.get_output_device_count():
+        if device_id < 0 or device_id >= soundio.get_output_device_count(self._soundio):
             raise PySoundIoError('Invalid output device id')
-        self.output['device'] = soundio.get_output_device(device_id)
+        self.output['device'] = soundio.get_output_device(self._soundio, device_id)
         return self.output['device']
 
     def list_devices(self):
         """
         Return a list of available devices
 
+        The list is cached until libsoundio reports that the devices
+        have changed, which is picked up by flush. The cached lists
+        are returned each time, and should not be modified.
+
         Returns
         -------
         (list)(dict) containing information on available input / output devices.
         """
-        output_count = soundio.get_output_device_count()
-        input_count = soundio.get_input_device_count()
+        devices_changed = soundio.devices_changed(self._soundio)
+        if self._devices is None or devices_changed != self._devices_changed:
+            self._devices = self._list_devices()
+            self._devices_changed = devices_changed
+        return self._devices
 
-        default_output = soundio.default_output_device_index()
-        default_input = soundio.default_input_device_index()
+    def _list_devices(self):
+        """
+        Query every device, see list_devices
+        """
+        output_count = soundio.get_output_device_count(self._soundio)
+        input_count = soundio.get_input_device_count(self._soundio)
+
+        default_output = soundio.default_output_device_index(self._soundio)
+        default_input = soundio.default_input_device_index(self._soundio)
 
         input_devices = []
         output_devices = []
 
         for i in range(0, input_count):
-            device = soundio.get_input_device(i)
+            device = soundio.get_input_device(self._soundio, i)
             pydevice = _ctypes.cast(device, _ctypes.POINTER(SoundIoDevice))
             input_devices.append({
                 'id': pydevice.contents.id.decode(), 'name': pydevice.contents.name.decode(),
@@ -257,7 +614,7 @@ class PySoundIo(object):
             soundio.device_unref(device)
 
         for i in range(0, output_count):
-            device = soundio.get_output_device(i)
+            device = soundio.get_output_device(self._soundio, i)
             pydevice = _ctypes.cast(device, _ctypes.POINTER(SoundIoDevice))
             output_devices.append({
                 'id': pydevice.contents.id.decode(), 'name': pydevice.contents.name.decode(),
@@ -433,6 +790,72 @@ class PySoundIo(object):
         """
         return soundio.channel_layout_get_default(channels)
 
+    def get_channel_id(self, channel):
+        """
+        Get the SoundIoChannelId of a channel
+
+        Parameters
+        ----------
+        channel: (int or str) channel id, or a channel name such as 'Front Left'
+
+        Returns
+        -------
+        (int) SoundIoChannelId
+
+        Raises
+        ------
+        PySoundIoError if the channel name is not recognised
+        """
+        if isinstance(channel, int):
+            return channel
+        channel_id = soundio.parse_channel_id(channel)
+        if channel_id == soundio.SoundIoChannelIdInvalid:
+            raise PySoundIoError('Invalid channel: %s' % channel)
+        return channel_id
+
+    def get_channel_matrix(self, device, channel_map):
+        """
+        Find the device layout with the fewest channels which has every
+        channel in channel_map, and the mixing matrix for it.
+
+        Parameters
+        ----------
+        device: (SoundIoDevice) device object
+        channel_map: (list) one entry per stream channel, a device channel
+                            or a dict of device channels to gains
+
+        Returns
+        -------
+        (tuple) the SoundIoChannelLayout, and a list with one row per
+                stream channel of gains for each channel in the layout
+
+        Raises
+        ------
+        PySoundIoError if no device layout has the channels
+        """
+        routes = []
+        for entry in channel_map:
+            if not isinstance(entry, dict):
+                entry = {entry: 1.0}
+            routes.append(dict((self.get_channel_id(channel), float(gain))
+                               for channel, gain in entry.items()))
+        wanted = set(channel for route in routes for channel in route)
+
+        pydevice = _ctypes.cast(device, _ctypes.POINTER(SoundIoDevice))
+        best = None
+        for l in range(0, pydevice.contents.layout_count):
+            layout = pydevice.contents.layouts[l]
+            if wanted.issubset(layout.channels[:layout.channel_count]):
+                if best is None or layout.channel_count < best.channel_count:
+                    best = layout
+        if best is None:
+            raise PySoundIoError('No device layout has channels: %s' % ', '.join(
+                soundio.get_channel_name(channel) for channel in sorted(wanted)))
+
+        channels = best.channels[:best.channel_count]
+        matrix = [[route.get(channel, 0.0) for channel in channels] for route in routes]
+        return best, matrix
+
     def get_bytes_per_frame(self, format, channels):
         """
         Get the number of bytes per frame
@@ -478,65 +901,99 @@ class PySoundIo(object):
         """
         return soundio.get_bytes_per_second(format, channels, sample_rate)
 
-    def _create_input_ring_buffer(self, capacity):
+    def get_numpy_dtype(self, format):
+        """
+        Get the numpy dtype for a format, with the correct byte order
+
+        Parameters
+        ----------
+        format: (SoundIoFormat) format
+
+        Returns
+        -------
+        (numpy.dtype) data type of a sample
+
+        Raises
+        ------
+        PySoundIoError if numpy is not installed, or the format has no equivalent
+        """
+        if _np is None:
+            raise PySoundIoError('numpy is not installed')
+        typecode = ARRAY_FORMATS.get(format)
+        if typecode is None:
+            raise PySoundIoError('Format has no numpy dtype: %s' % soundio.format_string(format))
+        byteorder = '>' if SoundIoFormat[format].endswith('BE') else '<'
+        kind = 'f' if typecode in 'fd' else ('u' if typecode.isupper() else 'i')
+        return _np.dtype('%s%s%d' % (byteorder, kind, self.get_bytes_per_sample(format)))
+
+    def _create_input_ring_buffer(self, capacity, stream=None):
         """
         Creates ring buffer with the capacity to hold 30 seconds of data,
         by default.
         """
-        self.input['buffer'] = soundio.input_ring_buffer_create(capacity)
-        return self.input['buffer']
+        stream = self.input if stream is None else stream
+        stream['buffer'] = soundio.input_ring_buffer_create(stream['stream'], capacity)
+        return stream['buffer']
 
     def _create_output_ring_buffer(self, capacity):
         """
         Creates ring buffer with the capacity to hold 30 seconds of data,
         by default.
         """
-        self.output['buffer'] = soundio.output_ring_buffer_create(capacity)
+        self.output['buffer'] = soundio.output_ring_buffer_create(self.output['stream'], capacity)
         return self.output['buffer']
 
-    def _create_input_stream(self):
+    def _create_input_stream(self, stream=None):
         """
         Allocates memory and sets defaults for input stream
         """
-        self.input['stream'] = soundio.instream_create(self.input['device'])
+        stream = self.input if stream is None else stream
+        stream['stream'] = soundio.instream_create(stream['device'])
 
-        pyinstream = _ctypes.cast(self.input['stream'], _ctypes.POINTER(SoundIoInStream))
-        soundio.set_read_callbacks(self._read_callback, self._overflow_callback)
+        pyinstream = _ctypes.cast(stream['stream'], _ctypes.POINTER(SoundIoInStream))
 
-        layout = self._get_default_layout(self.input['channels'])
-        pylayout = _ctypes.cast(layout, _ctypes.POINTER(SoundIoChannelLayout))
-        pyinstream.contents.layout = pylayout.contents
+        if stream.get('layout'):
+            pyinstream.contents.layout = stream['layout']
+        else:
+            layout = self._get_default_layout(stream['channels'])
+            pylayout = _ctypes.cast(layout, _ctypes.POINTER(SoundIoChannelLayout))
+            pyinstream.contents.layout = pylayout.contents
 
-        pyinstream.contents.format = self.input['format']
-        pyinstream.contents.sample_rate = self.input['sample_rate']
-        if self.input['block_size']:
-            pyinstream.contents.software_latency = float(self.input['block_size']) / self.input['sample_rate']
+        pyinstream.contents.format = stream['format']
+        pyinstream.contents.sample_rate = stream.get('device_sample_rate') or stream['sample_rate']
+        if stream['block_size']:
+            pyinstream.contents.software_latency = float(stream['block_size']) / stream['sample_rate']
 
-        return self.input['stream']
+        return stream['stream']
 
-    def _open_input_stream(self):
+    def _open_input_stream(self, stream=None):
         """
         Open an input stream.
         """
-        soundio.instream_open()
+        stream = self.input if stream is None else stream
+        soundio.instream_open(stream['stream'])
 
-    def _start_input_stream(self):
+    def _start_input_stream(self, stream=None):
         """
         Start an input stream running.
         """
-        soundio.instream_start()
+        stream = self.input if stream is None else stream
+        soundio.instream_start(stream['stream'])
 
-    def pause_input_stream(self, pause):
+    def pause_input_stream(self, pause, stream=None):
         """
         Pause input stream
 
         Parameters
         ----------
         pause: (bool) True to pause, False to unpause
+        stream: (dict) handle from open_input_stream, defaults
+                       to the stream from start_input_stream (optional)
         """
-        soundio.instream_pause(pause)
+        stream = self.input if stream is None else stream
+        soundio.instream_pause(stream['stream'], pause)
 
-    def get_input_latency(self, out_latency):
+    def get_input_latency(self, out_latency, stream=None):
         """
         Obtain the number of seconds that the next frame of sound
         being captured will take to arrive in the buffer,
@@ -545,34 +1002,30 @@ class PySoundIo(object):
         Parameters
         ----------
         out_latency: (float) output latency in seconds
+        stream: (dict) handle from open_input_stream, defaults
+                       to the stream from start_input_stream (optional)
         """
-        return soundio.instream_get_latency(out_latency)
-
-    def _read_callback(self):
-        """
-        Internal read callback.
-        """
-        _InputProcessingThread(parent=self).start()
-
-    def _overflow_callback(self):
-        """
-        Internal overflow callback, which calls the external
-        overflow callback if defined.
-        """
-        if self.input['overflow_callback']:
-            self.input['overflow_callback']()
+        stream = self.input if stream is None else stream
+        return soundio.instream_get_latency(stream['stream'], out_latency)
 
     def start_input_stream(self, device_id=None,
                            sample_rate=None, dtype=None,
                            block_size=None, channels=None,
-                           read_callback=None, overflow_callback=None):
+                           read_callback=None, overflow_callback=None,
+                           numpy=False, timestamps=False, blocking=False,
+                           overflow_policy=OverflowDropNewest, overrun_callback=None,
+                           exact_blocks=False, hop_size=None, convert=False,
+                           resample_quality=None, channel_map=None,
+                           buffer_duration=None, sink=None, segment_duration=None,
+                           segment_bytes=None, segment_callback=None, history=None):
         """
         Creates input stream, and sets parameters. Then allocates
         a ring buffer and starts the stream.
 
-        The read callback is called in an audio processing thread,
-        when a block of data is read from the microphone. Data is
-        passed from the ring buffer to the callback to process.
+        The read callback is called in a single, long lived audio
+        processing thread, when a block of data is read from the microphone.
+        Data is passed from the ring buffer to the callback to process,
+        blocks are always delivered in order.
 
         Parameters
         ----------
@@ -582,8 +1035,70 @@ class PySoundIo(object):
         block_size: (int) desired block size (optional)
         channels: (int) number of channels [1: mono, 2: stereo] (optional)
         read_callback: (fn) function to call with data, the function must have
-                        the arguments data and length. See record example
+                        the arguments data and length. data is a read only
+                        memoryview into the ring buffer, which is only valid
+                        for the duration of the callback. See record example
         overflow_callback: (fn) function to call if data is not being read fast enough
+        numpy: (bool) pass data to the read callback as a numpy array of
+                      shape (frames, channels), without copying (optional)
+        timestamps: (bool) also pass the arguments frame and timestamp to the
+                           read callback, see open_input_stream (optional)
+        blocking: (bool) no read callback is used, instead data is
+                         fetched with read (optional)
+        overflow_policy: (OverflowPolicy) what to do when data is not being
+                                          read fast enough. OverflowDropNewest
+                                          discards new frames, OverflowDropOldest
+                                          discards buffered frames, and OverflowGap
+                                          replaces lost frames with silence, see
+                                          get_input_gaps. Buffered frames are never
+                                          discarded while the read callback has them,
+                                          OverflowDropOldest discards new frames
+                                          during the callback instead (optional)
+        overrun_callback: (fn) function to call with the arguments elapsed and
+                               deadline, in seconds, when the read callback takes
+                               longer than the period or the audio passed to it (optional)
+        exact_blocks: (bool) pass exactly block_size frames to every read
+                             callback, requires block_size (optional)
+        hop_size: (int) frames between the start of consecutive blocks, less
+                        than block_size for overlapping blocks, implies
+                        exact_blocks, defaults to block_size (optional)
+        convert: (bool) convert samples from the device format, dtype or the
+                        default format, to native float32 in C, so the read
+                        callback and read always get float32 samples (optional)
+        resample_quality: (ResampleQuality) if the device does not support
+                                            sample_rate, open it at its default rate
+                                            and resample in C, with this quality,
+                                            implies convert (optional)
+        channel_map: (list) one entry per channel, the device channel to capture
+                            as a SoundIoChannelId or name, or a dict of device
+                            channels to gains to mix. The device is opened with
+                            the smallest layout that has every channel, and
+                            mixed in C, implies convert (optional)
+        buffer_duration: (float) seconds of audio held by the ring buffer, or 'auto'
+                                 to size it from the software latency, the block
+                                 size and the consumer jitter observed so far,
+                                 defaults to 30 seconds (optional)
+        sink: (str or file) path or seekable binary file to write everything
+                            captured to as WAV, or RF64 past 4 GB, instead of
+                            calling a read callback. The processing thread only
+                            wakes to write half a second at a time. The format
+                            must be U8, S16LE, S32LE or little endian float,
+                            or use convert (optional)
+        segment_duration: (float) split the sink into a new file every this
+                                  many seconds, sink is then a path formatted
+                                  with the fields index and frame, such as
+                                  'capture-{index:06d}.wav' (optional)
+        segment_bytes: (int) split the sink into a new file every this many
+                             bytes of audio, rounded down to whole frames,
+                             the shorter of both limits is used (optional)
+        segment_callback: (fn) function to call with the arguments path, frame,
+                               timestamp and frames, from the processing thread,
+                               as each segment file is finished (optional)
+        history: (float) keep the newest seconds of audio in the ring buffer,
+                         without a read callback or sink, to copy with
+                         snapshot or record from the past with start_recording.
+                         The ring buffer holds buffer_duration more for
+                         the recording to catch up (optional)
 
         Raises
         ------
@@ -607,45 +1122,540 @@ class PySoundIo(object):
             def overflow_callback():
                 print('buffer overflow')
         """
-        self.input['sample_rate'] = sample_rate
-        self.input['format'] = dtype
-        self.input['block_size'] = block_size
-        self.input['channels'] = channels
-        self.input['read_callback'] = read_callback
-        self.input['overflow_callback'] = overflow_callback
+        self._setup_input_stream(self.input, device_id, sample_rate, dtype, block_size,
+                                 channels, read_callback, overflow_callback, numpy, timestamps,
+                                 blocking=blocking, overflow_policy=overflow_policy,
+                                 overrun_callback=overrun_callback,
+                                 exact_blocks=exact_blocks, hop_size=hop_size,
+                                 convert=convert, resample_quality=resample_quality,
+                                 channel_map=channel_map, buffer_duration=buffer_duration,
+                                 sink=sink, segment_duration=segment_duration,
+                                 segment_bytes=segment_bytes, segment_callback=segment_callback,
+                                 history=history)
+
+    def open_input_stream(self, device_id=None,
+                          sample_rate=None, dtype=None,
+                          block_size=None, channels=None,
+                          read_callback=None, overflow_callback=None,
+                          numpy=False, timestamps=False, blocking=False,
+                          overflow_policy=OverflowDropNewest, overrun_callback=None,
+                          exact_blocks=False, hop_size=None, convert=False,
+                          resample_quality=None, channel_map=None,
+                          buffer_duration=None, sink=None, segment_duration=None,
+                          segment_bytes=None, segment_callback=None, history=None):
+        """
+        Creates and starts an additional input stream, which runs
+        alongside the stream from start_input_stream and any other
+        open streams. Each stream has its own ring buffer and
+        processing thread.
+
+        With timestamps enabled the read callback is also passed
+        the index of the first frame in the block, counted from the
+        start of the stream, and the time in seconds at which it was
+        captured. Every stream is timed from the same monotonic clock,
+        see monotonic_time, so blocks from different devices can be aligned.
 
-        if device_id is not None:
-            self.input['device'] = self.get_input_device(device_id)
-        else:
-            self.input['device'] = self.get_default_input_device()
+        Parameters
+        ----------
+        Same as start_input_stream
 
-        pydevice = _ctypes.cast(self.input['device'], _ctypes.POINTER(SoundIoDevice))
-        LOGGER.info('Input Device: %s' % pydevice.contents.name.decode())
-        self.sort_channel_layouts(self.input['device'])
+        Returns
+        -------
+        (dict) stream handle, pass to close_input_stream when finished
+
+        Raises
+        ------
+        PySoundIoError if any invalid parameters are used
+
+        Notes
+        -----
+        Recording from two devices on one timeline
+
+        .. code-block:: python
+            :linenos:
+
+            def read_callback(data, length, frame, timestamp):
+                print('block %d captured at %.6f' % (frame, timestamp))
+
+            first = pysoundio.open_input_stream(device_id=0, timestamps=True,
+                                                read_callback=read_callback)
+            second = pysoundio.open_input_stream(device_id=1, timestamps=True,
+                                                 read_callback=read_callback)
+        """
+        stream = {'device': None, 'stream': None, 'buffer': None,
+                  'read_callback': None, 'dispatcher': None}
+        self.input_streams.append(stream)
+        try:
+            self._setup_input_stream(stream, device_id, sample_rate, dtype, block_size,
+                                     channels, read_callback, overflow_callback, numpy, timestamps,
+                                     blocking=blocking, overflow_policy=overflow_policy,
+                                     overrun_callback=overrun_callback,
+                                     exact_blocks=exact_blocks, hop_size=hop_size,
+                                     convert=convert, resample_quality=resample_quality,
+                                     channel_map=channel_map, buffer_duration=buffer_duration,
+                                     sink=sink, segment_duration=segment_duration,
+                                     segment_bytes=segment_bytes,
+                                     segment_callback=segment_callback, history=history)
+        except Exception:
+            # Release whatever was set up before the failure
+            self.close_input_stream(stream)
+            raise
+        return stream
+
+    def close_input_stream(self, stream):
+        """
+        Stop and clean up an input stream from open_input_stream
+
+        Parameters
+        ----------
+        stream: (dict) stream handle
+        """
+        self._stop_dispatcher(stream)
+        if stream.get('stream'):
+            soundio.instream_destroy(stream['stream'])
+            stream['stream'] = None
+        if stream.get('buffer'):
+            soundio.ring_buffer_destroy(stream['buffer'])
+            stream['buffer'] = None
+        if stream.get('device'):
+            soundio.device_unref(stream['device'])
+            stream['device'] = None
+        if stream in self.input_streams:
+            self.input_streams.remove(stream)
+
+    def get_input_gaps(self, stream=None):
+        """
+        Returns the runs of silence inserted into an input stream since
+        the last call, for lost frames under OverflowGap, and for holes
+        reported by the device.
+
+        Parameters
+        ----------
+        stream: (dict) handle from open_input_stream, defaults
+                       to the stream from start_input_stream (optional)
 
-        if self.input['sample_rate']:
-            if not self.supports_sample_rate(self.input['device'], self.input['sample_rate']):
-                raise PySoundIoError('Invalid sample rate: %d' % self.input['sample_rate'])
+        Returns
+        -------
+        (list) of (frame, length) tuples, frame is the index of the
+        first silent frame from the start of the stream
+        """
+        stream = self.input if stream is None else stream
+        return soundio.instream_get_gaps(stream['stream'])
+
+    def get_stream_stats(self, stream=None):
+        """
+        Returns counters for the running streams, cheap enough
+        to poll while streaming
+
+        Parameters
+        ----------
+        stream: (dict) handle from open_input_stream, to return
+                       only the counters of that stream (optional)
+
+        Returns
+        -------
+        (dict) with input and output entries, and an inputs list with
+        an entry for each stream from open_input_stream, or the
+        entry for stream if it is set. Input entries have the counts of
+        overflows, frames_dropped, holes, silence_frames and errors,
+        output has the counts of underflows, silence_frames and errors.
+        Both have the callbacks fired, frames_transferred through the
+        ring buffer, its high_water fill in bytes, the min, max and mean
+        callback_time in seconds, events_lost by the dispatcher, the ring
+        buffer_duration in seconds, and the dispatcher statistics if a
+        dispatcher is running. The dispatcher statistics include the
+        deadline_misses of the read or write callback, a
+        callback_load_histogram of its time over the deadline, counting
+        loads up to 0.25, 0.5, 0.75, 1 and 2, and over 2, and the
+        callback_errors raised by the callbacks, which are logged.
+        """
+        if stream is not None:
+            return self._input_stats(stream)
+        stats = {}
+        if self.input.get('stream'):
+            stats['input'] = self._input_stats(self.input)
+        if self.input_streams:
+            stats['inputs'] = [self._input_stats(s) for s in self.input_streams
+                               if s.get('stream')]
+        if self.output.get('stream'):
+            stats['output'] = soundio.outstream_get_stats(self.output['stream'])
+            stats['output']['buffer_duration'] = self.output.get('buffer_duration')
+            if self.output.get('dispatcher'):
+                stats['output']['dispatcher'] = self.output['dispatcher'].get_stats()
+        return stats
+
+    def _input_stats(self, stream):
+        """
+        Returns the counters of one input stream
+        """
+        stats = soundio.instream_get_stats(stream['stream'])
+        stats['buffer_duration'] = stream.get('buffer_duration')
+        if stream.get('dispatcher'):
+            stats['dispatcher'] = stream['dispatcher'].get_stats()
+        return stats
+
+    def monotonic_time(self):
+        """
+        Returns the current time in seconds on the clock used
+        for input stream timestamps
+        """
+        return soundio.monotonic_time()
+
+    def read(self, frames, timeout=None, stream=None):
+        """
+        Read frames from an input stream started with blocking=True,
+        waiting until they have been captured. The calling thread
+        sleeps, without holding the GIL, until the C read callback
+        has written enough data.
+
+        Parameters
+        ----------
+        frames: (int) number of frames to read
+        timeout: (float) seconds to wait, or None to wait forever (optional)
+        stream: (dict) handle from open_input_stream, defaults
+                       to the stream from start_input_stream (optional)
+
+        Returns
+        -------
+        (bytes) the frames read, or a numpy array of shape (frames, channels)
+        if the stream was started in numpy mode
+
+        Raises
+        ------
+        PySoundIoError if the timeout expires, no data is removed
+        """
+        stream = self.input if stream is None else stream
+        size = frames * stream['bytes_per_frame']
+        if size > soundio.ring_buffer_capacity(stream['buffer']):
+            raise PySoundIoError('Read is larger than the ring buffer')
+
+        available = soundio.instream_wait(stream['stream'], size,
+                                          -1.0 if timeout is None else timeout)
+        if available < size:
+            raise PySoundIoError('Read timed out')
+
+        view, position = soundio.instream_read_begin(stream['stream'], size)
+        if stream.get('dtype') is not None:
+            data = _np.frombuffer(view, stream['dtype']).reshape(-1, stream['channels']).copy()
         else:
-            self.input['sample_rate'] = self.get_default_sample_rate(self.input['device'])
+            data = bytes(view)
+        soundio.instream_read_end(stream['stream'], position + size)
+        return data
+
+    def _setup_input_stream(self, stream, device_id, sample_rate, dtype, block_size,
+                            channels, read_callback, overflow_callback, numpy, timestamps,
+                            passthrough=None, gain=1.0, blocking=False,
+                            overflow_policy=OverflowDropNewest, overrun_callback=None,
+                            exact_blocks=False, hop_size=None, convert=False,
+                            resample_quality=None, channel_map=None,
+                            buffer_duration=None, sink=None, segment_duration=None,
+                            segment_bytes=None, segment_callback=None, history=None):
+        """
+        Configures, opens and starts an input stream described by stream
+        """
+        stream['sample_rate'] = sample_rate
+        stream['device_sample_rate'] = sample_rate
+        stream['format'] = dtype
+        stream['block_size'] = block_size
+        stream['channels'] = channels
+        stream['layout'] = None
+        stream['read_callback'] = read_callback
+        stream['overflow_callback'] = overflow_callback
+        stream['overrun_callback'] = overrun_callback
+        stream['dtype'] = None
+        stream['timestamps'] = timestamps
+        stream['exact_blocks'] = bool(exact_blocks or hop_size)
+        stream['hop_size'] = hop_size or block_size
+
+        if stream['exact_blocks']:
+            if not block_size:
+                raise PySoundIoError('Exact blocks need a block size')
+            if not 0 < stream['hop_size'] <= block_size:
+                raise PySoundIoError('Invalid hop size: %d' % stream['hop_size'])
+
+        if sink is not None and (read_callback or blocking or numpy or stream['exact_blocks']):
+            raise PySoundIoError('A sink cannot be used with a read callback, '
+                                 'blocking reads, numpy or exact blocks')
+        segmented = segment_duration is not None or segment_bytes is not None
+        if segmented and (sink is None or hasattr(sink, 'write')):
+            raise PySoundIoError('Segments need a sink path')
+        if history is not None:
+            if read_callback or blocking or sink is not None or stream['exact_blocks']:
+                raise PySoundIoError('A history cannot be used with a read callback, '
+                                     'blocking reads, a sink or exact blocks')
+            if history <= 0:
+                raise PySoundIoError('Invalid history: %s' % history)
+
+        if device_id is None:
+            device_id = soundio.default_input_device_index(self._soundio)
+        stream['device'] = self._get_input_device(device_id)
+
+        pydevice = _ctypes.cast(stream['device'], _ctypes.POINTER(SoundIoDevice))
+        LOGGER.info('Input Device: %s' % pydevice.contents.name.decode())
+        self.sort_channel_layouts(stream['device'])
+
+        if channel_map is not None:
+            if channels is not None and channels != len(channel_map):
+                raise PySoundIoError('Channel map needs an entry per channel')
+            stream['channels'] = channels = len(channel_map)
+            stream['layout'], matrix = self.get_channel_matrix(stream['device'], channel_map)
+            convert = True
+
+        if stream['sample_rate']:
+            if not self.supports_sample_rate(stream['device'], stream['sample_rate']):
+                if resample_quality is None:
+                    raise PySoundIoError('Invalid sample rate: %d' % stream['sample_rate'])
+                stream['device_sample_rate'] = self.get_default_sample_rate(stream['device'])
+                convert = True
+        else:
+            stream['sample_rate'] = self.get_default_sample_rate(stream['device'])
+            stream['device_sample_rate'] = stream['sample_rate']
 
-        if self.input['format']:
-            if not self.supports_format(self.input['device'], self.input['format']):
+        if stream['format']:
+            if not self.supports_format(stream['device'], stream['format']):
                 raise PySoundIoError('Invalid format: %s interleaved' %
-                                     (soundio.format_string(self.input['format'])))
+                                     (soundio.format_string(stream['format'])))
         else:
-            self.input['format'] = self.get_default_format(self.input['device'])
-
-        self._create_input_stream()
-        self._open_input_stream()
-        pystream = _ctypes.cast(self.input['stream'], _ctypes.POINTER(SoundIoInStream))
-        self.input['bytes_per_frame'] = self.get_bytes_per_frame(self.input['format'], channels)
-        capacity = (DEFAULT_RING_BUFFER_DURATION *
-                    pystream.contents.sample_rate * self.input['bytes_per_frame'])
-        self._create_input_ring_buffer(capacity)
-        self._start_input_stream()
+            stream['format'] = self.get_default_format(stream['device'])
+        stream['sample_format'] = SoundIoFormatFloat32NE if convert else stream['format']
+        if numpy:
+            stream['dtype'] = self.get_numpy_dtype(stream['sample_format'])
+        if sink is not None and stream['sample_format'] not in WAV_FORMATS:
+            raise PySoundIoError('Invalid format for a WAV sink: %s' %
+                                 (soundio.format_string(stream['sample_format'])))
+
+        self._create_input_stream(stream)
+        self._open_input_stream(stream)
+        pystream = _ctypes.cast(stream['stream'], _ctypes.POINTER(SoundIoInStream))
+        soundio.instream_set_convert(stream['stream'], convert)
+        if stream['layout']:
+            soundio.instream_set_channel_matrix(stream['stream'], matrix)
+        if stream['device_sample_rate'] != stream['sample_rate']:
+            soundio.instream_set_resampler(stream['stream'], stream['sample_rate'], resample_quality)
+        stream['bytes_per_frame'] = self.get_bytes_per_frame(stream['sample_format'], channels)
+        stream['period'] = pystream.contents.software_latency
+        stream['buffer_duration'] = self._get_buffer_duration(
+            buffer_duration, stream['period'], stream['block_size'], stream['sample_rate'])
+        stream['history_bytes'] = 0
+        if history is not None:
+            stream['history_bytes'] = int(history * stream['sample_rate']) * stream['bytes_per_frame']
+        capacity = (int(stream['buffer_duration'] * stream['sample_rate']) *
+                    stream['bytes_per_frame']) + stream['history_bytes']
+        self._create_input_ring_buffer(capacity, stream)
+        soundio.instream_set_overflow_policy(stream['stream'], overflow_policy)
+        if stream['exact_blocks']:
+            soundio.instream_set_block_bytes(stream['stream'], block_size * stream['bytes_per_frame'])
+        stream['passthrough'] = passthrough
+        if passthrough:
+            soundio.instream_set_passthrough(stream['stream'], passthrough, gain)
+        if history is not None:
+            soundio.instream_set_history(stream['stream'], stream['history_bytes'])
+        elif sink is not None:
+            self._start_sink(stream, sink, segment_duration, segment_bytes, segment_callback)
+        elif not blocking:
+            stream['dispatcher'] = _InputProcessingThread(parent=self, stream=stream)
+            stream['dispatcher'].start()
+        self._start_input_stream(stream)
         self.flush()
 
+    def _start_sink(self, stream, sink, segment_duration, segment_bytes, segment_callback):
+        """
+        Starts a dispatcher writing an input stream to a WAV sink, or to
+        segments if segment_duration or segment_bytes is set. It is only
+        woken once a chunk of the space left beside the history is buffered.
+        """
+        headroom = soundio.ring_buffer_capacity(stream['buffer']) - stream['history_bytes']
+        chunk = min(int(SINK_CHUNK_DURATION * stream['sample_rate']),
+                    headroom // stream['bytes_per_frame'] // 2)
+        soundio.instream_set_block_bytes(stream['stream'], chunk * stream['bytes_per_frame'])
+        if segment_duration is not None or segment_bytes is not None:
+            sink = self._create_segmented_sink(stream, sink, segment_duration,
+                                               segment_bytes, segment_callback)
+        else:
+            sink = WavSink(sink, stream['sample_rate'], stream['channels'], stream['sample_format'])
+        stream['dispatcher'] = _SinkProcessingThread(parent=self, stream=stream, sink=sink)
+        stream['dispatcher'].start()
+
+    def snapshot(self, seconds=None, stream=None):
+        """
+        Copy the newest audio from an input stream started with a history,
+        the stream keeps running and the history is left in place
+
+        Parameters
+        ----------
+        seconds: (float) seconds of audio to copy, up to the whole
+                         history, defaults to all of it (optional)
+        stream: (dict) handle from open_input_stream, defaults
+                       to the stream from start_input_stream (optional)
+
+        Returns
+        -------
+        (bytes) the frames copied, or a numpy array of shape (frames, channels)
+        if the stream was started in numpy mode
+
+        Raises
+        ------
+        PySoundIoError if the stream has no history
+        """
+        stream = self.input if stream is None else stream
+        if not stream.get('history_bytes'):
+            raise PySoundIoError('Stream has no history')
+        size = stream['history_bytes']
+        if seconds is not None:
+            size = min(size, int(seconds * stream['sample_rate']) * stream['bytes_per_frame'])
+        data, _ = soundio.instream_snapshot(stream['stream'], size)
+        if stream.get('dtype') is not None:
+            return _np.frombuffer(data, stream['dtype']).reshape(-1, stream['channels'])
+        return data
+
+    def read_range(self, t0, t1, stream=None):
+        """
+        Get a copy of the audio captured between two times from an
+        input stream started with a history. Times are mapped to frames
+        by interpolating between the frame and time recorded after each
+        read callback, for all of the audio the ring buffer holds, so
+        frames lost to overflows do not shift older audio, and the cost
+        does not depend on the length of the history.
+
+        Parameters
+        ----------
+        t0: (float) capture time of the first frame, see monotonic_time
+        t1: (float) capture time after the last frame
+        stream: (dict) handle from open_input_stream, defaults
+                       to the stream from start_input_stream (optional)
+
+        Returns
+        -------
+        (tuple) data and the capture time of its first frame. data is
+        bytes, or a numpy array of shape (frames, channels) if the stream
+        was started in numpy mode, clipped to the audio held
+
+        Raises
+        ------
+        PySoundIoError if the stream has no history
+        """
+        stream = self.input if stream is None else stream
+        if not stream.get('history_bytes'):
+            raise PySoundIoError('Stream has no history')
+        rate = stream['sample_rate']
+        first = soundio.instream_frame_at(stream['stream'], t0, rate)
+        last = soundio.instream_frame_at(stream['stream'], t1, rate)
+        data, position = soundio.instream_read_range(
+            stream['stream'], first * stream['bytes_per_frame'], last * stream['bytes_per_frame'])
+        frame = position // stream['bytes_per_frame']
+        if stream.get('dtype') is not None:
+            data = _np.frombuffer(data, stream['dtype']).reshape(-1, stream['channels'])
+        return data, soundio.instream_time_at(stream['stream'], frame, rate)
+
+    def start_recording(self, sink, preroll=None, stream=None, segment_duration=None,
+                        segment_bytes=None, segment_callback=None):
+        """
+        Start writing an input stream started with a history to a sink,
+        beginning with audio already captured. The sink is read straight
+        from the ring buffer, the history is not copied.
+
+        Parameters
+        ----------
+        sink: (str or file) path or seekable binary file, as start_input_stream
+        preroll: (float) seconds of the history to begin with, defaults to
+                         all of it (optional)
+        stream: (dict) handle from open_input_stream, defaults
+                       to the stream from start_input_stream (optional)
+        segment_duration: (float) as start_input_stream (optional)
+        segment_bytes: (int) as start_input_stream (optional)
+        segment_callback: (fn) as start_input_stream (optional)
+
+        Raises
+        ------
+        PySoundIoError if the stream has no history, or is already recording
+        """
+        stream = self.input if stream is None else stream
+        if not stream.get('history_bytes'):
+            raise PySoundIoError('Stream has no history')
+        if stream.get('dispatcher'):
+            raise PySoundIoError('Stream is already recording')
+        if (segment_duration is not None or segment_bytes is not None) and hasattr(sink, 'write'):
+            raise PySoundIoError('Segments need a sink path')
+        if stream['sample_format'] not in WAV_FORMATS:
+            raise PySoundIoError('Invalid format for a WAV sink: %s' %
+                                 (soundio.format_string(stream['sample_format'])))
+
+        # Stop trimming the history, then drop all but the preroll
+        soundio.instream_set_history(stream['stream'], 0)
+        view, position = soundio.instream_read_begin(stream['stream'])
+        keep = len(view)
+        if preroll is not None:
+            keep = min(keep, int(preroll * stream['sample_rate']) * stream['bytes_per_frame'])
+        soundio.instream_read_end(stream['stream'], position + len(view) - keep)
+        try:
+            self._start_sink(stream, sink, segment_duration, segment_bytes, segment_callback)
+        except Exception:
+            soundio.instream_set_history(stream['stream'], stream['history_bytes'])
+            raise
+
+    def stop_recording(self, stream=None):
+        """
+        Finish the recording started with start_recording, and
+        go back to keeping a history
+
+        Parameters
+        ----------
+        stream: (dict) handle from open_input_stream, defaults
+                       to the stream from start_input_stream (optional)
+        """
+        stream = self.input if stream is None else stream
+        self._stop_dispatcher(stream)
+        soundio.instream_set_block_bytes(stream['stream'], 0)
+        soundio.instream_set_history(stream['stream'], stream['history_bytes'])
+
+    def _create_segmented_sink(self, stream, path, segment_duration, segment_bytes,
+                               segment_callback):
+        """
+        Creates a sink which starts a new WAV file every segment,
+        the shorter of segment_duration and segment_bytes
+        """
+        limits = []
+        if segment_duration is not None:
+            limits.append(int(segment_duration * stream['sample_rate']))
+        if segment_bytes is not None:
+            limits.append(segment_bytes // stream['bytes_per_frame'])
+        try:
+            return SegmentedWavSink(path, stream['sample_rate'], stream['channels'],
+                                    stream['sample_format'], min(limits), segment_callback)
+        except ValueError as e:
+            raise PySoundIoError(str(e))
+
+    def _get_buffer_duration(self, buffer_duration, period, block_size, sample_rate):
+        """
+        Seconds of audio to allocate for a stream ring buffer. The auto
+        policy allows for a software latency period, a block, and the worst
+        consumer jitter seen by any dispatcher of this instance, with headroom.
+        """
+        if buffer_duration is None:
+            return DEFAULT_RING_BUFFER_DURATION
+        if buffer_duration != 'auto':
+            if buffer_duration <= 0:
+                raise PySoundIoError('Invalid buffer duration: %s' % buffer_duration)
+            return buffer_duration
+
+        for stream in [self.input, self.output] + self.input_streams:
+            if stream.get('dispatcher'):
+                self._consumer_jitter = max(self._consumer_jitter, stream['dispatcher'].get_jitter())
+        block = float(block_size or 0) / sample_rate
+        duration = AUTO_RING_BUFFER_HEADROOM * (period + block + self._consumer_jitter)
+        return max(duration, AUTO_RING_BUFFER_MIN_DURATION)
+
+    def _stop_dispatcher(self, stream):
+        """
+        Stop the dispatcher of a stream, keeping the worst consumer
+        jitter it saw to size later auto ring buffers
+        """
+        dispatcher = stream.get('dispatcher')
+        if dispatcher:
+            dispatcher.stop()
+            self._consumer_jitter = max(self._consumer_jitter, dispatcher.get_jitter())
+        stream['dispatcher'] = None
+
     def _create_output_stream(self):
         """
         Allocates memory and sets defaults for output stream
@@ -653,15 +1663,16 @@ class PySoundIo(object):
         self.output['stream'] = soundio.outstream_create(self.output['device'])
 
         pystream = _ctypes.cast(self.output['stream'], _ctypes.POINTER(SoundIoOutStream))
-        if not self.testing:
-            soundio.set_write_callbacks(self._write_callback, self._underflow_callback)
 
-        layout = self._get_default_layout(self.output['channels'])
-        pylayout = _ctypes.cast(layout, _ctypes.POINTER(SoundIoChannelLayout))
-        pystream.contents.layout = pylayout.contents
+        if self.output.get('layout'):
+            pystream.contents.layout = self.output['layout']
+        else:
+            layout = self._get_default_layout(self.output['channels'])
+            pylayout = _ctypes.cast(layout, _ctypes.POINTER(SoundIoChannelLayout))
+            pystream.contents.layout = pylayout.contents
 
         pystream.contents.format = self.output['format']
-        pystream.contents.sample_rate = self.output['sample_rate']
+        pystream.contents.sample_rate = self.output.get('device_sample_rate') or self.output['sample_rate']
         if self.output['block_size']:
             pystream.contents.software_latency = float(self.output['block_size']) / self.output['sample_rate']
 
@@ -671,15 +1682,15 @@ class PySoundIo(object):
         """
         Open an output stream.
         """
-        soundio.outstream_open()
+        soundio.outstream_open(self.output['stream'])
         pystream = _ctypes.cast(self.output['stream'], _ctypes.POINTER(SoundIoOutStream))
-        self.output['block_size'] = int(pystream.contents.software_latency / self.output['sample_rate'])
+        self.output['block_size'] = int(pystream.contents.software_latency * self.output['sample_rate'])
 
     def _start_output_stream(self):
         """
         Start an output stream running.
         """
-        soundio.outstream_start()
+        soundio.outstream_start(self.output['stream'])
 
     def pause_output_stream(self, pause):
         """
@@ -689,21 +1700,7 @@ class PySoundIo(object):
         ----------
         pause: (bool) True to pause, False to unpause
         """
-        soundio.outstream_pause(pause)
-
-    def _write_callback(self, size):
-        """
-        Internal write callback.
-        """
-        _OutputProcessingThread(parent=self, block_size=size).start()
-
-    def _underflow_callback(self):
-        """
-        Internal underflow callback, which calls the external
-        underflow callback if defined.
-        """
-        if self.output['underflow_callback']:
-            self.output['underflow_callback']()
+        soundio.outstream_pause(self.output['stream'], pause)
 
     def _clear_output_buffer(self):
         """
@@ -721,7 +1718,7 @@ class PySoundIo(object):
         ----------
         out_latency: (float) output latency in seconds
         """
-        return soundio.outstream_get_latency(out_latency)
+        return soundio.outstream_get_latency(self.output['stream'], out_latency)
 
     def set_output_volume(self, volume):
         """
@@ -732,21 +1729,85 @@ class PySoundIo(object):
         volume: (float) output volume from 0 - 1.0
         """
         if self.version >= '2.0.0':
-            return soundio.outstream_set_volume(volume)
+            return soundio.outstream_set_volume(self.output['stream'], volume)
         else:
             raise NotImplementedError('Not implemented in < 2.0.0')
 
+    def write(self, data, timeout=None):
+        """
+        Write data to an output stream started without a write callback,
+        waiting while the ring buffer is full. The calling thread
+        sleeps, without holding the GIL, until the C write callback
+        has played enough data to make room.
+
+        Parameters
+        ----------
+        data: (bytes) interleaved frames, any object supporting the buffer
+                      protocol, such as a numpy array, can be used
+        timeout: (float) seconds to wait, or None to wait forever (optional)
+
+        Raises
+        ------
+        PySoundIoError if the timeout expires, data written
+        before then is still played
+        """
+        view = self._frames_view(data)
+        size = len(view)
+        chunk = soundio.ring_buffer_capacity(self.output['buffer']) // 2
+        chunk -= chunk % self.output['bytes_per_frame']
+        deadline = None if timeout is None else _clock() + timeout
+        offset = 0
+        while offset < size:
+            remaining = -1.0 if deadline is None else max(deadline - _clock(), 0.0)
+            soundio.outstream_wait(self.output['stream'], min(size - offset, chunk), remaining)
+            written = self._write_available(view, offset)
+            if written == offset and deadline is not None and _clock() >= deadline:
+                raise PySoundIoError('Write timed out')
+            offset = written
+
+    def _frames_view(self, data):
+        """
+        Returns a flat byte memoryview of data, which must be
+        a whole number of output frames
+        """
+        view = memoryview(data)
+        if view.ndim != 1 or view.itemsize != 1:
+            if hasattr(view, 'cast'):
+                view = view.cast('B')
+            else:
+                # Python 2 memoryviews cannot be cast, copy to bytes instead
+                view = memoryview(view.tobytes())
+        if len(view) % self.output['bytes_per_frame']:
+            raise PySoundIoError('Data is not a whole number of frames')
+        return view
+
+    def _write_available(self, view, offset):
+        """
+        Copies as much of view from offset as fits in the output
+        ring buffer, and returns the offset of the remaining data
+        """
+        free = soundio.ring_buffer_free_count(self.output['buffer'])
+        length = min(free - free % self.output['bytes_per_frame'], len(view) - offset)
+        if length:
+            buf = soundio.ring_buffer_write_view(self.output['buffer'], length)
+            buf[:] = view[offset:offset + length]
+            soundio.ring_buffer_advance_write_ptr(self.output['buffer'], length)
+        return offset + length
+
     def start_output_stream(self, device_id=None,
                             sample_rate=None, dtype=None,
                             block_size=None, channels=None,
-                            write_callback=None, underflow_callback=None):
+                            write_callback=None, underflow_callback=None,
+                            numpy=False, overrun_callback=None, exact_blocks=False,
+                            convert=False, resample_quality=None, channel_map=None,
+                            buffer_duration=None, source=None, blocking=False):
         """
         Creates output stream, and sets parameters. Then allocates
         a ring buffer and starts the stream.
 
-        The write callback is called in an audio processing thread,
-        when a block of data should be passed to the speakers. Data is
-        added to the ring buffer to process.
+        The write callback is called in a single, long lived audio
+        processing thread, when a block of data should be passed to the
+        speakers. Data is added to the ring buffer to process.
 
         Parameters
         ----------
@@ -756,8 +1817,47 @@ class PySoundIo(object):
         block_size: (int) desired block size (optional)
         channels: (int) number of channels [1: mono, 2: stereo] (optional)
         write_callback: (fn) function to call with data, the function must have
-                        the arguments data and length.
+                        the arguments data and length. data is a writable
+                        memoryview into the ring buffer, filled with silence,
+                        which can be written in place. Leave unset to
+                        pass data with write instead.
         underflow_callback: (fn) function to call if data is not being written fast enough
+        numpy: (bool) pass data to the write callback as a writable numpy array
+                      of shape (frames, channels), without copying (optional)
+        overrun_callback: (fn) function to call with the arguments elapsed and
+                               deadline, in seconds, when the write callback takes
+                               longer than the block it fills (optional)
+        exact_blocks: (bool) pass exactly block_size frames to every write
+                             callback, rather than the size of the device
+                             period, requires block_size (optional)
+        convert: (bool) convert native float32 samples to the device format,
+                        dtype or the default format, in C, so the write
+                        callback and write always use float32 samples (optional)
+        resample_quality: (ResampleQuality) if the device does not support
+                                            sample_rate, open it at its default rate
+                                            and resample in C, with this quality,
+                                            implies convert (optional)
+        channel_map: (list) one entry per channel, the device channel to play
+                            it on as a SoundIoChannelId or name, or a dict of
+                            device channels to gains to fan it out. The device
+                            is opened with the smallest layout that has every
+                            channel, and mixed in C, implies convert (optional)
+        buffer_duration: (float) seconds of audio held by the ring buffer, or 'auto'
+                                 to size it from the software latency, the block
+                                 size and the consumer jitter observed so far,
+                                 defaults to 30 seconds, or 2 seconds of
+                                 read-ahead with a source (optional)
+        source: (str or file) path or seekable binary WAV or RF64 file to play,
+                              instead of calling a write callback. The file is
+                              streamed through the ring buffer, which the
+                              processing thread tops up each time half of it
+                              has played, so memory use does not depend on
+                              the length of the file. The sample rate, channels
+                              and format default to those of the file, see
+                              wait_for_playback (optional)
+        blocking: (bool) no write callback or processing thread is used,
+                         instead data is passed with write, and underflows
+                         are only counted in get_stream_stats (optional)
 
         Raises
         ------
@@ -776,6 +1876,14 @@ class PySoundIo(object):
                     outdata = 1.0
                 data[:] = outdata.tostring()
 
+        An example write callback with numpy=True
+
+        .. code-block:: python
+            :linenos:
+
+            def write_callback(data, length):
+                data[:] = np.sin(phase + np.arange(length) * step)[:, None]
+
         Underflow callback example
 
         .. code-block:: python
@@ -785,11 +1893,44 @@ class PySoundIo(object):
                 print('buffer underflow')
         """
         self.output['sample_rate'] = sample_rate
+        self.output['device_sample_rate'] = sample_rate
         self.output['format'] = dtype
         self.output['block_size'] = block_size
         self.output['channels'] = channels
+        self.output['layout'] = None
         self.output['write_callback'] = write_callback
         self.output['underflow_callback'] = underflow_callback
+        self.output['overrun_callback'] = overrun_callback
+        self.output['exact_blocks'] = exact_blocks
+        self.output['dtype'] = None
+
+        if exact_blocks and not block_size:
+            raise PySoundIoError('Exact blocks need a block size')
+        if blocking and (write_callback or underflow_callback or numpy or exact_blocks or
+                         source is not None):
+            raise PySoundIoError('Blocking writes cannot be used with callbacks, '
+                                 'numpy, exact blocks or a source')
+
+        if source is not None:
+            if write_callback or numpy or exact_blocks:
+                raise PySoundIoError('A source cannot be used with a write callback, '
+                                     'numpy or exact blocks')
+            try:
+                source = WavSource(source)
+            except ValueError as e:
+                raise PySoundIoError(str(e))
+            if channel_map is not None:
+                channels = len(channel_map)
+            if channels is not None and channels != source.channels:
+                source.close()
+                raise PySoundIoError('Source has %d channels' % source.channels)
+            self.output['sample_rate'] = self.output['device_sample_rate'] = sample_rate = (
+                sample_rate or source.sample_rate)
+            self.output['channels'] = channels = source.channels
+            if not self.output['format'] and not convert:
+                self.output['format'] = source.sample_format
+            if buffer_duration is None:
+                buffer_duration = SOURCE_LOOKAHEAD_DURATION
 
         if device_id is not None:
             self.output['device'] = self.get_output_device(device_id)
@@ -800,11 +1941,22 @@ class PySoundIo(object):
         LOGGER.info('Input Device: %s' % pydevice.contents.name.decode())
         self.sort_channel_layouts(self.output['device'])
 
+        if channel_map is not None:
+            if channels is not None and channels != len(channel_map):
+                raise PySoundIoError('Channel map needs an entry per channel')
+            self.output['channels'] = channels = len(channel_map)
+            self.output['layout'], matrix = self.get_channel_matrix(self.output['device'], channel_map)
+            convert = True
+
         if self.output['sample_rate']:
             if not self.supports_sample_rate(self.output['device'], self.output['sample_rate']):
-                raise PySoundIoError('Invalid sample rate: %d' % self.output['sample_rate'])
+                if resample_quality is None:
+                    raise PySoundIoError('Invalid sample rate: %d' % self.output['sample_rate'])
+                self.output['device_sample_rate'] = self.get_default_sample_rate(self.output['device'])
+                convert = True
         else:
             self.output['sample_rate'] = self.get_default_sample_rate(self.output['device'])
+            self.output['device_sample_rate'] = self.output['sample_rate']
 
         if self.output['format']:
             if not self.supports_format(self.output['device'], self.output['format']):
@@ -812,14 +1964,138 @@ class PySoundIo(object):
                                      (soundio.format_string(self.output['format'])))
         else:
             self.output['format'] = self.get_default_format(self.output['device'])
+        self.output['sample_format'] = SoundIoFormatFloat32NE if convert else self.output['format']
+        if numpy:
+            self.output['dtype'] = self.get_numpy_dtype(self.output['sample_format'])
+        if source is not None and (self.output['sample_format'] != source.sample_format or
+                                   self.output['sample_rate'] != source.sample_rate):
+            source.close()
+            raise PySoundIoError('Source is %s at %d Hz' %
+                                 (soundio.format_string(source.sample_format), source.sample_rate))
 
         self._create_output_stream()
         self._open_output_stream()
         pystream = _ctypes.cast(self.output['stream'], _ctypes.POINTER(SoundIoOutStream))
-        self.output['bytes_per_frame'] = self.get_bytes_per_frame(self.output['format'], channels)
-        capacity = (DEFAULT_RING_BUFFER_DURATION *
-                    pystream.contents.sample_rate * self.output['bytes_per_frame'])
+        soundio.outstream_set_convert(self.output['stream'], convert)
+        if self.output['layout']:
+            soundio.outstream_set_channel_matrix(self.output['stream'], matrix)
+        if self.output['device_sample_rate'] != self.output['sample_rate']:
+            soundio.outstream_set_resampler(self.output['stream'], self.output['sample_rate'], resample_quality)
+        self.output['bytes_per_frame'] = self.get_bytes_per_frame(self.output['sample_format'], channels)
+        self.output['period'] = pystream.contents.software_latency
+        if exact_blocks:
+            self.output['block_size'] = block_size
+        self.output['buffer_duration'] = self._get_buffer_duration(
+            buffer_duration, self.output['period'], block_size, self.output['sample_rate'])
+        capacity = (int(self.output['buffer_duration'] * self.output['sample_rate']) *
+                    self.output['bytes_per_frame'])
         self._create_output_ring_buffer(capacity)
         self._clear_output_buffer()
+        if source is not None:
+            capacity = soundio.ring_buffer_capacity(self.output['buffer'])
+            refill = capacity // 2 - capacity // 2 % self.output['bytes_per_frame']
+            soundio.outstream_set_refill_bytes(self.output['stream'], refill)
+            self.output['dispatcher'] = _SourceProcessingThread(
+                parent=self, source=source, block_size=self.output['block_size'])
+            self.output['dispatcher'].process()
+            self.output['dispatcher'].start()
+        elif not blocking:
+            self.output['dispatcher'] = _OutputProcessingThread(
+                parent=self, block_size=self.output['block_size'])
+            self.output['dispatcher'].start()
         self._start_output_stream()
         self.flush()
+
+    def wait_for_playback(self, timeout=None):
+        """
+        Wait until an output stream started with a source has played
+        the whole file
+
+        Parameters
+        ----------
+        timeout: (float) seconds to wait, or None to wait forever (optional)
+
+        Returns
+        -------
+        (bool) True once the source has played, False if the timeout expired
+
+        Raises
+        ------
+        PySoundIoError if the output stream is not playing a source
+        """
+        dispatcher = self.output.get('dispatcher')
+        if not isinstance(dispatcher, _SourceProcessingThread):
+            raise PySoundIoError('Output stream is not playing a source')
+        return dispatcher.finished.wait(timeout)
+
+    def close_output_stream(self):
+        """
+        Stop and clean up the output stream, leaving any input streams running.
+        A duplex input stream stops monitoring before the output ring buffer
+        it writes to is freed.
+        """
+        if self.input.get('stream') and self.output.get('buffer'):
+            soundio.instream_set_passthrough(self.input['stream'], None)
+        self.input['passthrough'] = None
+        self._stop_dispatcher(self.output)
+        if self.output.get('stream'):
+            soundio.outstream_destroy(self.output['stream'])
+            self.output['stream'] = None
+        if self.output.get('buffer'):
+            soundio.ring_buffer_destroy(self.output['buffer'])
+            self.output['buffer'] = None
+        if self.output.get('device'):
+            soundio.device_unref(self.output['device'])
+            self.output['device'] = None
+
+    def start_duplex_stream(self, input_device_id=None, output_device_id=None,
+                            sample_rate=None, dtype=None,
+                            block_size=None, channels=None,
+                            gain=1.0, read_callback=None, numpy=False):
+        """
+        Starts an output stream, and an input stream that writes captured
+        frames straight into the output ring buffer from the C read callback.
+        Monitoring never waits on Python or the GIL.
+
+        The read callback is an optional tap, it is passed a copy of
+        the captured data by the input processing thread, in the same
+        way as start_input_stream, and cannot delay the output.
+
+        Parameters
+        ----------
+        input_device_id: (int) input device id (optional)
+        output_device_id: (int) output device id (optional)
+        sample_rate: (int) desired sample rate, used by both devices (optional)
+        dtype: (SoundIoFormat) desired format, used by both devices (optional)
+        block_size: (int) desired block size (optional)
+        channels: (int) number of channels [1: mono, 2: stereo] (optional)
+        gain: (float) gain applied to the monitored signal, native endian
+                      float, S16 and S32 formats only (optional)
+        read_callback: (fn) function to call with captured data (optional)
+        numpy: (bool) pass data to the read callback as a numpy array (optional)
+
+        Raises
+        ------
+        PySoundIoError if any invalid parameters are used
+        """
+        self.start_output_stream(device_id=output_device_id, sample_rate=sample_rate,
+                                 dtype=dtype, block_size=block_size, channels=channels)
+        self._setup_input_stream(self.input, input_device_id, self.output['sample_rate'],
+                                 self.output['format'], block_size, channels, read_callback,
+                                 None, numpy, False, passthrough=self.output['buffer'], gain=gain)
+
+    def set_duplex_gain(self, gain):
+        """
+        Change the gain of a running duplex stream
+
+        Parameters
+        ----------
+        gain: (float) gain applied to the monitored signal
+
+        Raises
+        ------
+        PySoundIoError if no duplex stream is running
+        """
+        if not self.input.get('stream') or not self.input.get('passthrough'):
+            raise PySoundIoError('No duplex stream running')
+        soundio.instream_set_passthrough(self.input['stream'], self.input['passthrough'], gain)
@@ -0,0 +1,243 @@
+"""
+sinks.py
+
+File sinks for input streams.
+
+A sink is written by the input dispatcher, which is only woken once
+the ring buffer holds a large chunk of audio, so captured data reaches
+the file in a few big writes rather than one small write per period.
+
+"""
+import struct
+
+from _soundiox import (
+    SoundIoFormatU8, SoundIoFormatS16LE, SoundIoFormatS32LE,
+    SoundIoFormatFloat32LE, SoundIoFormatFloat64LE
+)
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Format tag and bits per sample of the formats a WAV file can hold
+# as they are in the ring buffer. SoundIoFormatFloat32NE is the same
+# value as SoundIoFormatFloat32LE on little endian hosts.
+WAV_FORMATS = {
+    SoundIoFormatU8: (WAVE_FORMAT_PCM, 8),
+    SoundIoFormatS16LE: (WAVE_FORMAT_PCM, 16),
+    SoundIoFormatS32LE: (WAVE_FORMAT_PCM, 32),
+    SoundIoFormatFloat32LE: (WAVE_FORMAT_IEEE_FLOAT, 32),
+    SoundIoFormatFloat64LE: (WAVE_FORMAT_IEEE_FLOAT, 64),
+}
+
+# Largest size a RIFF header can hold, longer files are written as RF64
+_RIFF_LIMIT = 0xFFFFFFFF
+
+# The JUNK chunk reserves room for a ds64 chunk, holding the RIFF
+# size, data size, sample count and an empty chunk size table
+_DS64_SIZE = 28
+_GUID_SUFFIX = b'\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71'
+
+
+class WavSink(object):
+    """
+    Streams interleaved frames to a WAV file, switching the header
+    to RF64 on close if the file grew past 4 GB.
+
+    Parameters
+    ----------
+    file: (str or file) path to create, or a seekable binary file object,
+                        which is left open on close
+    sample_rate: (int) sample rate
+    channels: (int) number of channels
+    sample_format: (SoundIoFormat) format of the frames written,
+                                   see WAV_FORMATS
+
+    Raises
+    ------
+    ValueError if the format cannot be stored in a WAV file
+    """
+
+    def __init__(self, file, sample_rate, channels, sample_format):
+        if sample_format not in WAV_FORMATS:
+            raise ValueError('Format not supported by WAV files')
+        self.format_tag, self.bits = WAV_FORMATS[sample_format]
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_align = channels * self.bits // 8
+        self.data_bytes = 0
+
+        if hasattr(file, 'write'):
+            self.file = file
+            self.owned = False
+        else:
+            self.file = open(file, 'wb')
+            self.owned = True
+        self.start = self.file.tell()
+        self._write_header()
+
+    @property
+    def frames(self):
+        """ Number of frames written """
+        return self.data_bytes // self.block_align
+
+    def _fmt_chunk(self):
+        byte_rate = self.sample_rate * self.block_align
+        if self.channels <= 2 and self.bits <= 16:
+            return struct.pack('<HHIIHH', self.format_tag, self.channels, self.sample_rate,
+                               byte_rate, self.block_align, self.bits)
+        return struct.pack('<HHIIHHHHI', WAVE_FORMAT_EXTENSIBLE, self.channels,
+                           self.sample_rate, byte_rate, self.block_align, self.bits,
+                           22, self.bits, 0) + struct.pack('<I', self.format_tag) + _GUID_SUFFIX
+
+    def _write_header(self):
+        fmt = self._fmt_chunk()
+        self.header = (b'RIFF' + struct.pack('<I', 0) + b'WAVE' +
+                       b'JUNK' + struct.pack('<I', _DS64_SIZE) + b'\x00' * _DS64_SIZE +
+                       b'fmt ' + struct.pack('<I', len(fmt)) + fmt +
+                       b'data' + struct.pack('<I', 0))
+        self.file.write(self.header)
+
+    def write(self, data, length=None, frame=None, timestamp=None):
+        """
+        Append interleaved frames
+
+        Parameters
+        ----------
+        data: (bytes) frames to write, bytes or a memoryview of bytes
+        length: (int) number of frames, unused (optional)
+        frame: (int) stream index of the first frame, unused (optional)
+        timestamp: (float) capture time of the first frame, unused (optional)
+        """
+        self.file.write(data)
+        self.data_bytes += len(data)
+
+    def close(self):
+        """ Write the final sizes into the header, and close the file """
+        if self.file is None:
+            return
+        if self.data_bytes % 2:
+            self.file.write(b'\x00')
+        end = self.file.tell()
+        riff_size = len(self.header) - 8 + self.data_bytes + self.data_bytes % 2
+        data_size_offset = self.start + len(self.header) - 4
+
+        if riff_size <= _RIFF_LIMIT:
+            self.file.seek(self.start + 4)
+            self.file.write(struct.pack('<I', riff_size))
+            self.file.seek(data_size_offset)
+            self.file.write(struct.pack('<I', self.data_bytes))
+        else:
+            self.file.seek(self.start)
+            self.file.write(b'RF64' + struct.pack('<I', 0xFFFFFFFF))
+            self.file.seek(self.start + 12)
+            self.file.write(b'ds64' + struct.pack('<IQQQI', _DS64_SIZE, riff_size,
+                                                  self.data_bytes, self.frames, 0))
+            self.file.seek(data_size_offset)
+            self.file.write(struct.pack('<I', 0xFFFFFFFF))
+        self.file.seek(end)
+        self.file.flush()
+        if self.owned:
+            self.file.close()
+        self.file = None
+
+
+class SegmentedWavSink(object):
+    """
+    Streams interleaved frames to a series of WAV files, starting a
+    new file every segment_frames frames. Files are split at the exact
+    frame, so consecutive segments hold every frame written, and only
+    the open segment is kept in memory.
+
+    Parameters
+    ----------
+    path: (str) path of each segment, formatted with the fields index, the
+                segment number counted from 0, and frame, the stream index
+                of its first frame, such as 'capture-{index:06d}.wav'
+    sample_rate: (int) sample rate
+    channels: (int) number of channels
+    sample_format: (SoundIoFormat) format of the frames written,
+                                   see WAV_FORMATS
+    segment_frames: (int) number of frames in each segment
+    segment_callback: (fn) function to call with the arguments path, frame,
+                           timestamp and frames as each segment is finished.
+                           timestamp is the capture time of its first frame,
+                           or None if it was not passed to write (optional)
+
+    Raises
+    ------
+    ValueError if the format cannot be stored in a WAV file, or if
+    every segment would have the same path
+    """
+
+    def __init__(self, path, sample_rate, channels, sample_format,
+                 segment_frames, segment_callback=None):
+        if sample_format not in WAV_FORMATS:
+            raise ValueError('Format not supported by WAV files')
+        if segment_frames <= 0:
+            raise ValueError('Invalid segment length: %s' % segment_frames)
+        if path.format(index=0, frame=0) == path.format(index=1, frame=1):
+            raise ValueError('Segment path needs an {index} or {frame} field')
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_format = sample_format
+        self.block_align = channels * WAV_FORMATS[sample_format][1] // 8
+        self.segment_frames = segment_frames
+        self.segment_callback = segment_callback
+        self.frames = 0
+        self.frame = 0
+        self.index = 0
+        self.sink = None
+        self.segment = None
+
+    def _start_segment(self, timestamp):
+        path = self.path.format(index=self.index, frame=self.frame)
+        self.sink = WavSink(path, self.sample_rate, self.channels, self.sample_format)
+        self.segment = (path, self.frame, timestamp)
+
+    def _finish_segment(self):
+        self.sink.close()
+        path, frame, timestamp = self.segment
+        if self.segment_callback:
+            self.segment_callback(path=path, frame=frame, timestamp=timestamp,
+                                  frames=self.sink.frames)
+        self.sink = None
+        self.index += 1
+
+    def write(self, data, length=None, frame=None, timestamp=None):
+        """
+        Append interleaved frames, finishing the current segment and
+        starting the next one whenever it is full
+
+        Parameters
+        ----------
+        data: (bytes) frames to write, bytes or a memoryview of bytes
+        length: (int) number of frames, unused (optional)
+        frame: (int) stream index of the first frame, defaults to
+                     following on from the last write (optional)
+        timestamp: (float) capture time of the first frame (optional)
+        """
+        view = memoryview(data)
+        if frame is not None:
+            self.frame = frame
+        offset = 0
+        while offset < len(view):
+            if self.sink is None:
+                start = None
+                if timestamp is not None:
+                    start = timestamp + float(offset // self.block_align) / self.sample_rate
+                self._start_segment(start)
+            size = min(len(view) - offset,
+                       (self.segment_frames - self.sink.frames) * self.block_align)
+            self.sink.write(view[offset:offset + size])
+            offset += size
+            self.frame += size // self.block_align
+            self.frames += size // self.block_align
+            if self.sink.frames == self.segment_frames:
+                self._finish_segment()
+
+    def close(self):
+        """ Finish the current segment """
+        if self.sink is not None:
+            self._finish_segment()
@@ -0,0 +1,111 @@
+"""
+sources.py
+
+File sources for the output stream.
+
+A source is read by the output dispatcher straight into the ring
+buffer, which is kept topped up with a read-ahead of the file, so
+memory use does not grow with the length of the file.
+
+"""
+import struct
+
+from .sinks import WAV_FORMATS, WAVE_FORMAT_EXTENSIBLE
+
+_FORMATS = dict((value, key) for key, value in WAV_FORMATS.items())
+
+
+class WavSource(object):
+    """
+    Reads interleaved frames from a WAV or RF64 file.
+
+    Parameters
+    ----------
+    file: (str or file) path to open, or a seekable binary file object,
+                        which is left open on close
+
+    Raises
+    ------
+    ValueError if the file is not a WAV file in a supported format
+    """
+
+    def __init__(self, file):
+        if hasattr(file, 'read'):
+            self.file = file
+            self.owned = False
+        else:
+            self.file = open(file, 'rb')
+            self.owned = True
+        try:
+            self._read_header()
+        except Exception:
+            self.close()
+            raise
+        self.remaining = self.data_bytes
+
+    @property
+    def frames(self):
+        """ Number of frames in the file """
+        return self.data_bytes // self.block_align
+
+    def _read_header(self):
+        riff = self.file.read(12)
+        if len(riff) < 12 or riff[:4] not in (b'RIFF', b'RF64') or riff[8:] != b'WAVE':
+            raise ValueError('Not a WAV file')
+
+        sizes = None
+        fmt = None
+        while True:
+            header = self.file.read(8)
+            if len(header) < 8:
+                raise ValueError('WAV file has no data')
+            chunk, size = header[:4], struct.unpack('<I', header[4:])[0]
+            if chunk == b'data':
+                break
+            body = self.file.read(size + size % 2)
+            if chunk == b'ds64':
+                sizes = struct.unpack('<QQ', body[:16])
+            elif chunk == b'fmt ':
+                fmt = body
+
+        if fmt is None:
+            raise ValueError('WAV file has no format')
+        tag, self.channels, self.sample_rate = struct.unpack('<HHI', fmt[:8])
+        self.block_align, bits = struct.unpack('<HH', fmt[12:16])
+        if tag == WAVE_FORMAT_EXTENSIBLE:
+            tag = struct.unpack('<H', fmt[24:26])[0]
+        if (tag, bits) not in _FORMATS:
+            raise ValueError('Format not supported by WAV sources')
+        self.sample_format = _FORMATS[(tag, bits)]
+
+        self.data_bytes = sizes[1] if (sizes and size == 0xFFFFFFFF) else size
+        self.data_bytes -= self.data_bytes % self.block_align
+
+    def readinto(self, view):
+        """
+        Read whole frames into a writable buffer
+
+        Parameters
+        ----------
+        view: (memoryview) buffer to fill, such as a ring buffer write view
+
+        Returns
+        -------
+        (int) number of bytes read, 0 at the end of the file
+        """
+        size = min(len(view), self.remaining)
+        size -= size % self.block_align
+        done = 0
+        while done < size:
+            count = self.file.readinto(view[done:size])
+            if not count:
+                break
+            done += count
+        self.remaining -= done
+        return done
+
+    def close(self):
+        """ Close the file, if the source opened it """
+        if self.owned and self.file:
+            self.file.close()
+        self.file = None
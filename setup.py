@@ -19,17 +19,19 @@ if platform.system() == 'Windows':
         'x86_64' if platform.machine().endswith('64') else 'i686')
     include_dirs = ['./pysoundio', windows_path]
     library_dirs = [library_path]
+    libraries = ['soundio', 'ws2_32']
     shutil.copyfile(os.path.join(library_path, 'libsoundio.dll.a'),
                     os.path.join(library_path, 'soundio.lib'))
 else:
     include_dirs = ['./pysoundio', '/usr/local/include']
     library_dirs = ['/usr/local/lib']
+    libraries = ['soundio']
 
 soundio = Extension('_soundiox',
                     sources=['pysoundio/_soundiox.c'],
                     include_dirs=include_dirs,
                     library_dirs=library_dirs,
-                    libraries=['soundio'])
+                    libraries=libraries)
 
 setup(
     name='pysoundio',
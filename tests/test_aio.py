@@ -0,0 +1,60 @@
+"""
+test_aio.py
+
+PySoundIo asyncio Test Suite
+"""
+import sys
+import unittest
+import pysoundio
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from pysoundio.aio import AsyncInputStream, AsyncOutputStream
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'asyncio interface requires Python 3.5')
+class TestAsyncStreams(unittest.TestCase):
+
+    def setUp(self):
+        self.sio = pysoundio.PySoundIo(
+            backend=pysoundio.SoundIoBackendDummy)
+        self.sio.testing = True
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.sio.close()
+        self.loop.close()
+
+    def test_input_stream(self):
+        stream = AsyncInputStream(
+            self.sio, loop=self.loop,
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            block_size=1024)
+        block = self.loop.run_until_complete(asyncio.wait_for(stream.__anext__(), 5.0))
+        self.assertEqual(len(block), 1024 * 8)
+        stream.close()
+        self.assertEqual(self.sio.input_streams, [])
+
+    def test_output_stream(self):
+        stream = AsyncOutputStream(
+            self.sio, loop=self.loop,
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2)
+        self.assertIsNone(self.sio.output['dispatcher'])
+        self.loop.run_until_complete(asyncio.wait_for(stream.write(bytearray(4096 * 8)), 5.0))
+        stream.close()
+        self.assertIsNone(self.sio.output['stream'])
+
+    def test_output_stream_running_loop(self):
+        stream = AsyncOutputStream(
+            self.sio,
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2)
+        self.loop.run_until_complete(asyncio.wait_for(stream.write(bytearray(4096 * 8)), 5.0))
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.loop.run_until_complete(stream.write(bytearray(7)))
+        stream.close()
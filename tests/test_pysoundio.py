@@ -3,6 +3,12 @@ test_pysoundio.py
 
 PySoundIo Test Suite
 """
+import ctypes
+import io
+import os
+import shutil
+import tempfile
+import time
 import unittest
 import pysoundio
 import _soundiox
@@ -62,6 +68,13 @@ class TestPySoundIo(unittest.TestCase):
         with self.assertRaises(pysoundio.PySoundIoError):
             self.sio.get_output_device(100)
 
+    def test_get_channel_matrix(self):
+        device = self.sio.get_default_output_device()
+        layout, matrix = self.sio.get_channel_matrix(
+            device, ['Front Right', {'Front Left': 0.5}])
+        self.assertEqual(layout.channel_count, 2)
+        self.assertEqual(matrix, [[0.0, 1.0], [0.5, 0.0]])
+
     def test_get_layouts(self):
         self.sio.input['device'] = self.sio.get_default_input_device()
         layouts = self.sio.get_layouts(self.sio.input['device'])
@@ -109,6 +122,12 @@ class TestPySoundIo(unittest.TestCase):
             self.assertIn('software_latency_max', device)
             self.assertIn('software_latency_current', device)
 
+    def test_list_devices_cached(self):
+        devices = self.sio.list_devices()
+        self.assertIs(self.sio.list_devices(), devices)
+        self.sio._devices_changed -= 1
+        self.assertIsNot(self.sio.list_devices(), devices)
+
     def test_supports_sample_rate(self):
         self.sio.input['device'] = self.sio.get_input_device(0)
         self.assertTrue(self.sio.supports_sample_rate(self.sio.input['device'], 44100))
@@ -151,6 +170,20 @@ class TestPySoundIo(unittest.TestCase):
         self.assertEqual(self.sio.get_bytes_per_sample(
             pysoundio.SoundIoFormatFloat32LE), 4)
 
+    @unittest.skipIf(pysoundio.pysoundio._np is None, 'numpy is not installed')
+    def test_get_numpy_dtype(self):
+        dtype = self.sio.get_numpy_dtype(pysoundio.SoundIoFormatFloat32LE)
+        self.assertEqual(dtype.str, '<f4')
+        dtype = self.sio.get_numpy_dtype(pysoundio.SoundIoFormatS16BE)
+        self.assertEqual(dtype.str, '>i2')
+        dtype = self.sio.get_numpy_dtype(pysoundio.SoundIoFormatU32LE)
+        self.assertEqual(dtype.str, '<u4')
+
+    @unittest.skipIf(pysoundio.pysoundio._np is None, 'numpy is not installed')
+    def test_get_numpy_dtype_invalid(self):
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.get_numpy_dtype(pysoundio.SoundIoFormatS24LE)
+
     def test_bytes_per_second(self):
         self.assertEqual(self.sio.get_bytes_per_second(
             pysoundio.SoundIoFormatFloat32LE, 1, 44100), 176400)
@@ -164,9 +197,267 @@ class TestPySoundIo(unittest.TestCase):
 
     def test__create_input_ring_buffer(self):
         capacity = 44100 * 8
+        self.sio.input['device'] = self.sio.get_default_input_device()
+        self.sio._create_input_stream()
         self.sio.input['buffer'] = self.sio._create_input_ring_buffer(capacity)
         self.assertIsNotNone(self.sio.input['buffer'])
 
+    def test_multiple_instances(self):
+        other = pysoundio.PySoundIo(backend=pysoundio.SoundIoBackendDummy)
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2)
+        other.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2)
+        self.assertNotEqual(self.sio.input['stream'], other.input['stream'])
+        self.assertNotEqual(self.sio.input['buffer'], other.input['buffer'])
+        other.close()
+        self.assertIsNotNone(self.sio.input['stream'])
+
+    def test_open_input_stream(self):
+        first = self.sio.open_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2)
+        second = self.sio.open_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2)
+        self.assertNotEqual(first['stream'], second['stream'])
+        self.assertNotEqual(first['buffer'], second['buffer'])
+        self.assertIsNone(self.sio.input['stream'])
+        self.assertEqual(len(self.sio.input_streams), 2)
+        self.sio.close_input_stream(first)
+        self.assertIsNone(first['stream'])
+        self.assertEqual(self.sio.input_streams, [second])
+
+    def test_open_input_stream_invalid_rate(self):
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.open_input_stream(
+                sample_rate=10000000,
+                dtype=pysoundio.SoundIoFormatFloat32LE,
+                channels=2)
+        self.assertEqual(self.sio.input_streams, [])
+
+    def test_read(self):
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            blocking=True)
+        self.assertIsNone(self.sio.input['dispatcher'])
+        self.fill_input_buffer()
+        data = self.sio.read(1024, timeout=1.0)
+        self.assertEqual(len(data), 1024 * 8)
+
+    def test_read_timeout(self):
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            blocking=True)
+        capacity = _soundiox.ring_buffer_capacity(self.sio.input['buffer'])
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.read(capacity // 8, timeout=0.01)
+
+    def test_start_input_buffer_duration(self):
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            blocking=True,
+            buffer_duration=2)
+        capacity = _soundiox.ring_buffer_capacity(self.sio.input['buffer'])
+        self.assertGreaterEqual(capacity, 2 * 44100 * 8)
+        self.assertLess(capacity, 3 * 44100 * 8)
+
+    def test_start_input_auto_buffer(self):
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            block_size=1024,
+            channels=2,
+            blocking=True,
+            buffer_duration='auto')
+        duration = self.sio.get_stream_stats()['input']['buffer_duration']
+        self.assertGreaterEqual(duration, pysoundio.constants.AUTO_RING_BUFFER_MIN_DURATION)
+        self.assertLess(duration, pysoundio.constants.DEFAULT_RING_BUFFER_DURATION)
+
+    def test_start_input_invalid_buffer_duration(self):
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.start_input_stream(
+                sample_rate=44100,
+                dtype=pysoundio.SoundIoFormatFloat32LE,
+                channels=2,
+                buffer_duration=0)
+
+    def test_start_input_stream_sink(self):
+        path = os.path.join(tempfile.mkdtemp(), 'capture.wav')
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            sink=path)
+        time.sleep(0.1)
+        self.sio.close_input_stream(self.sio.input)
+        with open(path, 'rb') as f:
+            header = f.read(12)
+        self.assertEqual(header[:4], b'RIFF')
+        self.assertEqual(header[8:], b'WAVE')
+        os.remove(path)
+
+    def test_start_input_stream_segments(self):
+        path = tempfile.mkdtemp()
+        segments = []
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            sink=os.path.join(path, 'capture-{index:03d}.wav'),
+            segment_duration=0.05,
+            segment_callback=lambda **segment: segments.append(segment))
+        time.sleep(0.2)
+        self.sio.close_input_stream(self.sio.input)
+        self.assertTrue(segments)
+        frame = 0
+        for segment in segments:
+            self.assertEqual(segment['frame'], frame)
+            self.assertTrue(os.path.exists(segment['path']))
+            frame += segment['frames']
+        shutil.rmtree(path)
+
+    def test_start_input_stream_segments_file(self):
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.start_input_stream(
+                sample_rate=44100,
+                dtype=pysoundio.SoundIoFormatFloat32LE,
+                channels=2,
+                sink=io.BytesIO(),
+                segment_bytes=4096)
+
+    def test_start_input_stream_history(self):
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            history=0.05)
+        time.sleep(0.2)
+        self.assertEqual(len(self.sio.snapshot()), 2205 * 8)
+        self.assertEqual(len(self.sio.snapshot(0.01)), 441 * 8)
+
+    def test_read_range(self):
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            history=0.1)
+        time.sleep(0.2)
+        now = self.sio.monotonic_time()
+        data, timestamp = self.sio.read_range(now - 0.05, now - 0.04)
+        self.assertIsInstance(data, bytes)
+        self.assertLessEqual(len(data), 441 * 8)
+        self.assertEqual(len(data) % 8, 0)
+        self.assertAlmostEqual(timestamp, now - 0.05, places=3)
+        data, timestamp = self.sio.read_range(now - 10.0, now)
+        self.assertLessEqual(len(data), 4410 * 8)
+
+    def test_read_range_after_overflow(self):
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            history=0.2,
+            buffer_duration=0.05)
+        # Holding a read view stops the history being trimmed,
+        # so the ring buffer fills and new frames are dropped
+        view, position = _soundiox.instream_read_begin(self.sio.input['stream'])
+        time.sleep(0.5)
+        released = self.sio.monotonic_time()
+        _soundiox.instream_read_end(self.sio.input['stream'], position)
+        self.assertGreater(self.sio.get_stream_stats()['input']['frames_dropped'], 0)
+        time.sleep(0.1)
+
+        # Audio from before the frames were dropped keeps its capture time
+        data, timestamp = self.sio.read_range(released - 0.33, released - 0.27)
+        self.assertLess(abs(timestamp - (released - 0.33)), 0.03)
+        self.assertLess(abs(len(data) / 8.0 / 44100 - 0.06), 0.03)
+
+    def test_start_recording(self):
+        path = os.path.join(tempfile.mkdtemp(), 'event.wav')
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            history=0.1)
+        time.sleep(0.2)
+        self.sio.start_recording(path, preroll=0.05)
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.start_recording(io.BytesIO())
+        self.sio.stop_recording()
+        with open(path, 'rb') as f:
+            header = f.read(12)
+        self.assertEqual(header[:4], b'RIFF')
+        os.remove(path)
+
+    def test_start_input_stream_history_callback(self):
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.start_input_stream(
+                sample_rate=44100,
+                dtype=pysoundio.SoundIoFormatFloat32LE,
+                channels=2,
+                read_callback=lambda data, length: None,
+                history=1.0)
+
+    def test_start_input_stream_sink_callback(self):
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.start_input_stream(
+                sample_rate=44100,
+                dtype=pysoundio.SoundIoFormatFloat32LE,
+                channels=2,
+                read_callback=lambda data, length: None,
+                sink=io.BytesIO())
+
+    def test_start_input_stream_convert(self):
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatS16LE,
+            channels=2,
+            blocking=True,
+            convert=True)
+        self.assertEqual(self.sio.input['format'], pysoundio.SoundIoFormatS16LE)
+        self.assertEqual(self.sio.input['sample_format'], pysoundio.SoundIoFormatFloat32NE)
+        self.assertEqual(self.sio.input['bytes_per_frame'], 8)
+
+    def test_overflow_policy(self):
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            overflow_policy=pysoundio.OverflowGap)
+        self.assertEqual(self.sio.get_input_gaps(), [])
+        stats = self.sio.get_stream_stats()['input']
+        self.assertEqual(stats['frames_dropped'], 0)
+        self.assertIn('overflows', stats)
+
+    def test_overflow_drop_oldest_during_read(self):
+        def read_callback(data, length):
+            time.sleep(0.3)
+
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            read_callback=read_callback,
+            overflow_policy=pysoundio.OverflowDropOldest,
+            buffer_duration=0.05)
+        time.sleep(0.5)
+        stats = self.sio.get_stream_stats()['input']
+        self.assertGreater(stats['overflows'], 0)
+        self.assertGreater(stats['frames_dropped'], 0)
+
     def test_get_input_latency(self):
         self.sio.start_input_stream(
             sample_rate=44100,
@@ -179,8 +470,14 @@ class TestPySoundIo(unittest.TestCase):
         self.callback_called = True
 
     def test_overflow_callback(self):
-        self.sio.input['overflow_callback'] = self.overflow_callback
-        self.sio._overflow_callback()
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            read_callback=lambda data, length: time.sleep(0.3),
+            overflow_callback=self.overflow_callback,
+            buffer_duration=0.05)
+        time.sleep(0.5)
         self.assertTrue(self.callback_called)
 
     def test_start_input_stream(self):
@@ -223,6 +520,52 @@ class TestPySoundIo(unittest.TestCase):
         self.assertIsNotNone(self.sio.input['stream'])
         self.assertIsInstance(self.sio.input['sample_rate'], int)
 
+    def test_start_input_resampled(self):
+        self.sio.start_input_stream(
+            sample_rate=4000,
+            dtype=pysoundio.SoundIoFormatS16LE,
+            channels=2,
+            blocking=True,
+            resample_quality=pysoundio.ResampleQualityLow)
+        self.assertEqual(self.sio.input['sample_rate'], 4000)
+        self.assertNotEqual(self.sio.input['device_sample_rate'], 4000)
+        self.assertEqual(self.sio.input['sample_format'], pysoundio.SoundIoFormatFloat32NE)
+
+    def test_start_input_resampled_overflow(self):
+        self.sio.start_input_stream(
+            sample_rate=4000,
+            dtype=pysoundio.SoundIoFormatS16LE,
+            channels=2,
+            blocking=True,
+            buffer_duration=0.05,
+            resample_quality=pysoundio.ResampleQualityLow)
+        time.sleep(0.3)
+        stats = self.sio.get_stream_stats()['input']
+        self.assertGreater(stats['frames_dropped'], 0)
+
+    def test_start_input_channel_map(self):
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatS16LE,
+            blocking=True,
+            channel_map=['Front Right', {'Front Left': 0.5, 'Front Right': 0.5}])
+        self.assertEqual(self.sio.input['channels'], 2)
+        self.assertEqual(self.sio.input['sample_format'], pysoundio.SoundIoFormatFloat32NE)
+        self.assertEqual(self.sio.input['bytes_per_frame'], 8)
+
+    def test_start_input_invalid_channel_map(self):
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.start_input_stream(
+                sample_rate=44100,
+                dtype=pysoundio.SoundIoFormatFloat32LE,
+                channel_map=['Not A Channel'])
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.start_input_stream(
+                sample_rate=44100,
+                dtype=pysoundio.SoundIoFormatFloat32LE,
+                channels=2,
+                channel_map=['Front Left'])
+
     def test_start_input_invalid_format(self):
         with self.assertRaises(pysoundio.PySoundIoError):
             self.sio.start_input_stream(
@@ -242,6 +585,8 @@ class TestPySoundIo(unittest.TestCase):
 
     def test__create_output_ring_buffer(self):
         capacity = 44100 * 8
+        self.sio.output['device'] = self.sio.get_default_output_device()
+        self.sio._create_output_stream()
         self.assertIsNotNone(self.sio._create_output_ring_buffer(capacity))
 
     def test__open_output_stream(self):
@@ -259,6 +604,8 @@ class TestPySoundIo(unittest.TestCase):
 
     def test_clear_output_buffer(self):
         capacity = 44100 * 8
+        self.sio.output['device'] = self.sio.get_default_output_device()
+        self.sio._create_output_stream()
         self.sio.output['buffer'] = self.sio._create_output_ring_buffer(capacity)
         self.assertIsNotNone(self.sio.output['buffer'])
         self.sio._clear_output_buffer()
@@ -267,8 +614,12 @@ class TestPySoundIo(unittest.TestCase):
         self.callback_called = True
 
     def test_underflow_callback(self):
-        self.sio.output['underflow_callback'] = self.underflow_callback
-        self.sio._underflow_callback()
+        self.sio.start_output_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            underflow_callback=self.underflow_callback)
+        time.sleep(0.2)
         self.assertTrue(self.callback_called)
 
     def test_get_output_latency(self):
@@ -301,6 +652,74 @@ class TestPySoundIo(unittest.TestCase):
             channels=2)
         self.assertIsNotNone(self.sio.output['stream'])
 
+    def test_write(self):
+        self.sio.start_output_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2)
+        self.sio.write(bytearray(4096 * 8), timeout=1.0)
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.write(bytearray(7))
+
+    def test_write_float_array(self):
+        self.sio.start_output_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2)
+        self.sio.write((ctypes.c_float * (4096 * 2))(), timeout=1.0)
+
+    def test_write_blocking(self):
+        self.sio.start_output_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            blocking=True)
+        self.assertIsNone(self.sio.output['dispatcher'])
+        self.sio.write(bytearray(4096 * 8), timeout=1.0)
+
+    def test_write_blocking_with_callback(self):
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.start_output_stream(
+                sample_rate=44100,
+                dtype=pysoundio.SoundIoFormatFloat32LE,
+                channels=2,
+                blocking=True,
+                write_callback=lambda data, length: None)
+
+    def test_start_duplex_stream(self):
+        self.sio.start_duplex_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            gain=0.5)
+        self.assertIsNotNone(self.sio.input['stream'])
+        self.assertIsNotNone(self.sio.output['stream'])
+        self.assertIsNone(self.sio.output['write_callback'])
+        self.sio.set_duplex_gain(1.0)
+
+    def test_set_duplex_gain_not_running(self):
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.set_duplex_gain(1.0)
+        self.sio.start_duplex_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2)
+        self.sio.close_output_stream()
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.set_duplex_gain(1.0)
+
+    def test_close_output_during_duplex(self):
+        self.sio.start_duplex_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2)
+        time.sleep(0.05)
+        self.sio.close_output_stream()
+        self.assertIsNone(self.sio.output['buffer'])
+        frames = _soundiox.instream_get_timing(self.sio.input['stream'])[0]
+        time.sleep(0.1)
+        self.assertGreater(_soundiox.instream_get_timing(self.sio.input['stream'])[0], frames)
+
     def test_start_output_stream_device(self):
         self.sio.start_output_stream(
             device_id=0,
@@ -323,6 +742,50 @@ class TestPySoundIo(unittest.TestCase):
         self.assertIsNotNone(self.sio.output['stream'])
         self.assertIsInstance(self.sio.output['sample_rate'], int)
 
+    def test_start_output_resampled(self):
+        self.sio.start_output_stream(
+            sample_rate=4000,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            resample_quality=pysoundio.ResampleQualityMedium)
+        self.assertIsNotNone(self.sio.output['stream'])
+        self.assertNotEqual(self.sio.output['device_sample_rate'], 4000)
+
+    def test_start_output_channel_map(self):
+        self.sio.start_output_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channel_map=[{'Front Left': 1.0, 'Front Right': 1.0, 'Front Center': 0.7}])
+        self.assertEqual(self.sio.output['channels'], 1)
+        self.assertEqual(self.sio.output['layout'].channel_count, 3)
+        self.assertEqual(self.sio.output['bytes_per_frame'], 4)
+
+    def test_start_output_stream_source(self):
+        path = os.path.join(tempfile.mkdtemp(), 'play.wav')
+        sink = pysoundio.WavSink(path, 44100, 2, pysoundio.SoundIoFormatFloat32LE)
+        sink.write(b'\x00' * 8 * 441)
+        sink.close()
+        self.sio.start_output_stream(source=path)
+        self.assertEqual(self.sio.output['sample_rate'], 44100)
+        self.assertEqual(self.sio.output['channels'], 2)
+        self.assertTrue(self.sio.wait_for_playback(5.0))
+        self.sio.close_output_stream()
+        os.remove(path)
+
+    def test_start_output_stream_source_callback(self):
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.start_output_stream(
+                write_callback=lambda data, length: None,
+                source=io.BytesIO())
+
+    def test_wait_for_playback_no_source(self):
+        self.sio.start_output_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2)
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.wait_for_playback(0.01)
+
     def test_start_output_invalid_format(self):
         with self.assertRaises(pysoundio.PySoundIoError):
             self.sio.start_output_stream(
@@ -365,9 +828,145 @@ class TestInputProcessing(unittest.TestCase):
         _soundiox.ring_buffer_advance_write_ptr(self.sio.input['buffer'], len(data))
 
         thread = pysoundio.pysoundio._InputProcessingThread(parent=self.sio)
-        thread.run()
+        thread.process()
+        self.assertTrue(self.callback_called)
+
+    def test_get_stream_stats(self):
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            read_callback=self.callback)
+        stats = self.sio.get_stream_stats()['input']
+        self.assertIn('callback_time_max', stats)
+        self.assertIn('wakeups', stats['dispatcher'])
+
+    def test_get_stream_stats_open_input_stream(self):
+        stream = self.sio.open_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            read_callback=self.callback)
+        time.sleep(0.1)
+        stats = self.sio.get_stream_stats()
+        self.assertNotIn('input', stats)
+        self.assertEqual(len(stats['inputs']), 1)
+        self.assertGreater(stats['inputs'][0]['callbacks'], 0)
+        self.assertIn('wakeups', self.sio.get_stream_stats(stream)['dispatcher'])
+
+    def failing_callback(self, data, length):
+        raise ValueError('callback failed')
+
+    def test_read_callback_error(self):
+        pysoundio.pysoundio.LOGGER.disabled = True
+        try:
+            self.sio.start_input_stream(
+                sample_rate=44100,
+                dtype=pysoundio.SoundIoFormatFloat32LE,
+                channels=2,
+                read_callback=self.failing_callback)
+            time.sleep(0.2)
+            self.assertTrue(self.sio.input['dispatcher'].is_alive())
+            stats = self.sio.get_stream_stats()['input']['dispatcher']
+            self.assertGreater(stats['callback_errors'], 1)
+        finally:
+            pysoundio.pysoundio.LOGGER.disabled = False
+
+    def timestamp_callback(self, data, length, frame, timestamp):
+        self.callback_called = (frame, timestamp)
+
+    def test_read_callback_timestamps(self):
+        stream = self.sio.open_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            block_size=4096,
+            read_callback=self.timestamp_callback,
+            timestamps=True)
+        stream['dispatcher'].stop()
+
+        data = bytearray(b'\x00' * 4096 * 8)
+        _soundiox.ring_buffer_write_ptr(stream['buffer'], data, len(data))
+        _soundiox.ring_buffer_advance_write_ptr(stream['buffer'], len(data))
+
+        thread = pysoundio.pysoundio._InputProcessingThread(parent=self.sio, stream=stream)
+        thread.process()
+        frame, timestamp = self.callback_called
+        self.assertIsInstance(timestamp, float)
+        self.assertGreaterEqual(thread.frame, frame + 4096)
+
+    def block_callback(self, data, length):
+        self.assertEqual(len(data), 1024 * 8)
+        self.callback_called.append(length)
+
+    def test_read_callback_exact_blocks(self):
+        stream = self.sio.open_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            block_size=1024,
+            hop_size=512,
+            read_callback=self.block_callback)
+        stream['dispatcher'].stop()
+        self.callback_called = []
+
+        data = bytearray(b'\x00' * 4096 * 8)
+        _soundiox.ring_buffer_write_ptr(stream['buffer'], data, len(data))
+        _soundiox.ring_buffer_advance_write_ptr(stream['buffer'], len(data))
+
+        thread = pysoundio.pysoundio._InputProcessingThread(parent=self.sio, stream=stream)
+        thread.process()
+        self.assertGreaterEqual(len(self.callback_called), 7)
+        self.assertEqual(set(self.callback_called), {1024})
+
+    def test_invalid_hop_size(self):
+        with self.assertRaises(pysoundio.PySoundIoError):
+            self.sio.start_input_stream(block_size=1024, hop_size=2048)
+
+    def test_dispatcher(self):
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            block_size=4096,
+            read_callback=self.callback)
+        dispatcher = self.sio.input['dispatcher']
+        self.assertTrue(dispatcher.is_alive())
+
+        data = bytearray(b'\x00' * 4096 * 8)
+        _soundiox.ring_buffer_write_ptr(self.sio.input['buffer'], data, len(data))
+        _soundiox.ring_buffer_advance_write_ptr(self.sio.input['buffer'], len(data))
+        time.sleep(0.1)
+
+        dispatcher.stop()
+        self.assertFalse(dispatcher.is_alive())
+        self.assertGreaterEqual(dispatcher.get_stats()['wakeups'], 1)
+        self.assertIn('wakeup_latency_mean', dispatcher.get_stats())
+
+
+    @unittest.skipIf(pysoundio.pysoundio._np is None, 'numpy is not installed')
+    def test_read_callback_numpy(self):
+        self.sio.start_input_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            block_size=4096,
+            read_callback=self.numpy_callback,
+            numpy=True)
+
+        data = bytearray(b'\x00' * 4096 * 8)
+        _soundiox.ring_buffer_write_ptr(self.sio.input['buffer'], data, len(data))
+        _soundiox.ring_buffer_advance_write_ptr(self.sio.input['buffer'], len(data))
+
+        thread = pysoundio.pysoundio._InputProcessingThread(parent=self.sio)
+        thread.process()
         self.assertTrue(self.callback_called)
 
+    def numpy_callback(self, data, length):
+        self.assertEqual(data.shape[1], 2)
+        self.assertEqual(data.dtype.str, '<f4')
+        self.callback_called = True
+
 
 class TestOutputProcessing(unittest.TestCase):
 
@@ -392,5 +991,65 @@ class TestOutputProcessing(unittest.TestCase):
             write_callback=self.callback)
         self.assertIsNotNone(self.sio.output['stream'])
         thread = pysoundio.pysoundio._OutputProcessingThread(parent=self.sio, block_size=4096)
-        thread.run()
+        thread.process()
+        self.assertTrue(self.callback_called)
+
+    def slow_callback(self, data, length):
+        time.sleep(0.2)
+
+    def overrun_callback(self, elapsed, deadline):
+        self.callback_called = (elapsed, deadline)
+
+    def test_write_callback_overrun(self):
+        self.sio.start_output_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            block_size=4096,
+            write_callback=self.slow_callback,
+            overrun_callback=self.overrun_callback)
+        thread = pysoundio.pysoundio._OutputProcessingThread(parent=self.sio, block_size=4096)
+        thread.period = 0.0
+        thread.process()
+        elapsed, deadline = self.callback_called
+        self.assertGreater(elapsed, deadline)
+        self.assertAlmostEqual(deadline, 4096 / 44100.0)
+        stats = thread.get_stats()
+        self.assertEqual(stats['deadline_misses'], 1)
+        self.assertEqual(sum(stats['callback_load_histogram']), 1)
+
+    def block_callback(self, data, length):
+        self.assertEqual((len(data), length), (1000 * 8, 1000))
+        self.callback_called = True
+
+    def test_write_callback_exact_blocks(self):
+        self.sio.start_output_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            block_size=1000,
+            write_callback=self.block_callback,
+            exact_blocks=True)
+        thread = pysoundio.pysoundio._OutputProcessingThread(parent=self.sio, block_size=1000)
+        thread.data_event(4096)
+        thread.process()
+        self.assertEqual(thread.block_size, 1000)
         self.assertTrue(self.callback_called)
+
+    @unittest.skipIf(pysoundio.pysoundio._np is None, 'numpy is not installed')
+    def test_write_callback_numpy(self):
+        self.sio.start_output_stream(
+            sample_rate=44100,
+            dtype=pysoundio.SoundIoFormatFloat32LE,
+            channels=2,
+            block_size=4096,
+            write_callback=self.numpy_callback,
+            numpy=True)
+        thread = pysoundio.pysoundio._OutputProcessingThread(parent=self.sio, block_size=4096)
+        thread.process()
+        self.assertTrue(self.callback_called)
+
+    def numpy_callback(self, data, length):
+        self.assertEqual(data.shape, (length, 2))
+        data[:] = 0.5
+        self.callback_called = True
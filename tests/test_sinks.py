@@ -0,0 +1,103 @@
+"""
+test_sinks.py
+
+File Sink Test Suite
+"""
+import io
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import wave
+
+import pysoundio
+from pysoundio import sinks
+
+
+class TestWavSink(unittest.TestCase):
+
+    def test_pcm(self):
+        f = io.BytesIO()
+        sink = pysoundio.WavSink(f, 44100, 2, pysoundio.SoundIoFormatS16LE)
+        sink.write(b'\x01\x00\x02\x00' * 10)
+        sink.close()
+        self.assertEqual(sink.frames, 10)
+        f.seek(0)
+        wav = wave.open(f)
+        self.assertEqual(wav.getnchannels(), 2)
+        self.assertEqual(wav.getframerate(), 44100)
+        self.assertEqual(wav.getsampwidth(), 2)
+        self.assertEqual(wav.readframes(10), b'\x01\x00\x02\x00' * 10)
+
+    def test_float_extensible(self):
+        f = io.BytesIO()
+        sink = pysoundio.WavSink(f, 48000, 8, pysoundio.SoundIoFormatFloat32LE)
+        sink.write(memoryview(b'\x00' * 32 * 4))
+        sink.close()
+        data = f.getvalue()
+        self.assertEqual(data[:4], b'RIFF')
+        self.assertEqual(struct.unpack('<I', data[4:8])[0], len(data) - 8)
+        tag, channels = struct.unpack('<HH', data[56:60])
+        self.assertEqual((tag, channels), (sinks.WAVE_FORMAT_EXTENSIBLE, 8))
+        self.assertEqual(struct.unpack('<H', data[80:82])[0], sinks.WAVE_FORMAT_IEEE_FLOAT)
+        self.assertEqual(data[96:100], b'data')
+        self.assertEqual(struct.unpack('<I', data[100:104])[0], 32 * 4)
+
+    def test_rf64(self):
+        limit = sinks._RIFF_LIMIT
+        sinks._RIFF_LIMIT = 16
+        try:
+            f = io.BytesIO()
+            sink = pysoundio.WavSink(f, 48000, 1, pysoundio.SoundIoFormatFloat32LE)
+            sink.write(b'\x00' * 12)
+            sink.close()
+        finally:
+            sinks._RIFF_LIMIT = limit
+        data = f.getvalue()
+        self.assertEqual(data[:8], b'RF64\xff\xff\xff\xff')
+        self.assertEqual(data[12:16], b'ds64')
+        riff_size, data_size, frames = struct.unpack('<QQQ', data[20:44])
+        self.assertEqual((riff_size, data_size, frames), (len(data) - 8, 12, 3))
+
+    def test_invalid_format(self):
+        with self.assertRaises(ValueError):
+            pysoundio.WavSink(io.BytesIO(), 44100, 2, pysoundio.SoundIoFormatS16BE)
+
+
+class TestSegmentedWavSink(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.segments = []
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def segment_callback(self, path, frame, timestamp, frames):
+        self.segments.append((os.path.basename(path), frame, timestamp, frames))
+
+    def test_split(self):
+        sink = pysoundio.SegmentedWavSink(
+            os.path.join(self.path, 'seg-{index}-{frame}.wav'), 10, 1,
+            pysoundio.SoundIoFormatU8, 4, self.segment_callback)
+        sink.write(b'\x01\x02\x03\x04\x05\x06', frame=0, timestamp=1.0)
+        sink.write(b'\x07\x08\x09', frame=6, timestamp=1.6)
+        sink.close()
+        self.assertEqual(sink.frames, 9)
+        self.assertEqual(self.segments, [
+            ('seg-0-0.wav', 0, 1.0, 4),
+            ('seg-1-4.wav', 4, 1.4, 4),
+            ('seg-2-8.wav', 8, 1.8, 1),
+        ])
+        data = b''
+        for name, _, _, _ in self.segments:
+            wav = wave.open(os.path.join(self.path, name))
+            data += wav.readframes(wav.getnframes())
+            wav.close()
+        self.assertEqual(data, b'\x01\x02\x03\x04\x05\x06\x07\x08\x09')
+
+    def test_fixed_path(self):
+        with self.assertRaises(ValueError):
+            pysoundio.SegmentedWavSink(os.path.join(self.path, 'seg.wav'), 10, 1,
+                                       pysoundio.SoundIoFormatU8, 4)
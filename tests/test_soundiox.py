@@ -4,6 +4,8 @@ test_soundiox.py
 C API Test Suite
 """
 import ctypes
+import struct
+import sys
 import unittest
 import pysoundio
 import _soundiox as soundio
@@ -15,11 +17,19 @@ class TestInitialisation(unittest.TestCase):
         self.s = soundio.create()
 
     def tearDown(self):
-        soundio.destroy()
+        soundio.destroy(self.s)
 
     def test_connect(self):
         self.assertEqual(
-            soundio.connect_backend(pysoundio.SoundIoBackendDummy), 0)
+            soundio.connect_backend(self.s, pysoundio.SoundIoBackendDummy), 0)
+
+    def test_multiple_instances(self):
+        other = soundio.create()
+        self.assertNotEqual(other, self.s)
+        self.assertEqual(soundio.connect_backend(self.s, pysoundio.SoundIoBackendDummy), 0)
+        self.assertEqual(soundio.connect_backend(other, pysoundio.SoundIoBackendDummy), 0)
+        soundio.disconnect(other)
+        soundio.destroy(other)
 
     def test_version(self):
         self.assertIsInstance(soundio.version_string(), str)
@@ -30,8 +40,26 @@ class TestInitialisation(unittest.TestCase):
             'float 32-bit LE'
         )
 
+    def test_convert_to_float(self):
+        data = struct.pack('<hh', 16384, -32768)
+        converted = soundio.convert_to_float(data, pysoundio.SoundIoFormatS16LE)
+        self.assertEqual(struct.unpack('=ff', converted), (0.5, -1.0))
+
+    def test_convert_24_bit(self):
+        data = struct.pack('=ff', 0.5, -0.5)
+        for fmt in (pysoundio.SoundIoFormatS24LE, pysoundio.SoundIoFormatS24BE):
+            converted = soundio.convert_from_float(data, fmt)
+            self.assertEqual(len(converted), 8)
+            result = struct.unpack('=ff', soundio.convert_to_float(converted, fmt))
+            self.assertAlmostEqual(result[0], 0.5, places=5)
+            self.assertAlmostEqual(result[1], -0.5, places=5)
+
+    def test_convert_invalid_format(self):
+        with self.assertRaises(soundio.PySoundIoError):
+            soundio.convert_to_float(b'', pysoundio.SoundIoFormatInvalid)
+
     def test_backend_count(self):
-        self.assertIsInstance(soundio.backend_count(), int)
+        self.assertIsInstance(soundio.backend_count(self.s), int)
 
 
 class TestDeviceAPI(unittest.TestCase):
@@ -39,50 +67,50 @@ class TestDeviceAPI(unittest.TestCase):
     def setUp(self):
         self.device = None
         self.s = soundio.create()
-        soundio.connect_backend(pysoundio.SoundIoBackendDummy)
-        soundio.flush()
+        soundio.connect_backend(self.s, pysoundio.SoundIoBackendDummy)
+        soundio.flush(self.s)
 
     def tearDown(self):
         if self.device:
             soundio.device_unref(self.device)
-        soundio.destroy()
+        soundio.destroy(self.s)
 
     def test_get_input_device_count(self):
-        self.assertNotEqual(soundio.get_input_device_count(), -1)
+        self.assertNotEqual(soundio.get_input_device_count(self.s), -1)
 
     def test_get_output_device_count(self):
-        self.assertNotEqual(soundio.get_output_device_count(), -1)
+        self.assertNotEqual(soundio.get_output_device_count(self.s), -1)
 
     def test_default_input_device_index(self):
-        self.assertNotEqual(soundio.default_input_device_index(), -1)
+        self.assertNotEqual(soundio.default_input_device_index(self.s), -1)
 
     def test_default_output_device_index(self):
-        self.assertNotEqual(soundio.default_output_device_index(), -1)
+        self.assertNotEqual(soundio.default_output_device_index(self.s), -1)
 
     def test_get_input_device(self):
-        default_index = soundio.default_input_device_index()
-        self.device = soundio.get_input_device(default_index)
+        default_index = soundio.default_input_device_index(self.s)
+        self.device = soundio.get_input_device(self.s, default_index)
         self.assertIsNotNone(self.device)
 
     def test_get_output_device(self):
-        default_index = soundio.default_output_device_index()
-        self.device = soundio.get_output_device(default_index)
+        default_index = soundio.default_output_device_index(self.s)
+        self.device = soundio.get_output_device(self.s, default_index)
         self.assertIsNotNone(self.device)
 
     def test_device_supports_sample_rate(self):
-        default_index = soundio.default_output_device_index()
-        self.device = soundio.get_output_device(default_index)
+        default_index = soundio.default_output_device_index(self.s)
+        self.device = soundio.get_output_device(self.s, default_index)
         self.assertIsNotNone(soundio.device_supports_sample_rate(self.device, 44100))
 
     def test_device_supports_format(self):
-        default_index = soundio.default_output_device_index()
-        self.device = soundio.get_output_device(default_index)
+        default_index = soundio.default_output_device_index(self.s)
+        self.device = soundio.get_output_device(self.s, default_index)
         self.assertIsNotNone(soundio.device_supports_format(
             self.device, pysoundio.SoundIoFormatFloat32LE))
 
     def test_device_sort_channel_layouts(self):
-        default_index = soundio.default_output_device_index()
-        self.device = soundio.get_output_device(default_index)
+        default_index = soundio.default_output_device_index(self.s)
+        self.device = soundio.get_output_device(self.s, default_index)
         soundio.device_sort_channel_layouts(self.device)
 
     def test_channel_layout_get_default(self):
@@ -100,11 +128,18 @@ class TestDeviceAPI(unittest.TestCase):
         layout = soundio.channel_layout_get_default(2)
         self.assertIsInstance(soundio.channel_layout_find_channel(layout, 0), int)
 
+    def test_parse_channel_id(self):
+        self.assertEqual(soundio.parse_channel_id('Front Left'), soundio.SoundIoChannelIdFrontLeft)
+        self.assertEqual(soundio.parse_channel_id('nonsense'), soundio.SoundIoChannelIdInvalid)
+
     def test_channel_layout_get_builtin(self):
         self.assertIsNotNone(soundio.channel_layout_get_builtin(0))
 
+    def test_devices_changed(self):
+        self.assertGreater(soundio.devices_changed(self.s), 0)
+
     def test_force_device_scan(self):
-        soundio.force_device_scan()
+        soundio.force_device_scan(self.s)
 
     def test_bytes_per_frame(self):
         self.assertEqual(soundio.get_bytes_per_frame(
@@ -123,51 +158,180 @@ class TestInputStreamAPI(unittest.TestCase):
 
     def setUp(self):
         self.instream = None
+        self.buffer = None
         self.s = soundio.create()
-        soundio.connect_backend(pysoundio.SoundIoBackendDummy)
-        soundio.flush()
-        default_index = soundio.default_input_device_index()
-        self.device = soundio.get_input_device(default_index)
-        self.buffer = soundio.input_ring_buffer_create(44100 * 8)
+        soundio.connect_backend(self.s, pysoundio.SoundIoBackendDummy)
+        soundio.flush(self.s)
+        default_index = soundio.default_input_device_index(self.s)
+        self.device = soundio.get_input_device(self.s, default_index)
 
     def tearDown(self):
         if self.instream:
-            soundio.instream_destroy()
+            soundio.instream_destroy(self.instream)
+        if self.buffer:
+            soundio.ring_buffer_destroy(self.buffer)
         if self.device:
             soundio.device_unref(self.device)
-        soundio.destroy()
-
-    def callback(self):
-        pass
+        soundio.destroy(self.s)
 
     def setup_stream(self):
-        soundio.set_read_callbacks(self.callback, self.callback)
         self.instream = soundio.instream_create(self.device)
         instream = ctypes.cast(self.instream, ctypes.POINTER(pysoundio.SoundIoInStream))
         instream.contents.format = soundio.SoundIoFormatFloat32LE
         instream.contents.sample_rate = 44100
 
     def test_instream_create(self):
-        self.assertIsNotNone(soundio.instream_create(self.device))
+        self.instream = soundio.instream_create(self.device)
+        self.assertIsNotNone(self.instream)
 
     def test_instream_open(self):
         self.setup_stream()
-        self.assertEqual(soundio.instream_open(), 0)
+        self.assertEqual(soundio.instream_open(self.instream), 0)
 
     def test_instream_start(self):
         self.setup_stream()
-        soundio.instream_open()
-        self.assertEqual(soundio.instream_start(), 0)
+        soundio.instream_open(self.instream)
+        self.buffer = soundio.input_ring_buffer_create(self.instream, 44100 * 8)
+        self.assertEqual(soundio.instream_start(self.instream), 0)
 
     def test_instream_pause(self):
         self.setup_stream()
-        soundio.instream_open()
-        self.assertEqual(soundio.instream_pause(True), 0)
+        soundio.instream_open(self.instream)
+        self.assertEqual(soundio.instream_pause(self.instream, True), 0)
 
     def test_instream_get_latency(self):
         self.setup_stream()
-        soundio.instream_open()
-        self.assertIsInstance(soundio.instream_get_latency(0.42), int)
+        soundio.instream_open(self.instream)
+        self.assertIsInstance(soundio.instream_get_latency(self.instream, 0.42), int)
+
+    def test_instream_wait(self):
+        self.setup_stream()
+        soundio.instream_open(self.instream)
+        self.buffer = soundio.input_ring_buffer_create(self.instream, 44100 * 8)
+        self.assertEqual(soundio.instream_wait(self.instream, 8, 0.01), 0)
+
+    def test_instream_wait_events(self):
+        self.setup_stream()
+        self.assertEqual(soundio.instream_wait_events(self.instream, 0.01), [])
+
+    def test_instream_interrupt(self):
+        self.setup_stream()
+        soundio.instream_interrupt(self.instream)
+        self.assertEqual(soundio.instream_wait_events(self.instream, 5.0), [])
+
+    def test_instream_set_overflow_policy(self):
+        self.setup_stream()
+        self.assertIsNone(soundio.instream_set_overflow_policy(self.instream, soundio.OverflowDropOldest))
+        with self.assertRaises(soundio.PySoundIoError):
+            soundio.instream_set_overflow_policy(self.instream, 42)
+
+    def test_instream_set_channel_matrix(self):
+        self.setup_stream()
+        soundio.instream_open(self.instream)
+        with self.assertRaises(soundio.PySoundIoError):
+            soundio.instream_set_channel_matrix(self.instream, [[0.5, 0.5]])
+        soundio.instream_set_convert(self.instream, True)
+        self.assertIsNone(soundio.instream_set_channel_matrix(self.instream, [[0.5, 0.5]]))
+        self.assertIsNone(soundio.instream_set_channel_matrix(self.instream, None))
+        with self.assertRaises(soundio.PySoundIoError):
+            soundio.instream_set_channel_matrix(self.instream, [[1.0]])
+
+    def test_instream_set_block_bytes(self):
+        self.setup_stream()
+        soundio.instream_open(self.instream)
+        self.buffer = soundio.input_ring_buffer_create(self.instream, 44100 * 8)
+        self.assertIsNone(soundio.instream_set_block_bytes(self.instream, 1024 * 8))
+        with self.assertRaises(soundio.PySoundIoError):
+            soundio.instream_set_block_bytes(self.instream, -1)
+
+    def test_instream_read_begin(self):
+        self.setup_stream()
+        soundio.instream_open(self.instream)
+        self.buffer = soundio.input_ring_buffer_create(self.instream, 44100 * 8)
+        soundio.ring_buffer_write_ptr(self.buffer, b'\x01' * 64, 64)
+        soundio.ring_buffer_advance_write_ptr(self.buffer, 64)
+        view, position = soundio.instream_read_begin(self.instream, 16)
+        self.assertEqual(len(view), 16)
+        self.assertEqual(position, 0)
+        soundio.instream_read_end(self.instream, position + 16)
+        view, position = soundio.instream_read_begin(self.instream)
+        self.assertEqual((len(view), position), (48, 16))
+
+    def test_instream_set_history(self):
+        self.setup_stream()
+        soundio.instream_open(self.instream)
+        self.buffer = soundio.input_ring_buffer_create(self.instream, 44100 * 8)
+        self.assertIsNone(soundio.instream_set_history(self.instream, 44100 * 4))
+        with self.assertRaises(soundio.PySoundIoError):
+            soundio.instream_set_history(self.instream, -1)
+
+    def test_instream_snapshot(self):
+        self.setup_stream()
+        soundio.instream_open(self.instream)
+        self.buffer = soundio.input_ring_buffer_create(self.instream, 44100 * 8)
+        soundio.ring_buffer_write_ptr(self.buffer, b'\x01' * 48 + b'\x02' * 16, 64)
+        soundio.ring_buffer_advance_write_ptr(self.buffer, 64)
+        data, position = soundio.instream_snapshot(self.instream, 16)
+        self.assertEqual((data, position), (b'\x02' * 16, 48))
+        data, position = soundio.instream_snapshot(self.instream)
+        self.assertEqual((len(data), position), (64, 0))
+        self.assertEqual(soundio.ring_buffer_fill_count(self.buffer), 64)
+
+    def test_instream_frame_at(self):
+        self.setup_stream()
+        self.assertEqual(soundio.instream_frame_at(self.instream, 0.0, 44100.0), 0)
+        self.assertIsInstance(soundio.instream_time_at(self.instream, 0, 44100.0), float)
+
+    def test_instream_read_range(self):
+        self.setup_stream()
+        soundio.instream_open(self.instream)
+        self.buffer = soundio.input_ring_buffer_create(self.instream, 44100 * 8)
+        soundio.ring_buffer_write_ptr(self.buffer, b'\x01' * 16 + b'\x02' * 48, 64)
+        soundio.ring_buffer_advance_write_ptr(self.buffer, 64)
+        data, position = soundio.instream_read_range(self.instream, 16, 32)
+        self.assertEqual((data, position), (b'\x02' * 16, 16))
+        data, position = soundio.instream_read_range(self.instream, -8, 128)
+        self.assertEqual((len(data), position), (64, 0))
+
+    def test_instream_get_stats(self):
+        self.setup_stream()
+        self.assertEqual(soundio.instream_get_gaps(self.instream), [])
+        stats = soundio.instream_get_stats(self.instream)
+        self.assertEqual(stats['overflows'], 0)
+        self.assertEqual(stats['silence_frames'], 0)
+        self.assertEqual(stats['callbacks'], 0)
+        self.assertEqual(stats['high_water'], 0)
+        self.assertEqual(stats['callback_time_mean'], 0.0)
+
+    def test_instream_get_timing(self):
+        self.setup_stream()
+        soundio.instream_open(self.instream)
+        self.assertEqual(soundio.instream_get_timing(self.instream), (0, 0.0))
+
+    def test_instream_set_passthrough(self):
+        self.setup_stream()
+        soundio.instream_open(self.instream)
+        self.buffer = soundio.ring_buffer_create(self.s, 44100 * 8)
+        self.assertIsNone(soundio.instream_set_passthrough(self.instream, self.buffer, 0.5))
+        self.assertIsNone(soundio.instream_set_passthrough(self.instream, None))
+
+    def test_instream_set_passthrough_gain_format(self):
+        self.setup_stream()
+        instream = ctypes.cast(self.instream, ctypes.POINTER(pysoundio.SoundIoInStream))
+        instream.contents.format = soundio.SoundIoFormatU8
+        with self.assertRaises(soundio.PySoundIoError):
+            soundio.instream_set_passthrough(self.instream, None, 0.5)
+
+    def test_monotonic_time(self):
+        now = soundio.monotonic_time()
+        self.assertIsInstance(now, float)
+        self.assertGreaterEqual(soundio.monotonic_time(), now)
+
+    def test_multiple_instreams(self):
+        self.setup_stream()
+        other = soundio.instream_create(self.device)
+        self.assertNotEqual(other, self.instream)
+        soundio.instream_destroy(other)
 
 
 class TestOutputStreamAPI(unittest.TestCase):
@@ -175,20 +339,19 @@ class TestOutputStreamAPI(unittest.TestCase):
     def setUp(self):
         self.outstream = None
         self.s = soundio.create()
-        soundio.connect_backend(pysoundio.SoundIoBackendDummy)
-        soundio.flush()
-        default_index = soundio.default_output_device_index()
-        self.device = soundio.get_output_device(default_index)
-        self.buffer = soundio.input_ring_buffer_create(44100 * 8)
+        soundio.connect_backend(self.s, pysoundio.SoundIoBackendDummy)
+        soundio.flush(self.s)
+        default_index = soundio.default_output_device_index(self.s)
+        self.device = soundio.get_output_device(self.s, default_index)
 
     def tearDown(self):
         if self.outstream:
-            soundio.outstream_pause(True)
-            soundio.outstream_destroy()
+            soundio.outstream_pause(self.outstream, True)
+            soundio.outstream_destroy(self.outstream)
         if self.device:
             soundio.device_unref(self.device)
-        soundio.disconnect()
-        soundio.destroy()
+        soundio.disconnect(self.s)
+        soundio.destroy(self.s)
 
     def setup_stream(self):
         self.outstream = soundio.outstream_create(self.device)
@@ -198,30 +361,70 @@ class TestOutputStreamAPI(unittest.TestCase):
         outstream.contents.software_latency = 0.0
 
     def test_outstream_create(self):
-        self.assertIsNotNone(soundio.outstream_create(self.device))
+        self.outstream = soundio.outstream_create(self.device)
+        self.assertIsNotNone(self.outstream)
 
     def test_outstream_open(self):
         self.setup_stream()
-        self.assertEqual(soundio.outstream_open(), 0)
+        self.assertEqual(soundio.outstream_open(self.outstream), 0)
 
     def test_outstream_pause(self):
         self.setup_stream()
-        soundio.outstream_open()
-        self.assertEqual(soundio.outstream_pause(True), 0)
+        soundio.outstream_open(self.outstream)
+        self.assertEqual(soundio.outstream_pause(self.outstream, True), 0)
+
+    def test_outstream_wait(self):
+        self.setup_stream()
+        soundio.outstream_open(self.outstream)
+        buffer = soundio.output_ring_buffer_create(self.outstream, 44100 * 8)
+        capacity = soundio.ring_buffer_capacity(buffer)
+        self.assertEqual(soundio.outstream_wait(self.outstream, 8, 0.01), capacity)
+        soundio.ring_buffer_destroy(buffer)
+
+    def test_outstream_wait_events(self):
+        self.setup_stream()
+        self.assertEqual(soundio.outstream_wait_events(self.outstream, 0.01), [])
+
+    def test_outstream_get_stats(self):
+        self.setup_stream()
+        stats = soundio.outstream_get_stats(self.outstream)
+        self.assertEqual(stats['underflows'], 0)
+        self.assertEqual(stats['frames_transferred'], 0)
+
+    def test_outstream_set_resampler(self):
+        self.setup_stream()
+        soundio.outstream_open(self.outstream)
+        with self.assertRaises(soundio.PySoundIoError):
+            soundio.outstream_set_resampler(self.outstream, 48000)
+        soundio.outstream_set_convert(self.outstream, True)
+        self.assertIsNone(soundio.outstream_set_resampler(
+            self.outstream, 48000, soundio.ResampleQualityHigh))
+        with self.assertRaises(soundio.PySoundIoError):
+            soundio.outstream_set_resampler(self.outstream, 48000, 42)
+
+    def test_outstream_set_refill_bytes(self):
+        self.setup_stream()
+        soundio.outstream_open(self.outstream)
+        buffer = soundio.output_ring_buffer_create(self.outstream, 44100 * 8)
+        capacity = soundio.ring_buffer_capacity(buffer)
+        self.assertIsNone(soundio.outstream_set_refill_bytes(self.outstream, capacity // 2))
+        with self.assertRaises(soundio.PySoundIoError):
+            soundio.outstream_set_refill_bytes(self.outstream, capacity + 1)
+        soundio.ring_buffer_destroy(buffer)
 
     def test_outstream_get_latency(self):
         self.setup_stream()
-        soundio.outstream_open()
-        self.assertIsInstance(soundio.outstream_get_latency(0.42), int)
+        soundio.outstream_open(self.outstream)
+        self.assertIsInstance(soundio.outstream_get_latency(self.outstream, 0.42), int)
 
 
 class TestRingBufferAPI(unittest.TestCase):
 
     def setUp(self):
         self.s = soundio.create()
-        soundio.connect_backend(pysoundio.SoundIoBackendDummy)
-        soundio.flush()
-        self.buffer = soundio.input_ring_buffer_create(44100)
+        soundio.connect_backend(self.s, pysoundio.SoundIoBackendDummy)
+        soundio.flush(self.s)
+        self.buffer = soundio.ring_buffer_create(self.s, 44100)
 
         # Fill with some data for libsoundio < v1.1.0
         data = bytearray(b'' * 42)
@@ -231,15 +434,31 @@ class TestRingBufferAPI(unittest.TestCase):
     def tearDown(self):
         if self.buffer:
             soundio.ring_buffer_destroy(self.buffer)
-        soundio.destroy()
+        soundio.destroy(self.s)
 
     def test_ring_buffer_fill_count(self):
         self.assertEqual(soundio.ring_buffer_fill_count(self.buffer), 42)
 
     def test_ring_buffer_read_ptr(self):
         ptr = soundio.ring_buffer_read_ptr(self.buffer)
-        self.assertIsInstance(ptr, bytes)
-        self.assertNotEqual(ptr, 0)
+        if sys.version_info[0] >= 3:
+            self.assertIsInstance(ptr, memoryview)
+            self.assertTrue(ptr.readonly)
+        else:
+            self.assertIsInstance(ptr, bytes)
+        self.assertEqual(len(ptr), 42)
+
+    def test_ring_buffer_read_ptr_data(self):
+        if sys.version_info[0] < 3:
+            return
+        data = bytearray(b'\x01\x02\x03\x04')
+        soundio.ring_buffer_advance_read_ptr(self.buffer, 42)
+        ptr = soundio.ring_buffer_read_ptr(self.buffer)
+        self.assertEqual(len(ptr), 0)
+        soundio.ring_buffer_write_ptr(self.buffer, data, len(data))
+        soundio.ring_buffer_advance_write_ptr(self.buffer, len(data))
+        view = soundio.ring_buffer_read_ptr(self.buffer)
+        self.assertEqual(view.tobytes(), bytes(data))
 
     def test_ring_buffer_advance_read_ptr(self):
         count = soundio.ring_buffer_free_count(self.buffer)
@@ -250,6 +469,18 @@ class TestRingBufferAPI(unittest.TestCase):
         data = bytearray('\x01\x02\x03\x04'.encode())
         soundio.ring_buffer_write_ptr(self.buffer, data, len(data))
 
+    def test_ring_buffer_write_view(self):
+        free_count = soundio.ring_buffer_free_count(self.buffer)
+        view = soundio.ring_buffer_write_view(self.buffer)
+        self.assertEqual(len(view), free_count)
+
+        view = soundio.ring_buffer_write_view(self.buffer, 4, True)
+        self.assertEqual(len(view), 4)
+        view[:] = b'\x01\x02\x03\x04'
+        soundio.ring_buffer_advance_write_ptr(self.buffer, 4)
+        soundio.ring_buffer_advance_read_ptr(self.buffer, 42)
+        self.assertEqual(bytes(soundio.ring_buffer_read_ptr(self.buffer)), b'\x01\x02\x03\x04')
+
     def test_ring_buffer_free_count(self):
         self.assertNotEqual(soundio.ring_buffer_free_count(self.buffer), 0)
 
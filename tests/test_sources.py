@@ -0,0 +1,55 @@
+"""
+test_sources.py
+
+File Source Test Suite
+"""
+import io
+import unittest
+
+import pysoundio
+from pysoundio import sinks
+
+
+class TestWavSource(unittest.TestCase):
+
+    def write(self, channels, sample_format, data):
+        f = io.BytesIO()
+        sink = pysoundio.WavSink(f, 48000, channels, sample_format)
+        sink.write(data)
+        sink.close()
+        f.seek(0)
+        return f
+
+    def test_pcm(self):
+        f = self.write(2, pysoundio.SoundIoFormatS16LE, b'\x01\x00\x02\x00' * 10)
+        source = pysoundio.WavSource(f)
+        self.assertEqual(source.sample_rate, 48000)
+        self.assertEqual(source.channels, 2)
+        self.assertEqual(source.sample_format, pysoundio.SoundIoFormatS16LE)
+        self.assertEqual(source.frames, 10)
+        buf = bytearray(18)
+        self.assertEqual(source.readinto(memoryview(buf)), 16)
+        self.assertEqual(bytes(buf[:16]), b'\x01\x00\x02\x00' * 4)
+        self.assertEqual(source.readinto(memoryview(bytearray(100))), 24)
+        self.assertEqual(source.readinto(memoryview(bytearray(100))), 0)
+
+    def test_float_extensible(self):
+        f = self.write(8, pysoundio.SoundIoFormatFloat32LE, b'\x00' * 32 * 4)
+        source = pysoundio.WavSource(f)
+        self.assertEqual(source.channels, 8)
+        self.assertEqual(source.sample_format, pysoundio.SoundIoFormatFloat32LE)
+        self.assertEqual(source.frames, 4)
+
+    def test_rf64(self):
+        limit = sinks._RIFF_LIMIT
+        sinks._RIFF_LIMIT = 16
+        try:
+            f = self.write(1, pysoundio.SoundIoFormatFloat32LE, b'\x00' * 12)
+        finally:
+            sinks._RIFF_LIMIT = limit
+        source = pysoundio.WavSource(f)
+        self.assertEqual(source.frames, 3)
+
+    def test_invalid_file(self):
+        with self.assertRaises(ValueError):
+            pysoundio.WavSource(io.BytesIO(b'not a wav file'))